@@ -0,0 +1,84 @@
+"""Creating N users: one `create` per user vs `create_many`, and hashing
+their passwords one at a time vs with `hash_many`.
+
+    PYTHONPATH=src python -m benchmarks.bench_bulk_create --users 1000
+
+Runs against DATABASE_URL (a local Postgres by default) and deletes the users
+it creates.
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.core.security import PasswordHasher
+    from app.domain.entities.user import User
+    from app.infrastructure.database.connection import async_session_maker, engine
+    from app.infrastructure.repositories.user_repository_impl import (
+        UserRepositoryImpl,
+    )
+
+    hasher = PasswordHasher(rounds=args.rounds)
+    await hasher.start()
+    passwords = [f"password-{n}" for n in range(args.hash_count)]
+
+    start = time.perf_counter()
+    for password in passwords:
+        await hasher.hash(password)
+    hash_serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await hasher.hash_many(passwords)
+    hash_batch = time.perf_counter() - start
+    hasher.shutdown()
+
+    def make_users(prefix: str):
+        return [
+            User(
+                id=None,
+                username=f"{prefix}_{n}",
+                email=f"{prefix}_{n}@example.com",
+                hashed_password="",
+            )
+            for n in range(args.users)
+        ]
+
+    async with async_session_maker() as session:
+        repository = UserRepositoryImpl(session)
+
+        users = make_users(f"bulk_a_{uuid.uuid4().hex[:8]}")
+        start = time.perf_counter()
+        created = [await repository.create(user) for user in users]
+        insert_serial = time.perf_counter() - start
+        await repository.delete_many([user.id for user in created])
+
+        users = make_users(f"bulk_b_{uuid.uuid4().hex[:8]}")
+        start = time.perf_counter()
+        results = await repository.create_many(users)
+        insert_batch = time.perf_counter() - start
+        await repository.delete_many([result.user.id for result in results])
+
+    print(f"{'case':<40}{'seconds':>12}")
+    for name, seconds in (
+        (f"hash x{args.hash_count} one at a time", hash_serial),
+        (f"hash x{args.hash_count} hash_many ({hasher.workers} workers)", hash_batch),
+        (f"insert x{args.users} create()", insert_serial),
+        (f"insert x{args.users} create_many()", insert_batch),
+    ):
+        print(f"{name:<40}{seconds:>12.3f}")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--hash-count", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
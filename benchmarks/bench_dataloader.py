@@ -0,0 +1,76 @@
+"""Resolving N user ids in one tick: one query per id vs batched lookups.
+
+    PYTHONPATH=src python -m benchmarks.bench_dataloader --ids 100
+
+Runs against DATABASE_URL (a local Postgres by default) and needs at least
+`--ids` rows in `users`.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import print_table, summarize
+
+
+async def run(args: argparse.Namespace) -> None:
+    from sqlalchemy import event, select
+
+    from app.infrastructure.database.connection import async_session_maker, engine
+    from app.infrastructure.database.models import UserModel
+    from app.infrastructure.repositories.batching_user_repository import (
+        BatchingUserRepository,
+    )
+    from app.infrastructure.repositories.user_repository_impl import (
+        UserRepositoryImpl,
+    )
+
+    statements = 0
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    async with async_session_maker() as session:
+        user_ids = list(
+            await session.scalars(
+                select(UserModel.id).order_by(UserModel.id).limit(args.ids)
+            )
+        )
+
+    results, queries = {}, {}
+    for name in ("per-id", "batched"):
+        samples = []
+        statements = 0
+        for _ in range(args.repeat):
+            async with async_session_maker() as session:
+                repository = UserRepositoryImpl(session)
+                start = time.perf_counter()
+                if name == "per-id":
+                    # A session runs one statement at a time
+                    for user_id in user_ids:
+                        await repository.get_by_id(user_id)
+                else:
+                    batching = BatchingUserRepository(repository)
+                    await asyncio.gather(
+                        *(batching.get_by_id(user_id) for user_id in user_ids)
+                    )
+                samples.append(time.perf_counter() - start)
+        results[f"{name} x{len(user_ids)}"] = summarize(samples)
+        queries[name] = statements // args.repeat
+
+    print_table(results)
+    print(f"queries per run: {queries}")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ids", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Throughput and latency of the API endpoints, end to end, compared against a
+stored baseline.
+
+    PYTHONPATH=src python -m benchmarks.bench_http --backend memory
+    PYTHONPATH=src python -m benchmarks.bench_http --target uvicorn --concurrency 32
+    PYTHONPATH=src python -m benchmarks.bench_http --backend memory --save-baseline
+
+`--target asgi` drives `create_app()` in process through httpx's ASGI
+transport; `--target uvicorn` starts a real server and adds HTTP and socket
+costs. `--backend` picks USER_REPOSITORY_BACKEND: `memory` needs no database
+or network, `sqlalchemy` and `supabase` use DATABASE_URL and SUPABASE_URL;
+benchmarks.supabase_standin can serve the latter locally.
+
+Each endpoint is loaded for `--duration` seconds by `--concurrency` clients,
+`--repeat` times, keeping the median of each metric. Results are compared
+with benchmarks/baselines/http-<target>-<backend>.json and the run exits
+with status 1 when an endpoint's p95 grew, or its throughput dropped, by
+more than `--threshold`. Baselines are only comparable on the machine that
+recorded them; re-record with `--save-baseline` after an intended change.
+
+`--strict-loop` makes the event loop watchdog strict: with the asgi target,
+the run aborts with the stack of the first request handler that blocks the
+event loop for longer than LOOP_WATCHDOG_THRESHOLD_MS; uvicorn logs it.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import random
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import print_table, summarize
+
+BASELINE_DIR = Path(__file__).parent / "baselines"
+USERS_URL = "/api/v1/users"
+SEED_CHUNK_SIZE = 1000
+COLUMNS = ("count", "errors", "rps", "p50_ms", "p95_ms", "p99_ms")
+
+# Builds the next request: (method, url, json body)
+RequestFactory = Callable[[], Tuple[str, str, Optional[Dict[str, Any]]]]
+
+
+def scenarios(user_ids: List[int], run_id: str) -> Dict[str, RequestFactory]:
+    counter = itertools.count()
+
+    def new_user() -> Dict[str, Any]:
+        name = f"{run_id}_new_{next(counter)}"
+        return {
+            "username": name,
+            "email": f"{name}@example.com",
+            "password": "bench-password",
+        }
+
+    return {
+        "GET /health": lambda: ("GET", "/health", None),
+        "GET /users/{id}": lambda: (
+            "GET",
+            f"{USERS_URL}/{random.choice(user_ids)}",
+            None,
+        ),
+        "GET /users/?limit=100": lambda: ("GET", f"{USERS_URL}/?limit=100", None),
+        "POST /users/": lambda: ("POST", f"{USERS_URL}/", new_user()),
+    }
+
+
+async def seed(client: httpx.AsyncClient, count: int, run_id: str) -> List[int]:
+    """Create `count` users through the bulk endpoint; returns their ids"""
+    ids: List[int] = []
+    for start in range(0, count, SEED_CHUNK_SIZE):
+        items = [
+            {
+                "username": f"{run_id}_{n}",
+                "email": f"{run_id}_{n}@example.com",
+                "password": "bench-password",
+            }
+            for n in range(start, min(start + SEED_CHUNK_SIZE, count))
+        ]
+        response = await client.post(f"{USERS_URL}/bulk", json={"items": items})
+        response.raise_for_status()
+        ids.extend(item["user"]["id"] for item in response.json()["results"])
+    return ids
+
+
+async def cleanup(client: httpx.AsyncClient, run_id: str, first_id: int) -> None:
+    """Delete every user this run created, seeded or posted; ids only grow, so
+    they are all after the first seeded one"""
+    from app.presentation.api.pagination import encode_cursor
+
+    ids = []
+    cursor = encode_cursor(first_id - 1)
+    while True:
+        params = {"limit": 1000, **({"cursor": cursor} if cursor else {})}
+        page = (await client.get(f"{USERS_URL}/", params=params)).json()
+        ids.extend(
+            user["id"] for user in page["items"] if user["username"].startswith(run_id)
+        )
+        cursor = page.get("next_cursor")
+        if not cursor:
+            break
+    for start in range(0, len(ids), SEED_CHUNK_SIZE):
+        await client.post(
+            f"{USERS_URL}/bulk/delete",
+            json={"ids": ids[start : start + SEED_CHUNK_SIZE]},
+        )
+
+
+async def load(
+    client: httpx.AsyncClient,
+    make_request: RequestFactory,
+    concurrency: int,
+    duration: float,
+) -> Dict[str, float]:
+    samples: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            method, url, body = make_request()
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, json=body)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            samples.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        **summarize(samples),
+        "errors": errors,
+        "rps": len(samples) / elapsed,
+    }
+
+
+def combine(runs: List[Dict[str, float]]) -> Dict[str, float]:
+    """The median of each metric over repeated runs, with errors summed"""
+    combined = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    combined["errors"] = sum(run["errors"] for run in runs)
+    return combined
+
+
+async def measure(
+    client: httpx.AsyncClient, args: argparse.Namespace
+) -> Dict[str, Dict[str, float]]:
+    run_id = f"httpbench_{uuid.uuid4().hex[:8]}"
+    user_ids = await seed(client, args.users, run_id)
+    selected = {
+        name: make_request
+        for name, make_request in scenarios(user_ids, run_id).items()
+        if not args.only or name in args.only
+    }
+    runs: Dict[str, List[Dict[str, float]]] = {name: [] for name in selected}
+    try:
+        for make_request in selected.values():
+            # Warm caches, pools and lazily built routes before timing
+            await load(client, make_request, args.concurrency, args.duration / 10)
+        # Interleaved, so that a change in machine load affects every endpoint
+        for _ in range(args.repeat):
+            for name, make_request in selected.items():
+                runs[name].append(
+                    await load(client, make_request, args.concurrency, args.duration)
+                )
+    finally:
+        await cleanup(client, run_id, min(user_ids))
+    return {name: combine(name_runs) for name, name_runs in runs.items()}
+
+
+async def run_asgi(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    from app.main import create_app
+
+    app = create_app()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://bench"
+        ) as client:
+            return await measure(client, args)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_up(client: httpx.AsyncClient, server: subprocess.Popen) -> None:
+    for _ in range(300):
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("uvicorn did not start within 30 seconds")
+
+
+async def run_uvicorn(args: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    port = _free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--no-access-log",
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ.copy(),
+    )
+    limits = httpx.Limits(
+        max_connections=args.concurrency, max_keepalive_connections=args.concurrency
+    )
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30
+        ) as client:
+            await _wait_until_up(client, server)
+            return await measure(client, args)
+    finally:
+        # As on Ctrl-C: uvicorn runs the lifespan shutdown
+        server.send_signal(signal.SIGINT)
+        server.wait()
+
+
+def compare(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+) -> List[str]:
+    """Descriptions of the metrics that regressed past `threshold`"""
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(
+                f"{name}: p95 {base['p95_ms']:.2f} -> {current['p95_ms']:.2f} ms"
+            )
+        if current["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {base['rps']:.0f} -> {current['rps']:.0f} req/s"
+            )
+        if current["errors"] and not base["errors"]:
+            regressions.append(f"{name}: {current['errors']} failed requests")
+    return regressions
+
+
+async def run(args: argparse.Namespace) -> int:
+    runner: Callable[[argparse.Namespace], Awaitable[Dict[str, Dict[str, float]]]]
+    runner = run_asgi if args.target == "asgi" else run_uvicorn
+    results = await runner(args)
+    print(
+        f"target={args.target} backend={args.backend} "
+        f"concurrency={args.concurrency} duration={args.duration}s x{args.repeat}"
+    )
+    print_table(results, COLUMNS)
+
+    baseline_path = Path(
+        args.baseline or BASELINE_DIR / f"http-{args.target}-{args.backend}.json"
+    )
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        document = {
+            "target": args.target,
+            "backend": args.backend,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "results": results,
+        }
+        baseline_path.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"baseline saved to {baseline_path}")
+        return 0
+    if not baseline_path.exists():
+        print(f"no baseline at {baseline_path}, nothing to compare")
+        return 0
+
+    document = json.loads(baseline_path.read_text())
+    if document["concurrency"] != args.concurrency:
+        print(
+            f"warning: baseline was recorded at concurrency {document['concurrency']}"
+        )
+    regressions = compare(results, document["results"], args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if not regressions:
+        print(f"no regression beyond {args.threshold:.0%} against {baseline_path}")
+    return 1 if regressions else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--target", choices=("asgi", "uvicorn"), default="asgi")
+    parser.add_argument(
+        "--backend", choices=("memory", "sqlalchemy", "supabase"), default="memory"
+    )
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--duration", type=float, default=3.0, help="seconds per endpoint and run"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per endpoint, medians are kept"
+    )
+    parser.add_argument("--users", type=int, default=1000, help="users seeded")
+    parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    parser.add_argument("--baseline", help="baseline file to compare with or save")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--strict-loop", action="store_true", help="fail on event loop blocks"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="allowed relative regression"
+    )
+    args = parser.parse_args()
+
+    # Read by Settings, in this process and in the uvicorn child
+    os.environ["USER_REPOSITORY_BACKEND"] = args.backend
+    # Measure the API rather than bcrypt's deliberately slow cost
+    os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+    # A single client would exhaust its own budget in the first second, and
+    # the load would be shed as soon as the event loop lags
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("LOAD_SHED_ENABLED", "false")
+    if args.strict_loop:
+        os.environ["LOOP_WATCHDOG_STRICT"] = "true"
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
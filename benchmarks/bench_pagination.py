@@ -0,0 +1,92 @@
+"""Page fetch latency by depth: offset vs keyset pagination.
+
+    PYTHONPATH=src python -m benchmarks.bench_pagination --seed --rows 1000000
+
+Runs against DATABASE_URL (a local Postgres by default). `--seed` fills the
+`users` table with generated rows up to `--rows`; never use it on a database
+whose data matters.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import print_table, summarize
+
+
+async def seed(session, rows: int) -> None:
+    from sqlalchemy import func, select, text
+
+    from app.infrastructure.database.models import UserModel
+
+    existing = await session.scalar(select(func.count()).select_from(UserModel))
+    if existing >= rows:
+        return
+    await session.execute(
+        text(
+            "INSERT INTO users (username, email, hashed_password, is_active) "
+            "SELECT 'bench_' || n, 'bench_' || n || '@example.com', '', true "
+            "FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS n"
+        ),
+        {"start": existing + 1, "stop": rows},
+    )
+    await session.commit()
+    await session.execute(text("ANALYZE users"))
+
+
+async def run(args: argparse.Namespace) -> None:
+    from sqlalchemy import select
+
+    from app.infrastructure.database.connection import (
+        Base,
+        async_session_maker,
+        engine,
+    )
+    from app.infrastructure.database.models import UserModel
+    from app.infrastructure.repositories.user_repository_impl import (
+        UserRepositoryImpl,
+    )
+
+    if args.seed:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    async with async_session_maker() as session:
+        if args.seed:
+            await seed(session, args.rows)
+        repository = UserRepositoryImpl(session)
+
+        results = {}
+        for depth in (0, 1_000, 100_000, args.rows - args.limit):
+            after_id = await session.scalar(
+                select(UserModel.id).order_by(UserModel.id).offset(depth).limit(1)
+            )
+            if after_id is None:
+                continue
+            offset_samples, keyset_samples = [], []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                await repository.get_all(skip=depth, limit=args.limit)
+                offset_samples.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                await repository.get_page(after_id=after_id, limit=args.limit)
+                keyset_samples.append(time.perf_counter() - start)
+            results[f"offset  depth={depth}"] = summarize(offset_samples)
+            results[f"keyset  depth={depth}"] = summarize(keyset_samples)
+
+    print_table(results)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seed", action="store_true")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""A burst of Realtime change events through the change callbacks.
+
+    PYTHONPATH=src python -m benchmarks.bench_realtime_dispatch
+    PYTHONPATH=src python -m benchmarks.bench_realtime_dispatch --events 100000
+
+`--events` changes to `--rows` distinct rows arrive in one go, as the
+Realtime client delivers them, and an async callback takes `--callback-ms`
+for each. `task per event` is the former handler, which started a task per
+event; `dispatcher` is the bounded Dispatcher, with `--workers` and the
+configured queue size, and `dispatcher coalesced` adds per-row coalescing. `peak_tasks` and `peak_mb`
+(tracemalloc) are the highest seen while the burst drains; `seconds` is
+the time until every callback has run.
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+from benchmarks.common import print_table
+
+COLUMNS = ("calls", "dropped", "peak_tasks", "peak_mb", "seconds")
+
+
+def _payload(n: int, rows: int) -> Dict[str, Any]:
+    return {
+        "data": {
+            "type": "UPDATE",
+            "table": "users",
+            "record": {"id": n % rows, "username": f"burst_{n}"},
+            "old_record": {"id": n % rows},
+        }
+    }
+
+
+async def measure(
+    make_handler: Callable[[Callable], Any], args: argparse.Namespace
+) -> Dict[str, float]:
+    calls = 0
+
+    async def callback(payload: Any) -> None:
+        nonlocal calls
+        await asyncio.sleep(args.callback_ms / 1000)
+        calls += 1
+
+    handle_change, stats, close = make_handler(callback)
+    peak_tasks = 0
+    tracemalloc.start()
+    start = time.perf_counter()
+    for n in range(args.events):
+        handle_change(_payload(n, args.rows))
+    while True:
+        peak_tasks = max(peak_tasks, len(asyncio.all_tasks()) - 1)
+        await asyncio.sleep(0.01)
+        if calls + stats()["dropped"] >= stats()["expected"]:
+            break
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await close()
+    return {
+        "calls": calls,
+        "dropped": stats()["dropped"],
+        "peak_tasks": peak_tasks,
+        "peak_mb": peak / 1e6,
+        "seconds": seconds,
+    }
+
+
+def task_per_event(args: argparse.Namespace):
+    def make_handler(callback: Callable):
+        def handle_change(payload: Dict[str, Any]) -> None:
+            asyncio.create_task(callback(payload))
+
+        async def close() -> None:
+            pass
+
+        def stats() -> Dict[str, int]:
+            return {"dropped": 0, "expected": args.events}
+
+        return handle_change, stats, close
+
+    return make_handler
+
+
+def dispatcher(args: argparse.Namespace, coalesce: bool):
+    from app.core.config import settings
+    from app.core.dispatcher import Dispatcher
+    from app.infrastructure.supabase.realtime_service import change_key
+
+    def make_handler(callback: Callable):
+        queue = Dispatcher(
+            callback,
+            name="bench",
+            workers=args.workers,
+            queue_size=settings.REALTIME_DISPATCH_QUEUE_SIZE,
+            coalesce_key=change_key if coalesce else None,
+        )
+
+        def stats() -> Dict[str, int]:
+            return {
+                "dropped": queue.dropped + queue.coalesced,
+                "expected": queue.submitted,
+            }
+
+        return queue.submit, stats, queue.close
+
+    return make_handler
+
+
+async def run(args: argparse.Namespace) -> None:
+    cases = {
+        "task per event": task_per_event(args),
+        "dispatcher": dispatcher(args, coalesce=False),
+        "dispatcher coalesced": dispatcher(args, coalesce=True),
+    }
+    results = {name: await measure(make, args) for name, make in cases.items()}
+    print(
+        f"events={args.events} rows={args.rows} callback={args.callback_ms}ms "
+        f"workers={args.workers}"
+    )
+    print_table(results, COLUMNS)
+    print("dropped counts events dropped by the full queue or coalesced")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=50_000)
+    parser.add_argument("--rows", type=int, default=1000, help="distinct row ids")
+    parser.add_argument("--callback-ms", type=float, default=1.0)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
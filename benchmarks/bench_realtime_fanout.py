@@ -0,0 +1,134 @@
+"""Cost of fanning one Realtime change out to many subscribers in a worker.
+
+    PYTHONPATH=src python -m benchmarks.bench_realtime_fanout
+    PYTHONPATH=src python -m benchmarks.bench_realtime_fanout --subscribers 10000
+
+Drives RealtimeHub.publish directly, as the Realtime client's callback
+would, with no network: `--subscribers` queues either all listen to the
+table (`unfiltered`) or each filter on one username (`filtered`), which is
+delivered to a single queue. Every subscriber is drained by its own task,
+like an SSE or WebSocket client, and `delivered_ms` is the time until the
+last of them received the change. `publish_us` is the time publish() takes
+on the event loop; one upstream channel serves every subscriber.
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from benchmarks.common import print_table, summarize
+
+COLUMNS = ("count", "publish_us", "p50_ms", "p95_ms", "channels")
+
+
+def _payload(n: int) -> Dict[str, Any]:
+    return {
+        "data": {
+            "type": "UPDATE",
+            "table": "users",
+            "commit_timestamp": "2026-01-01T00:00:00Z",
+            "record": {
+                "id": n,
+                "username": f"fanout_{n}",
+                "email": f"fanout_{n}@example.com",
+                "hashed_password": "not sent",
+                "is_active": True,
+            },
+            "old_record": {"id": n},
+        }
+    }
+
+
+async def measure(hub, subscribers: int, filtered: bool, events: int) -> dict:
+    queues = [
+        await hub.subscribe(
+            "users",
+            column_filter=("username", f"fanout_{n}") if filtered else None,
+        )
+        for n in range(subscribers)
+    ]
+    received = 0
+    all_received = asyncio.Event()
+    expected = 1 if filtered else subscribers
+
+    async def drain(subscriber) -> None:
+        nonlocal received
+        async for _ in subscriber:
+            received += 1
+            if received == expected:
+                all_received.set()
+
+    drains = [asyncio.create_task(drain(subscriber)) for subscriber in queues]
+    await asyncio.sleep(0)
+    publish: List[float] = []
+    delivered: List[float] = []
+    channels = hub.stats()["channels"]
+    for n in range(events):
+        received = 0
+        all_received.clear()
+        start = time.perf_counter()
+        hub.publish("users", "*", _payload(n % subscribers))
+        publish.append(time.perf_counter() - start)
+        await all_received.wait()
+        delivered.append(time.perf_counter() - start)
+
+    for subscriber in queues:
+        await hub.unsubscribe(subscriber)
+    await asyncio.gather(*drains)
+    return {
+        **summarize(delivered),
+        "publish_us": sum(publish) / len(publish) * 1e6,
+        "channels": channels,
+    }
+
+
+class _Channel:
+    def on_postgres_changes(self, **kwargs: Any) -> None:
+        pass
+
+    async def subscribe(self) -> None:
+        pass
+
+
+class _Client:
+    """Stands in for the Supabase client; publish() is called directly"""
+
+    def channel(self, topic: str) -> _Channel:
+        return _Channel()
+
+    async def remove_channel(self, channel: _Channel) -> None:
+        pass
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.infrastructure.supabase.realtime_hub import RealtimeHub
+
+    client = _Client()
+
+    async def get_client() -> _Client:
+        return client
+
+    hub = RealtimeHub(
+        get_client,
+        {"users": ("id", "username", "email", "is_active")},
+        max_subscribers=args.subscribers,
+    )
+    results = {
+        "unfiltered": await measure(hub, args.subscribers, False, args.events),
+        "filtered": await measure(hub, args.subscribers, True, args.events),
+    }
+    print(f"subscribers={args.subscribers} events={args.events}")
+    print_table(results, COLUMNS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""CPU time per request of a large users page, by response path.
+
+    PYTHONPATH=src python -m benchmarks.bench_serialization
+    PYTHONPATH=src python -m benchmarks.bench_serialization --limit 100
+
+Requests `GET /api/v1/users/?limit=<limit>` in process, through httpx's ASGI
+transport, on the memory backend so that only the application's own work is
+measured. `response_model` is the former handler, mounted next to the real
+one: it builds UserPage with an EmailStr UserResponse per user and lets
+FastAPI validate and serialize the result again. `serializer json` and
+`serializer msgpack` are the current handler, with and without
+`Accept: application/msgpack` (which needs the msgpack extra). `cpu_ms` is
+the process CPU time per request; it includes the client's, which is the
+same on every path.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from benchmarks.common import print_table, summarize
+
+COLUMNS = ("count", "cpu_ms", "p50_ms", "p95_ms", "bytes")
+
+
+def add_legacy_route(app) -> None:
+    from fastapi import Depends
+    from pydantic import BaseModel, ConfigDict
+
+    from app.domain.services.user_service import UserService
+    from app.presentation.api.dependencies import get_user_service
+    from app.presentation.schemas.user import UserBase
+
+    class LegacyUserResponse(UserBase):
+        model_config = ConfigDict(from_attributes=True)
+
+        id: int
+        is_active: bool
+        created_at: datetime
+        updated_at: datetime
+
+    class LegacyUserPage(BaseModel):
+        items: List[LegacyUserResponse]
+        next_cursor: Optional[str] = None
+
+    async def get_users(
+        limit: int = 100, user_service: UserService = Depends(get_user_service)
+    ) -> LegacyUserPage:
+        users, _ = await user_service.get_users_page(after_id=None, limit=limit)
+        return LegacyUserPage(
+            items=[LegacyUserResponse.model_validate(user) for user in users]
+        )
+
+    app.add_api_route("/legacy/users/", get_users, response_model=LegacyUserPage)
+
+
+async def measure(client, url: str, headers: dict, requests: int) -> dict:
+    await client.get(url, headers=headers)  # warm up
+    samples = []
+    size = 0
+    cpu_start = time.process_time()
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(url, headers=headers)
+        samples.append(time.perf_counter() - start)
+        response.raise_for_status()
+        size = len(response.content)
+    cpu = time.process_time() - cpu_start
+    return {**summarize(samples), "cpu_ms": cpu / requests * 1000, "bytes": size}
+
+
+async def run(args: argparse.Namespace) -> None:
+    import httpx
+
+    from app.main import create_app
+
+    app = create_app()
+    add_legacy_route(app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        ) as client:
+            items = [
+                {
+                    "username": f"serialize_{n}",
+                    "email": f"serialize_{n}@example.com",
+                    "password": "bench-password",
+                }
+                for n in range(args.limit)
+            ]
+            response = await client.post("/api/v1/users/bulk", json={"items": items})
+            response.raise_for_status()
+
+            cases = {
+                "response_model": ("/legacy/users/", {}),
+                "serializer json": ("/api/v1/users/", {}),
+                "serializer msgpack": (
+                    "/api/v1/users/",
+                    {"Accept": "application/msgpack"},
+                ),
+            }
+            results = {}
+            for name, (url, headers) in cases.items():
+                results[name] = await measure(
+                    client, f"{url}?limit={args.limit}", headers, args.requests
+                )
+
+    print(f"GET /users?limit={args.limit}, {args.requests} requests per path")
+    print_table(results, COLUMNS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=1000, help="users per page")
+    parser.add_argument("--requests", type=int, default=50, help="per path")
+    args = parser.parse_args()
+
+    os.environ["USER_REPOSITORY_BACKEND"] = "memory"
+    os.environ["RESPONSE_MSGPACK_ENABLED"] = "true"
+    # Only the bulk seeding hashes, and its cost is not measured
+    os.environ.setdefault("PASSWORD_HASH_ROUNDS", "4")
+    # A single client would exhaust its own budget in the first second, and
+    # the load would be shed as soon as the event loop lags
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("LOAD_SHED_ENABLED", "false")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Concurrent lookups of one hot user, with and without single-flight.
+
+    PYTHONPATH=src python -m benchmarks.bench_singleflight --concurrency 200
+
+Runs against DATABASE_URL (a local Postgres by default) and needs at least one
+row in `users`. Each lookup without single-flight uses its own session, like
+concurrent requests do.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import print_table, summarize
+
+
+async def run(args: argparse.Namespace) -> None:
+    from sqlalchemy import func, select
+
+    from app.core.singleflight import SingleFlight
+    from app.infrastructure.database.connection import async_session_maker, engine
+    from app.infrastructure.database.models import UserModel
+    from app.presentation.api.dependencies import user_repository_scope
+    from app.infrastructure.repositories.singleflight_user_repository import (
+        SingleFlightUserRepository,
+    )
+
+    async with async_session_maker() as session:
+        user_id = await session.scalar(select(func.min(UserModel.id)))
+
+    async def plain_lookup() -> None:
+        async with user_repository_scope() as repository:
+            await repository.get_by_id(user_id)
+
+    flights = SingleFlight()
+
+    async def coalesced_lookup() -> None:
+        async with user_repository_scope() as repository:
+            await SingleFlightUserRepository(
+                repository, user_repository_scope, flights
+            ).get_by_id(user_id)
+
+    results = {}
+    for name, lookup in (("plain", plain_lookup), ("single-flight", coalesced_lookup)):
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            await asyncio.gather(*(lookup() for _ in range(args.concurrency)))
+            samples.append(time.perf_counter() - start)
+        results[f"{name} x{args.concurrency}"] = summarize(samples)
+
+    print_table(results)
+    print(f"single-flight: {flights.stats()}")
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=10)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
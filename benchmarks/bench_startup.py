@@ -0,0 +1,185 @@
+"""How quickly a fresh worker can serve: the time to import the application
+and the time from spawning uvicorn to its first response, against budgets.
+
+    PYTHONPATH=src python -m benchmarks.bench_startup
+    PYTHONPATH=src python -m benchmarks.bench_startup --backend sqlalchemy \\
+        --max-ready-ms 3500
+    PYTHONPATH=src python -m benchmarks.bench_startup --show-imports 10
+
+Every measurement starts a new interpreter, `--repeat` times, keeping the
+median. `import` is `import app.main`; `ready` is from spawning uvicorn until
+/health answers, which includes the import and the lifespan startup; the
+first /openapi.json and users page are then timed on that worker. The run
+exits with status 1 when the import or the first response takes longer than
+its budget, so it can gate a deploy; the budgets are in wall-clock time and
+only meaningful on comparable machines.
+"""
+
+import argparse
+import os
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.bench_http import USERS_URL, _free_port
+from benchmarks.common import print_table
+
+IMPORT_SCRIPT = (
+    "import time; start = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def import_seconds() -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.split()[-1])
+
+
+def slowest_imports(count: int) -> List[Tuple[str, float]]:
+    """Top-level packages whose modules take longest to import with the
+    application, from `python -X importtime`"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    # import time: self [us] | cumulative | imported package
+    pattern = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)")
+    totals: Dict[str, float] = defaultdict(float)
+    for line in stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            # Self times, so a package isn't charged for the ones it imports
+            totals[match.group(2).split(".")[0]] += int(match.group(1)) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def _get_until_up(
+    client: httpx.Client, server: subprocess.Popen, timeout: float
+) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with status {server.returncode}")
+        try:
+            if client.get("/health").status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"uvicorn did not start within {timeout} seconds")
+
+
+def _timed_get(client: httpx.Client, url: str) -> float:
+    start = time.perf_counter()
+    client.get(url).raise_for_status()
+    return time.perf_counter() - start
+
+
+def serve_seconds(timeout: float) -> Dict[str, float]:
+    """Spawn a worker and time its first responses"""
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--no-access-log",
+            "--log-level",
+            "warning",
+        ],
+        env=os.environ.copy(),
+    )
+    try:
+        with httpx.Client(
+            base_url=f"http://127.0.0.1:{port}", timeout=timeout
+        ) as client:
+            _get_until_up(client, server, timeout)
+            return {
+                "ready": time.perf_counter() - start,
+                "openapi": _timed_get(client, "/openapi.json"),
+                "users": _timed_get(client, f"{USERS_URL}/?limit=10"),
+            }
+    finally:
+        # As on Ctrl-C: uvicorn runs the lifespan shutdown
+        server.send_signal(signal.SIGINT)
+        server.wait()
+
+
+def run(args: argparse.Namespace) -> int:
+    imports = [import_seconds() for _ in range(args.repeat)]
+    serves = [serve_seconds(args.timeout) for _ in range(args.repeat)]
+    median_ms = {
+        "import": statistics.median(imports) * 1000,
+        **{
+            name: statistics.median(serve[name] for serve in serves) * 1000
+            for name in serves[0]
+        },
+    }
+    budgets = {"import": args.max_import_ms, "ready": args.max_ready_ms}
+    results = {
+        name: {"median_ms": value, "budget_ms": budgets.get(name, "-")}
+        for name, value in median_ms.items()
+    }
+    print(f"backend={args.backend} repeat={args.repeat}")
+    print_table(results, ("median_ms", "budget_ms"))
+
+    if args.show_imports:
+        print("slowest imports:")
+        for package, seconds in slowest_imports(args.show_imports):
+            print(f"  {package:<30} {seconds * 1000:8.1f} ms")
+
+    over = [
+        f"{name}: {median_ms[name]:.0f} ms, budget {budget:.0f} ms"
+        for name, budget in budgets.items()
+        if median_ms[name] > budget
+    ]
+    for line in over:
+        print(f"OVER BUDGET {line}")
+    if not over:
+        print("within budget")
+    return 1 if over else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backend", choices=("memory", "sqlalchemy", "supabase"), default="memory"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-import-ms", type=float, default=1200.0)
+    parser.add_argument("--max-ready-ms", type=float, default=2500.0)
+    parser.add_argument(
+        "--timeout", type=float, default=30.0, help="seconds to wait for a worker"
+    )
+    parser.add_argument(
+        "--show-imports", type=int, default=0, help="list the N slowest packages"
+    )
+    args = parser.parse_args()
+
+    # Read by Settings in the child processes
+    os.environ["USER_REPOSITORY_BACKEND"] = args.backend
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Per-request latency of a fresh Supabase client vs the shared pooled one.
+
+    PYTHONPATH=src python -m benchmarks.bench_supabase_client [--requests N]
+
+Without SUPABASE_URL set, a local stub server answers the PostgREST calls, so
+the difference measured is client construction plus connection setup. Point
+SUPABASE_URL at a real project to include TLS handshakes.
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import (
+    USE_LOCAL_SUPABASE,
+    print_table,
+    start_stub_server,
+    summarize,
+)
+
+
+async def run(requests: int) -> None:
+    from supabase import acreate_client
+
+    from app.core.config import settings
+    from app.core.supabase import (
+        close_supabase_clients,
+        get_supabase_client,
+        get_supabase_pool_stats,
+    )
+
+    async def query(client) -> None:
+        await client.table("users").select("*").limit(1).execute()
+
+    per_request = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        client = await acreate_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
+        await query(client)
+        per_request.append(time.perf_counter() - start)
+        await client.postgrest.aclose()
+
+    shared = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await query(await get_supabase_client())
+        shared.append(time.perf_counter() - start)
+
+    print_table(
+        {
+            "create_client per request": summarize(per_request),
+            "shared pooled client": summarize(shared),
+        }
+    )
+    print("pool:", get_supabase_pool_stats())
+    await close_supabase_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    server = start_stub_server() if USE_LOCAL_SUPABASE else None
+    asyncio.run(run(args.requests))
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Wall time of N parallel Supabase lookups, blocking vs async client.
+
+    PYTHONPATH=src python -m benchmarks.bench_supabase_concurrency [-n 50]
+
+A local stub server adds `--delay` seconds to every PostgREST call. With the
+old sync `.execute()` inside `async def`, N parallel requests serialize on the
+event loop (~N * delay); with the async client they overlap (~delay).
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import USE_LOCAL_SUPABASE, start_stub_server
+
+
+async def run(requests: int) -> None:
+    from supabase import create_client
+
+    from app.core.config import settings
+    from app.core.supabase import close_supabase_clients, get_supabase_client
+    from app.infrastructure.supabase.supabase_repository import (
+        SupabaseUserRepository,
+    )
+
+    sync_client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
+
+    async def blocking_lookup(user_id: int) -> None:
+        sync_client.table("users").select("*").eq("id", user_id).execute()
+
+    repository = SupabaseUserRepository(await get_supabase_client())
+    await repository.get_by_id(0)  # open the pooled connection
+
+    for name, lookup in (
+        ("sync client in async def", blocking_lookup),
+        ("async pooled client", repository.get_by_id),
+    ):
+        start = time.perf_counter()
+        await asyncio.gather(*(lookup(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+        print(f"{name:<28}{requests:>6} requests {elapsed * 1000:>10.1f} ms")
+
+    await close_supabase_clients()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--requests", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = start_stub_server(delay=args.delay) if USE_LOCAL_SUPABASE else None
+    asyncio.run(run(args.requests))
+    if server is not None:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""The Supabase code path under network delay and failures: repository
+reads, sign-ins and remotely verified tokens, through the shared clients.
+
+    PYTHONPATH=src python -m benchmarks.bench_supabase_path --latency-ms 20
+    PYTHONPATH=src python -m benchmarks.bench_supabase_path --error-rate 0.05 \\
+        --stall-rate 0.01 --stall-seconds 5 --concurrency 64
+
+Starts benchmarks.supabase_standin on SUPABASE_URL's port, or uses one
+already running with `--external` (started with `--users`), and sets the
+given faults once the accounts are signed up. For each concurrency level,
+every case runs `--requests` operations. `conns` is the number of
+connections the stand-in saw opened meanwhile, which shows how well the
+client pool reuses them. The pool limits and timeouts come from Settings:
+SUPABASE_POOL_MAX_CONNECTIONS, SUPABASE_POOL_MAX_KEEPALIVE and
+SUPABASE_TIMEOUT_SECONDS.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Awaitable, Callable, Dict, List
+
+import httpx
+
+from benchmarks.common import print_table, summarize
+from benchmarks.supabase_standin import add_fault_arguments, faults_from_args
+
+COLUMNS = ("count", "errors", "rps", "p50_ms", "p95_ms", "p99_ms", "conns")
+PASSWORD = "bench-password"
+
+# Returns whether the operation succeeded
+Operation = Callable[[int], Awaitable[bool]]
+
+
+async def measure(
+    operation: Operation, requests: int, concurrency: int
+) -> Dict[str, float]:
+    samples: List[float] = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for n in pending:
+            start = time.perf_counter()
+            try:
+                succeeded = await operation(n)
+            except Exception:
+                succeeded = False
+            samples.append(time.perf_counter() - start)
+            errors += not succeeded
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {**summarize(samples), "errors": errors, "rps": len(samples) / elapsed}
+
+
+async def run(args: argparse.Namespace) -> None:
+    from app.core.auth import AuthService
+    from app.core.config import settings
+    from app.core.supabase import close_supabase_clients, get_supabase_client
+    from app.domain.services.auth_service import SupabaseAuthService
+    from app.infrastructure.supabase.supabase_repository import (
+        SupabaseUserRepository,
+    )
+
+    client = await get_supabase_client()
+    repository = SupabaseUserRepository(client)
+    sign_ins = SupabaseAuthService(client)
+    auth_service = AuthService(client)
+    control = httpx.AsyncClient(base_url=settings.SUPABASE_URL)
+
+    emails = [f"bench_{n}@example.com" for n in range(args.accounts)]
+    for email in emails:
+        try:
+            await sign_ins.sign_up(email, PASSWORD)
+        except Exception:
+            pass  # registered by an earlier run against --external
+    await control.patch("/standin/faults", json=asdict(faults_from_args(args)))
+    issued: List[str] = []
+
+    async def get_by_id(n: int) -> bool:
+        return await repository.get_by_id(random.randint(1, args.users)) is not None
+
+    async def get_page(n: int) -> bool:
+        after_id = random.randint(0, max(args.users - 100, 0))
+        return bool(await repository.get_page(after_id, 100))
+
+    async def sign_in(n: int) -> bool:
+        session = await sign_ins.sign_in(emails[n % len(emails)], PASSWORD)
+        issued.append(session["access_token"])
+        return True
+
+    async def get_current_user(n: int) -> bool:
+        # Tokens of the sign-ins above, so the verified-token cache misses
+        return bool(await auth_service.get_current_user(issued[n % len(issued)]))
+
+    cases: Dict[str, Operation] = {
+        "rest get_by_id": get_by_id,
+        "rest get_page": get_page,
+        "auth sign_in": sign_in,
+        "auth get_current_user": get_current_user,
+    }
+    results: Dict[str, Dict[str, Any]] = {}
+    for concurrency in args.concurrency:
+        for name, operation in cases.items():
+            if name == "auth get_current_user" and not issued:
+                continue
+            before = (await control.get("/standin/stats")).json()["connections"]
+            row = await measure(operation, args.requests, concurrency)
+            after = (await control.get("/standin/stats")).json()["connections"]
+            results[f"c={concurrency} {name}"] = {**row, "conns": after - before}
+        issued.clear()
+
+    print(
+        f"latency={args.latency_ms}ms jitter={args.jitter_ms}ms "
+        f"errors={args.error_rate:.0%} stalls={args.stall_rate:.0%} "
+        f"pool={settings.SUPABASE_POOL_MAX_CONNECTIONS} "
+        f"timeout={settings.SUPABASE_TIMEOUT_SECONDS}s"
+    )
+    print_table(results, COLUMNS)
+    await control.aclose()
+    await close_supabase_clients()
+
+
+def _standin_answers(url: str) -> bool:
+    try:
+        httpx.get(url)
+    except httpx.TransportError:
+        return False
+    return True
+
+
+def start_standin(users: int) -> subprocess.Popen:
+    url = f"{os.environ['SUPABASE_URL']}/standin/stats"
+    # The new stand-in could not bind, and we would measure the old server
+    if _standin_answers(url):
+        raise RuntimeError(
+            f"something already listens at {os.environ['SUPABASE_URL']}; "
+            "pass --external to benchmark it"
+        )
+    standin = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.supabase_standin", f"--users={users}"],
+        stdout=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        if standin.poll() is not None:
+            raise RuntimeError(
+                f"the Supabase stand-in exited with status {standin.returncode}"
+            )
+        if _standin_answers(url):
+            return standin
+        time.sleep(0.1)
+    standin.kill()
+    raise RuntimeError("the Supabase stand-in did not start")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=500, help="per case")
+    parser.add_argument("--users", type=int, default=10_000, help="rows seeded")
+    parser.add_argument("--accounts", type=int, default=20, help="auth users")
+    parser.add_argument(
+        "--external", action="store_true", help="use a stand-in already running"
+    )
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    # Exercise Supabase Auth rather than local JWT verification
+    os.environ.setdefault("AUTH_VERIFY_LOCALLY", "false")
+    standin = None if args.external else start_standin(args.users)
+    try:
+        asyncio.run(run(args))
+    finally:
+        if standin is not None:
+            standin.send_signal(signal.SIGINT)
+            standin.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,710 @@
+"""Local stand-in for the Supabase APIs this app calls, with injected latency
+and failures, for load tests and profiling without a Supabase project.
+
+    PYTHONPATH=src python -m benchmarks.supabase_standin --latency-ms 20 --jitter-ms 5
+
+It listens on SUPABASE_URL's port (54321 by default) and serves:
+
+- PostgREST, /rest/v1/<table>: GET, POST, PATCH and DELETE with `select`,
+  the eq/neq/gt/gte/lt/lte/in/is filters, `order`, `limit` and `offset`.
+  `users` has unique `email` and `username` columns, like the real table.
+- GoTrue, /auth/v1: signup, token (password and refresh_token grants), user,
+  logout and an empty JWKS. Access tokens are HS256 JWTs signed with
+  JWT_SECRET, so the app verifies them locally as it would Supabase's.
+- Realtime, /realtime/v1/websocket: channel joins and heartbeats, and a
+  `postgres_changes` event for every write, with full old records.
+- Control, /standin: GET or PATCH `faults` to read or change the injected
+  faults while running, GET `stats` for request and connection counts.
+
+Every REST and Auth call waits `latency_ms`, plus an exponentially
+distributed `jitter_ms` on average, for a realistic tail. Then
+`error_rate` of the calls fail with `error_status`, and `stall_rate` of them
+hang for `stall_seconds`, which trips client timeouts.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import secrets
+import time
+import uuid
+import weakref
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime, timezone
+from itertools import count, islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+import jwt
+from aiohttp import WSMsgType, web
+
+import benchmarks.common  # noqa: F401, sets the environment defaults
+
+# Query parameters that are not filters
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "columns", "on_conflict"}
+ACCESS_TOKEN_SECONDS = 3600
+
+Filter = Tuple[str, str, str]
+
+
+@dataclass
+class Faults:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+    stall_rate: float = 0.0
+    stall_seconds: float = 60.0
+
+
+class PostgrestError(Exception):
+    def __init__(self, status: int, code: str, message: str, details: str = ""):
+        super().__init__(message)
+        self.status = status
+        self.body = {"code": code, "message": message, "details": details, "hint": None}
+
+
+class AuthError(Exception):
+    def __init__(self, status: int, error_code: str, msg: str):
+        super().__init__(msg)
+        self.status = status
+        self.body = {"code": status, "error_code": error_code, "msg": msg}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _split_list(arg: str) -> List[str]:
+    """`(a,b,"c,d")` -> ["a", "b", "c,d"]"""
+    return next(csv.reader([arg.strip("()")]), [])
+
+
+def _coerce(text: str, like: Any) -> Any:
+    if isinstance(like, bool):
+        return text == "true"
+    if isinstance(like, int):
+        return int(text)
+    if isinstance(like, float):
+        return float(text)
+    return text
+
+
+def _matches(row: Dict[str, Any], condition: Filter) -> bool:
+    column, op, arg = condition
+    value = row.get(column)
+    if op == "is":
+        return value is {"null": None, "true": True, "false": False}[arg]
+    if value is None:
+        return False
+    if op == "in":
+        return value in {_coerce(item, value) for item in _split_list(arg)}
+    operand = _coerce(arg, value)
+    if op == "eq":
+        return value == operand
+    if op == "neq":
+        return value != operand
+    if op == "gt":
+        return value > operand
+    if op == "gte":
+        return value >= operand
+    if op == "lt":
+        return value < operand
+    if op == "lte":
+        return value <= operand
+    raise PostgrestError(400, "PGRST100", f'"failed to parse filter ({op}.{arg})"')
+
+
+class Table:
+    """Rows by id, with indexes for the lookups PostgREST would serve from
+    the primary key and unique constraints"""
+
+    def __init__(self, name: str, unique: Iterable[str] = (), **defaults: Any):
+        self.name = name
+        self.defaults = defaults
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.ids: List[int] = []  # sorted
+        self.unique: Dict[str, Dict[Any, int]] = {column: {} for column in unique}
+        self._next_id = count(1)
+
+    def _indexed(self, column: str, values: List[str]) -> Optional[List[int]]:
+        if column == "id":
+            return sorted({int(value) for value in values})
+        if column in self.unique:
+            index = self.unique[column]
+            return sorted({index[value] for value in values if value in index})
+        return None
+
+    def _scan(self, filters: List[Filter]) -> Iterator[Dict[str, Any]]:
+        """Candidate rows in id order, narrowed down by an index if possible"""
+        for column, op, arg in filters:
+            if op in ("eq", "in"):
+                ids = self._indexed(column, [arg] if op == "eq" else _split_list(arg))
+                if ids is not None:
+                    return (self.rows[i] for i in ids if i in self.rows)
+        start = 0
+        for column, op, arg in filters:
+            if column == "id" and op in ("gt", "gte"):
+                bisect = bisect_right if op == "gt" else bisect_left
+                start = max(start, bisect(self.ids, int(arg)))
+        return (self.rows[i] for i in self.ids[start:])
+
+    def select(
+        self,
+        filters: List[Filter],
+        order: List[Tuple[str, bool]] = (),
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        rows: Iterable[Dict[str, Any]] = (
+            row
+            for row in self._scan(filters)
+            if all(_matches(row, condition) for condition in filters)
+        )
+        if order and list(order) != [("id", False)]:
+            rows = list(rows)
+            for column, desc in reversed(order):
+                rows.sort(
+                    key=lambda row: (row.get(column) is None, row.get(column)),
+                    reverse=desc,
+                )
+        stop = offset + limit if limit is not None else None
+        return [dict(row) for row in islice(rows, offset, stop)]
+
+    def _check_unique(self, rows: List[Dict[str, Any]]) -> None:
+        for column, index in self.unique.items():
+            seen: Set[Any] = set()
+            for row in rows:
+                value = row.get(column)
+                if value is None:
+                    continue
+                owner = index.get(value)
+                if value in seen or (owner is not None and owner != row.get("id")):
+                    raise PostgrestError(
+                        409,
+                        "23505",
+                        "duplicate key value violates unique constraint "
+                        f'"{self.name}_{column}_key"',
+                        f"Key ({column})=({value}) already exists.",
+                    )
+                seen.add(value)
+
+    def _index(self, row: Dict[str, Any]) -> None:
+        for column, index in self.unique.items():
+            index[row[column]] = row["id"]
+
+    def _unindex(self, row: Dict[str, Any]) -> None:
+        for column, index in self.unique.items():
+            index.pop(row[column], None)
+
+    def insert(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        now = _now()
+        rows = [
+            {"created_at": now, "updated_at": now, **self.defaults, **item}
+            for item in items
+        ]
+        self._check_unique(rows)
+        for row in rows:
+            row.setdefault("id", next(self._next_id))
+            self.rows[row["id"]] = row
+            self.ids.insert(bisect_left(self.ids, row["id"]), row["id"])
+            self._index(row)
+        return [dict(row) for row in rows]
+
+    def update(
+        self, filters: List[Filter], changes: Dict[str, Any]
+    ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """Returns (old, new) pairs"""
+        old_rows = self.select(filters)
+        new_rows = [
+            {**row, "updated_at": _now(), **changes, "id": row["id"]}
+            for row in old_rows
+        ]
+        self._check_unique(new_rows)
+        for old, new in zip(old_rows, new_rows):
+            self._unindex(old)
+            self.rows[new["id"]] = new
+            self._index(new)
+        return [(old, dict(new)) for old, new in zip(old_rows, new_rows)]
+
+    def delete(self, filters: List[Filter]) -> List[Dict[str, Any]]:
+        deleted = self.select(filters)
+        for row in deleted:
+            del self.rows[row["id"]]
+            del self.ids[bisect_left(self.ids, row["id"])]
+            self._unindex(row)
+        return deleted
+
+
+class StandIn:
+    """Data, sessions and counters of one stand-in server"""
+
+    def __init__(self, issuer: str, jwt_secret: str, faults: Faults):
+        self.issuer = issuer
+        self.jwt_secret = jwt_secret
+        self.faults = faults
+        self.tables = {
+            "users": Table(
+                "users",
+                unique=("email", "username"),
+                is_active=True,
+                hashed_password="",
+            )
+        }
+        self.auth_users: Dict[str, Dict[str, Any]] = {}  # by email
+        self.passwords: Dict[str, str] = {}  # by user id
+        self.refresh_tokens: Dict[str, Tuple[str, str]] = {}  # -> user, session
+        self.revoked_sessions: Set[str] = set()
+        self.requests: Counter = Counter()
+        self.connections = 0
+        self._transports: "weakref.WeakSet[Any]" = weakref.WeakSet()
+        # Realtime: (socket, topic) -> postgres_changes bindings
+        self.channels: Dict[Tuple[web.WebSocketResponse, str], List[Dict]] = {}
+        self._binding_ids = count(1)
+
+    def count_connection(self, request: web.Request) -> None:
+        transport = request.transport
+        if transport is not None and transport not in self._transports:
+            self._transports.add(transport)
+            self.connections += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "requests": dict(self.requests),
+            "realtime_channels": len(self.channels),
+            "rows": {name: len(table.rows) for name, table in self.tables.items()},
+        }
+
+    def seed_users(self, users: int) -> None:
+        self.tables["users"].insert(
+            [
+                {
+                    "username": f"standin_{n}",
+                    "email": f"standin_{n}@example.com",
+                    "hashed_password": "",
+                }
+                for n in range(users)
+            ]
+        )
+
+    # Realtime
+
+    def notify(
+        self,
+        table: str,
+        change: str,
+        record: Optional[Dict[str, Any]],
+        old_record: Optional[Dict[str, Any]],
+    ) -> None:
+        for (socket, topic), bindings in list(self.channels.items()):
+            ids = [
+                binding["id"]
+                for binding in bindings
+                if binding.get("table") in (table, None)
+                and binding.get("event", "*") in ("*", change)
+            ]
+            if not ids:
+                continue
+            message = {
+                "topic": topic,
+                "event": "postgres_changes",
+                "payload": {
+                    "ids": ids,
+                    "data": {
+                        "schema": "public",
+                        "table": table,
+                        "commit_timestamp": _now(),
+                        "type": change,
+                        "record": record or {},
+                        "old_record": old_record or {},
+                        "columns": [],
+                        "errors": None,
+                    },
+                },
+                "ref": None,
+            }
+            asyncio.ensure_future(self._send(socket, message))
+
+    async def _send(self, socket: web.WebSocketResponse, message: Dict) -> None:
+        try:
+            await socket.send_json(message)
+        except (ConnectionError, RuntimeError):
+            pass
+
+    # Auth
+
+    def _user_json(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            **user,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "app_metadata": {"provider": "email", "providers": ["email"]},
+            "identities": [],
+            "is_anonymous": False,
+        }
+
+    def new_session(self, user: Dict[str, Any]) -> Dict[str, Any]:
+        session_id = str(uuid.uuid4())
+        issued_at = int(time.time())
+        access_token = jwt.encode(
+            {
+                "iss": self.issuer,
+                "sub": user["id"],
+                "aud": "authenticated",
+                "exp": issued_at + ACCESS_TOKEN_SECONDS,
+                "iat": issued_at,
+                "email": user["email"],
+                "role": "authenticated",
+                "session_id": session_id,
+                "user_metadata": user["user_metadata"],
+                "is_anonymous": False,
+            },
+            self.jwt_secret,
+            algorithm="HS256",
+        )
+        refresh_token = secrets.token_urlsafe(16)
+        self.refresh_tokens[refresh_token] = (user["email"], session_id)
+        return {
+            "access_token": access_token,
+            "token_type": "bearer",
+            "expires_in": ACCESS_TOKEN_SECONDS,
+            "expires_at": issued_at + ACCESS_TOKEN_SECONDS,
+            "refresh_token": refresh_token,
+            "user": self._user_json(user),
+        }
+
+    def claims(self, request: web.Request) -> Dict[str, Any]:
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        try:
+            claims = jwt.decode(
+                token, self.jwt_secret, algorithms=["HS256"], audience="authenticated"
+            )
+        except jwt.PyJWTError:
+            raise AuthError(
+                403, "bad_jwt", "invalid JWT: unable to parse or verify signature"
+            )
+        if claims.get("session_id") in self.revoked_sessions:
+            raise AuthError(
+                403,
+                "session_not_found",
+                "Session from session_id claim in JWT does not exist",
+            )
+        return claims
+
+
+def _parse_query(
+    request: web.Request,
+) -> Tuple[List[Filter], List[Tuple[str, bool]], Optional[int], int]:
+    filters = []
+    for column, value in request.query.items():
+        if column in RESERVED_PARAMS:
+            continue
+        op, _, arg = value.partition(".")
+        filters.append((column, op, arg))
+    order = []
+    for term in filter(None, request.query.get("order", "").split(",")):
+        column, _, direction = term.partition(".")
+        order.append((column, direction.startswith("desc")))
+    limit = request.query.get("limit")
+    offset = int(request.query.get("offset", 0))
+    return filters, order, int(limit) if limit is not None else None, offset
+
+
+def _project(rows: List[Dict[str, Any]], select: str) -> List[Dict[str, Any]]:
+    if select in ("", "*"):
+        return rows
+    columns = select.split(",")
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+
+def _representation(
+    request: web.Request, rows: List[Dict[str, Any]], status: int = 200
+) -> web.Response:
+    if "return=minimal" in request.headers.get("Prefer", ""):
+        return web.Response(status=204 if status == 200 else status)
+    return web.json_response(
+        _project(rows, request.query.get("select", "*")), status=status
+    )
+
+
+def _table(request: web.Request) -> Table:
+    standin: StandIn = request.app["standin"]
+    name = request.match_info["table"]
+    table = standin.tables.get(name)
+    if table is None:
+        raise PostgrestError(
+            404,
+            "PGRST205",
+            f"Could not find the table 'public.{name}' in the schema cache",
+        )
+    return table
+
+
+async def rest(request: web.Request) -> web.Response:
+    standin: StandIn = request.app["standin"]
+    try:
+        table = _table(request)
+        filters, order, limit, offset = _parse_query(request)
+        if request.method == "GET":
+            rows = table.select(filters, order, limit, offset)
+            return web.json_response(_project(rows, request.query.get("select", "*")))
+        if request.method == "POST":
+            body = await request.json()
+            created = table.insert(body if isinstance(body, list) else [body])
+            for row in created:
+                standin.notify(table.name, "INSERT", row, None)
+            return _representation(request, created, status=201)
+        if request.method == "PATCH":
+            changed = table.update(filters, await request.json())
+            for old, new in changed:
+                standin.notify(table.name, "UPDATE", new, old)
+            return _representation(request, [new for _, new in changed])
+        if request.method == "DELETE":
+            deleted = table.delete(filters)
+            for row in deleted:
+                standin.notify(table.name, "DELETE", None, row)
+            return _representation(request, deleted)
+        raise PostgrestError(
+            405, "PGRST117", f"Unsupported HTTP method: {request.method}"
+        )
+    except PostgrestError as e:
+        return web.json_response(e.body, status=e.status)
+    except (ValueError, KeyError) as e:
+        return web.json_response(
+            {"code": "PGRST100", "message": str(e), "details": "", "hint": None},
+            status=400,
+        )
+
+
+async def auth(request: web.Request) -> web.Response:
+    standin: StandIn = request.app["standin"]
+    endpoint = request.match_info["endpoint"]
+    try:
+        if endpoint == "signup" and request.method == "POST":
+            body = await request.json()
+            if body["email"] in standin.auth_users:
+                raise AuthError(422, "user_already_exists", "User already registered")
+            now = _now()
+            user = {
+                "id": str(uuid.uuid4()),
+                "email": body["email"],
+                "user_metadata": body.get("data") or {},
+                "created_at": now,
+                "updated_at": now,
+                "email_confirmed_at": now,
+                "confirmed_at": now,
+            }
+            standin.auth_users[user["email"]] = user
+            standin.passwords[user["id"]] = body["password"]
+            return web.json_response(standin.new_session(user))
+
+        if endpoint == "token" and request.method == "POST":
+            body = await request.json()
+            grant_type = request.query.get("grant_type")
+            if grant_type == "password":
+                user = standin.auth_users.get(body.get("email"))
+                if user is None or standin.passwords[user["id"]] != body.get(
+                    "password"
+                ):
+                    raise AuthError(
+                        400, "invalid_credentials", "Invalid login credentials"
+                    )
+                user["last_sign_in_at"] = _now()
+                return web.json_response(standin.new_session(user))
+            if grant_type == "refresh_token":
+                owner = standin.refresh_tokens.pop(body.get("refresh_token"), None)
+                if owner is None or owner[1] in standin.revoked_sessions:
+                    raise AuthError(
+                        400,
+                        "refresh_token_not_found",
+                        "Invalid Refresh Token: Refresh Token Not Found",
+                    )
+                return web.json_response(
+                    standin.new_session(standin.auth_users[owner[0]])
+                )
+            raise AuthError(400, "validation_failed", "Unsupported grant type")
+
+        if endpoint == "user" and request.method == "GET":
+            claims = standin.claims(request)
+            user = standin.auth_users.get(claims.get("email"))
+            if user is None:
+                raise AuthError(
+                    404, "user_not_found", "User from sub claim in JWT does not exist"
+                )
+            return web.json_response(standin._user_json(user))
+
+        if endpoint == "logout" and request.method == "POST":
+            claims = standin.claims(request)
+            if request.query.get("scope", "global") == "local":
+                standin.revoked_sessions.add(claims["session_id"])
+            else:
+                standin.revoked_sessions.update(
+                    session_id
+                    for email, session_id in standin.refresh_tokens.values()
+                    if email == claims["email"]
+                )
+                standin.revoked_sessions.add(claims["session_id"])
+            return web.Response(status=204)
+
+        if endpoint == ".well-known/jwks.json" and request.method == "GET":
+            return web.json_response({"keys": []})
+
+        raise AuthError(404, "not_found", f"Unsupported: {request.method} {endpoint}")
+    except AuthError as e:
+        return web.json_response(e.body, status=e.status)
+    except (ValueError, KeyError) as e:
+        return web.json_response(
+            {"code": 400, "error_code": "bad_json", "msg": str(e)}, status=400
+        )
+
+
+async def realtime(request: web.Request) -> web.WebSocketResponse:
+    standin: StandIn = request.app["standin"]
+    socket = web.WebSocketResponse()
+    await socket.prepare(request)
+    try:
+        async for message in socket:
+            if message.type != WSMsgType.TEXT:
+                continue
+            data = json.loads(message.data)
+            topic, event = data.get("topic"), data.get("event")
+            response: Dict[str, Any] = {}
+            if event == "phx_join":
+                config = (data.get("payload") or {}).get("config") or {}
+                bindings = [
+                    {**change, "id": next(standin._binding_ids)}
+                    for change in config.get("postgres_changes", [])
+                ]
+                standin.channels[(socket, topic)] = bindings
+                response = {"postgres_changes": bindings}
+            elif event == "phx_leave":
+                standin.channels.pop((socket, topic), None)
+            await socket.send_json(
+                {
+                    "topic": topic,
+                    "event": "phx_reply",
+                    "payload": {"status": "ok", "response": response},
+                    "ref": data.get("ref"),
+                    "join_ref": data.get("join_ref"),
+                }
+            )
+    finally:
+        for key in [key for key in standin.channels if key[0] is socket]:
+            del standin.channels[key]
+    return socket
+
+
+async def get_faults(request: web.Request) -> web.Response:
+    return web.json_response(asdict(request.app["standin"].faults))
+
+
+async def patch_faults(request: web.Request) -> web.Response:
+    faults: Faults = request.app["standin"].faults
+    names = {field.name for field in fields(Faults)}
+    for name, value in (await request.json()).items():
+        if name not in names:
+            return web.json_response({"error": f"unknown fault {name}"}, status=400)
+        setattr(faults, name, type(getattr(faults, name))(value))
+    return web.json_response(asdict(faults))
+
+
+async def get_stats(request: web.Request) -> web.Response:
+    return web.json_response(request.app["standin"].stats())
+
+
+@web.middleware
+async def inject_faults(request: web.Request, handler) -> web.StreamResponse:
+    standin: StandIn = request.app["standin"]
+    standin.count_connection(request)
+    api = request.path.strip("/").split("/", 1)[0]
+    if api not in ("rest", "auth"):
+        return await handler(request)
+
+    faults = standin.faults
+    delay = faults.latency_ms
+    if faults.jitter_ms:
+        delay += random.expovariate(1 / faults.jitter_ms)
+    if delay:
+        await asyncio.sleep(delay / 1000)
+    if faults.stall_rate and random.random() < faults.stall_rate:
+        standin.requests[f"{api} stalled"] += 1
+        await asyncio.sleep(faults.stall_seconds)
+        if request.transport is None or request.transport.is_closing():
+            # The client timed out and went away; nginx logs this as 499
+            return web.Response(status=499)
+    if faults.error_rate and random.random() < faults.error_rate:
+        standin.requests[f"{api} {faults.error_status} injected"] += 1
+        return web.json_response(
+            {
+                "code": "STANDIN",
+                "message": "Injected failure",
+                "msg": "Injected failure",
+            },
+            status=faults.error_status,
+        )
+    response = await handler(request)
+    standin.requests[f"{api} {response.status}"] += 1
+    return response
+
+
+def create_app(standin: StandIn) -> web.Application:
+    app = web.Application(middlewares=[inject_faults])
+    app["standin"] = standin
+    app.router.add_route("*", "/rest/v1/{table}", rest)
+    app.router.add_route("*", "/auth/v1/{endpoint:.+}", auth)
+    app.router.add_get("/realtime/v1/websocket", realtime)
+    app.router.add_get("/standin/faults", get_faults)
+    app.router.add_patch("/standin/faults", patch_faults)
+    app.router.add_get("/standin/stats", get_stats)
+    return app
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    """The Faults fields as command-line options, e.g. `--latency-ms`"""
+    defaults = Faults()
+    for field in fields(Faults):
+        parser.add_argument(
+            f"--{field.name.replace('_', '-')}",
+            type=type(getattr(defaults, field.name)),
+            default=getattr(defaults, field.name),
+        )
+
+
+def faults_from_args(args: argparse.Namespace) -> Faults:
+    return Faults(**{field.name: getattr(args, field.name) for field in fields(Faults)})
+
+
+def main() -> None:
+    url = urlparse(os.environ["SUPABASE_URL"])
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default=url.hostname or "127.0.0.1")
+    parser.add_argument("--port", type=int, default=url.port or 54321)
+    parser.add_argument("--users", type=int, default=0, help="rows seeded in users")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    standin = StandIn(
+        # Must match the app's JWT_ISSUER default, derived from SUPABASE_URL
+        issuer=f"{os.environ['SUPABASE_URL'].rstrip('/')}/auth/v1",
+        jwt_secret=os.environ["JWT_SECRET"],
+        faults=faults_from_args(args),
+    )
+    standin.seed_users(args.users)
+    print(f"Supabase stand-in on http://{args.host}:{args.port}", flush=True)
+    web.run_app(
+        create_app(standin),
+        host=args.host,
+        port=args.port,
+        print=None,
+        access_log=None,
+    )
+
+
+if __name__ == "__main__":
+    main()
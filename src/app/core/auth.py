@@ -1,18 +1,143 @@
-import jwt
+import asyncio
+import copy
+import hashlib
+import logging
+import time
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+import httpx
+import jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from supabase import Client
 
+from app.core.cache import LRUCache
 from app.core.config import settings
+from app.core.resilience import upstream_error
 from app.core.supabase import get_supabase_client
 
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+logger = logging.getLogger(__name__)
+
 security = HTTPBearer()
 
+# Failures that mean "this worker cannot decide", as opposed to "token is bad"
+_LOCALLY_UNVERIFIABLE = (jwt.PyJWKClientError, jwt.InvalidAlgorithmError)
+
+
+class JWKSCache:
+    """Caches the Supabase Auth signing keys used for asymmetric JWTs"""
+
+    def __init__(self, url: str, ttl: float, min_refresh_interval: float = 30.0):
+        self.url = url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._fetched_at is not None
+            and time.monotonic() - self._fetched_at < self.ttl
+        )
+
+    def _may_refresh(self) -> bool:
+        # Unknown kids trigger a refresh (key rotation), but not more often than
+        # `min_refresh_interval`, so forged kids cannot hammer Supabase.
+        return (
+            self._fetched_at is None
+            or not self._is_fresh()
+            or time.monotonic() - self._fetched_at >= self.min_refresh_interval
+        )
+
+    async def _refresh(self) -> None:
+        try:
+            async with httpx.AsyncClient(timeout=5.0) as client:
+                response = await client.get(
+                    self.url, headers={"apikey": settings.SUPABASE_ANON_KEY}
+                )
+                response.raise_for_status()
+            jwk_set = jwt.PyJWKSet.from_dict(response.json())
+        except (httpx.HTTPError, ValueError, jwt.PyJWKSetError) as e:
+            raise jwt.PyJWKClientConnectionError(f"Failed to fetch JWKS: {str(e)}")
+
+        self._keys = {key.key_id: key for key in jwk_set.keys if key.key_id}
+        self._fetched_at = time.monotonic()
+
+    def clear(self) -> None:
+        """Fetch the keys again on next use, such as after a rotation"""
+        self._keys = {}
+        self._fetched_at = None
+
+    async def get_signing_key(self, kid: Optional[str]) -> jwt.PyJWK:
+        """Return the signing key for `kid`, fetching the JWKS when needed"""
+        if kid is None:
+            raise jwt.PyJWKClientError("Token header has no `kid`")
+
+        key = self._keys.get(kid) if self._is_fresh() else None
+        if key is None:
+            async with self._lock:
+                if self._keys.get(kid) is None or not self._is_fresh():
+                    if self._may_refresh():
+                        await self._refresh()
+                key = self._keys.get(kid)
+
+        if key is None:
+            raise jwt.PyJWKClientError(f"No signing key found for kid {kid!r}")
+        return key
+
+
+jwks_cache = JWKSCache(settings.jwt_jwks_url, ttl=settings.JWT_JWKS_CACHE_SECONDS)
+
+# Keyed by the SHA-256 digest of the token so raw tokens are not kept in memory
+verified_token_cache: LRUCache[Dict[str, Any]] = LRUCache(
+    max_size=settings.AUTH_TOKEN_CACHE_SIZE,
+    default_ttl=settings.AUTH_TOKEN_CACHE_TTL_SECONDS,
+)
+
+verification_counts: Counter = Counter()
+
+
+def invalidate_verified_tokens(digests: List[str]) -> None:
+    """Forget the verified tokens with these hex SHA-256 digests, such as
+    revoked ones"""
+    for digest in digests:
+        try:
+            key = bytes.fromhex(digest)
+        except (TypeError, ValueError):
+            # One bad digest must not keep the others of the batch cached
+            logger.warning("Invalid token digest to invalidate: %r", digest)
+            continue
+        verified_token_cache.delete(key)
+
+
+def clear_auth_caches() -> None:
+    verified_token_cache.clear()
+    jwks_cache.clear()
+
+
+def get_auth_stats() -> Dict[str, Any]:
+    """Verified-token cache and verification counters"""
+    return {
+        "token_cache": verified_token_cache.stats(),
+        "verifications": dict(verification_counts),
+    }
+
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 
 class AuthService:
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: "AsyncClient"):
         self.supabase = supabase
 
     def create_access_token(
@@ -41,34 +166,86 @@ class AuthService:
             )
             return payload
         except jwt.PyJWTError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+            raise _credentials_exception()
 
-    async def get_current_user(self, token: str) -> dict:
-        """Get current user from token"""
+    async def _verify_locally(self, token: str) -> dict:
+        """Check signature, `exp`, `aud` and `iss` without a network call"""
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg") or ""
+
+        if algorithm.startswith("HS"):
+            if algorithm != settings.JWT_ALGORITHM:
+                raise jwt.InvalidAlgorithmError(f"Unexpected algorithm {algorithm}")
+            key: Any = settings.JWT_SECRET
+        else:
+            signing_key = await jwks_cache.get_signing_key(header.get("kid"))
+            key = signing_key.key
+            algorithm = signing_key.algorithm_name
+
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.JWT_AUDIENCE,
+            issuer=settings.jwt_issuer,
+            leeway=settings.JWT_LEEWAY_SECONDS,
+            options={"require": ["exp", "sub"]},
+        )
+
+    async def _verify_remotely(self, token: str) -> dict:
+        """Verify token with Supabase Auth"""
         try:
-            # Verify token with Supabase
-            response = self.supabase.auth.get_user(token)
-            if response.user:
-                return response.user
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid authentication credentials",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
+            response = await self.supabase.auth.get_user(token)
         except Exception as e:
+            # An outage of Supabase Auth is a 503 or 504, not a bad token
+            upstream = upstream_error(e)
+            if upstream is not None:
+                raise upstream
+            raise _credentials_exception()
+
+        if not response or not response.user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate credentials",
+                detail="Invalid authentication credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        # Supabase vouched for the token, so its claims can be read as-is
+        return jwt.decode(token, options={"verify_signature": False})
+
+    async def get_current_user(self, token: str) -> dict:
+        """Get the verified claims of the current user's token"""
+        cache_key = hashlib.sha256(token.encode()).digest()
+        claims = verified_token_cache.get(cache_key)
+        if claims is not None:
+            # Shared by every request with this token: each gets its own copy
+            return copy.deepcopy(claims)
+
+        if settings.AUTH_VERIFY_LOCALLY:
+            try:
+                claims = await self._verify_locally(token)
+                verification_counts["local"] += 1
+            except _LOCALLY_UNVERIFIABLE:
+                if not settings.AUTH_REMOTE_FALLBACK:
+                    verification_counts["rejected"] += 1
+                    raise _credentials_exception()
+                claims = await self._verify_remotely(token)
+                verification_counts["remote_fallback"] += 1
+            except jwt.PyJWTError:
+                verification_counts["rejected"] += 1
+                raise _credentials_exception()
+        else:
+            claims = await self._verify_remotely(token)
+            verification_counts["remote"] += 1
+
+        # Never cache a token beyond its own expiry
+        expires_in = claims.get("exp", 0) - time.time()
+        verified_token_cache.set(cache_key, claims, ttl=expires_in)
+        return copy.deepcopy(claims)
 
 
-def get_auth_service(supabase: Client = Depends(get_supabase_client)) -> AuthService:
+def get_auth_service(
+    supabase: "AsyncClient" = Depends(get_supabase_client),
+) -> AuthService:
     return AuthService(supabase)
 
 
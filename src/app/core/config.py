@@ -1,3 +1,5 @@
+from typing import Dict, Literal, Optional
+
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -10,8 +12,87 @@ class Settings(BaseSettings):
     SUPABASE_ANON_KEY: str = Field(..., description="Supabase anonymous key")
     SUPABASE_SERVICE_ROLE_KEY: str = Field(..., description="Supabase service role key")
 
+    # Supabase HTTP connection pool (per worker and role)
+    SUPABASE_HTTP2: bool = Field(default=True, description="Use HTTP/2 when offered")
+    SUPABASE_POOL_MAX_CONNECTIONS: int = Field(
+        default=100, description="Max open connections to Supabase"
+    )
+    SUPABASE_POOL_MAX_KEEPALIVE: int = Field(
+        default=20, description="Max idle connections kept alive"
+    )
+    SUPABASE_POOL_KEEPALIVE_EXPIRY: float = Field(
+        default=30.0, description="Seconds an idle connection is kept alive"
+    )
+    SUPABASE_TIMEOUT_SECONDS: float = Field(
+        default=10.0, description="Timeout for Supabase HTTP calls"
+    )
+
+    # Supabase call policy (per worker)
+    SUPABASE_OPERATION_TIMEOUTS: Dict[str, float] = Field(
+        default={"rest:read": 5.0, "rest:write": 10.0, "auth:read": 3.0},
+        description=(
+            "Timeout per attempt of a call, by '<api>:read' (GET, HEAD) or "
+            "'<api>:write'; others use SUPABASE_TIMEOUT_SECONDS"
+        ),
+    )
+    SUPABASE_RETRY_ATTEMPTS: int = Field(
+        default=2, description="Retries of a failed read (writes are never retried)"
+    )
+    SUPABASE_RETRY_BACKOFF_SECONDS: float = Field(
+        default=0.05, description="Backoff before the first retry, doubled after"
+    )
+    SUPABASE_RETRY_BACKOFF_MAX_SECONDS: float = Field(
+        default=1.0, description="Cap of the backoff between retries"
+    )
+    SUPABASE_BREAKER_FAILURE_THRESHOLD: int = Field(
+        default=5, description="Consecutive failures of an API that open its breaker"
+    )
+    SUPABASE_BREAKER_RESET_SECONDS: float = Field(
+        default=10.0, description="Seconds an open breaker fails calls fast"
+    )
+    SUPABASE_HEDGE_DELAY_MS: Optional[float] = Field(
+        default=None,
+        description=(
+            "Send a second copy of a read still unanswered after this; "
+            "None disables hedging"
+        ),
+    )
+
     # Database (Supabase PostgreSQL)
     DATABASE_URL: str = Field(..., description="Supabase PostgreSQL URL")
+    DB_POOL_SIZE: int = Field(default=10, description="Connections kept open")
+    DB_MAX_OVERFLOW: int = Field(
+        default=10, description="Extra connections opened under load, then closed"
+    )
+    DB_POOL_TIMEOUT_SECONDS: float = Field(
+        default=30.0, description="Max wait for a free connection"
+    )
+    DB_POOL_RECYCLE_SECONDS: int = Field(
+        default=1800, description="Reconnect connections older than this (-1: never)"
+    )
+    DB_POOL_PRE_PING: bool = Field(
+        default=True, description="Check connections are alive before using them"
+    )
+    DB_POOL_WARMUP_CONNECTIONS: Optional[int] = Field(
+        default=None,
+        description="Connections opened at startup, defaults to DB_POOL_SIZE",
+    )
+    DB_POOL_WARMUP_TIMEOUT_SECONDS: float = Field(
+        default=5.0,
+        description="How long startup waits for them; the rest open on first use",
+    )
+    DB_STATEMENT_CACHE_SIZE: int = Field(
+        default=100, description="Prepared statements cached per connection"
+    )
+    DB_PGBOUNCER_MODE: bool = Field(
+        default=False,
+        description="Disable prepared statement caching, for transaction pooling",
+    )
+    DB_DEADLINE_STATEMENT_TIMEOUT: bool = Field(
+        default=True,
+        description="Cap each transaction's statement_timeout at the request's "
+        "remaining deadline, at the cost of a round trip per transaction",
+    )
 
     # JWT Configuration
     JWT_SECRET: str = Field(..., description="JWT secret key")
@@ -19,11 +100,241 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(
         default=30, description="Token expiration time"
     )
+    JWT_AUDIENCE: str = Field(
+        default="authenticated", description="Expected `aud` claim"
+    )
+    JWT_ISSUER: Optional[str] = Field(
+        default=None,
+        description="Expected `iss` claim, defaults to the Supabase Auth URL",
+    )
+    JWT_LEEWAY_SECONDS: int = Field(
+        default=10, description="Clock skew tolerated on `exp`/`nbf`"
+    )
+    JWT_JWKS_URL: Optional[str] = Field(
+        default=None,
+        description="JWKS endpoint for asymmetric keys, defaults to Supabase Auth",
+    )
+    JWT_JWKS_CACHE_SECONDS: int = Field(
+        default=600, description="How long a fetched JWKS is trusted"
+    )
+    AUTH_VERIFY_LOCALLY: bool = Field(
+        default=True, description="Verify access tokens without calling Supabase"
+    )
+    AUTH_REMOTE_FALLBACK: bool = Field(
+        default=False,
+        description="Ask Supabase Auth when a token cannot be verified locally",
+    )
+    AUTH_TOKEN_CACHE_SIZE: int = Field(
+        default=10_000, description="Max number of verified tokens kept in memory"
+    )
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = Field(
+        default=300, description="Upper bound on how long a verified token is cached"
+    )
+
+    # Password hashing (bcrypt in a process pool)
+    PASSWORD_HASH_WORKERS: Optional[int] = Field(
+        default=None, description="Hashing processes per worker, defaults to CPUs"
+    )
+    PASSWORD_HASH_QUEUE_SIZE: int = Field(
+        default=64, description="Hash operations allowed to wait for a process"
+    )
+    PASSWORD_HASH_ROUNDS: Optional[int] = Field(
+        default=None, description="Fixed bcrypt cost, disables calibration"
+    )
+    PASSWORD_HASH_TARGET_MS: int = Field(
+        default=250, description="Hash latency the startup calibration aims for"
+    )
+    PASSWORD_HASH_MIN_ROUNDS: int = Field(default=10, description="Lowest bcrypt cost")
+    PASSWORD_HASH_MAX_ROUNDS: int = Field(default=15, description="Highest bcrypt cost")
+
+    # Where users are stored
+    USER_REPOSITORY_BACKEND: Literal["sqlalchemy", "supabase", "memory"] = Field(
+        default="sqlalchemy",
+        description="Users table via SQLAlchemy or PostgREST, or in process memory",
+    )
+
+    # User lookup cache (per worker)
+    USER_CACHE_ENABLED: bool = Field(default=True, description="Cache user lookups")
+    USER_CACHE_SIZE: int = Field(default=10_000, description="Max cached users")
+    USER_CACHE_TTL_SECONDS: float = Field(
+        default=60.0, description="Upper bound on how long a user is cached"
+    )
+    USER_CACHE_NEGATIVE_TTL_SECONDS: float = Field(
+        default=5.0, description="How long a lookup that found no user is cached"
+    )
+    USER_CACHE_REALTIME_INVALIDATION: bool = Field(
+        default=True,
+        description="Invalidate cached users on Supabase Realtime change events",
+    )
+
+    USER_SINGLE_FLIGHT_ENABLED: bool = Field(
+        default=True,
+        description="Share one query between concurrent identical user lookups",
+    )
+    USER_BATCH_LOOKUPS_ENABLED: bool = Field(
+        default=True,
+        description="Resolve user lookups made in the same tick with one query",
+    )
+
+    # Cache invalidation bus (Postgres LISTEN/NOTIFY, one connection per worker)
+    CACHE_INVALIDATION_BUS_ENABLED: bool = Field(
+        default=False,
+        description=(
+            "Invalidate cached users and tokens on notifications from the "
+            "database (apply supabase/migrations first)"
+        ),
+    )
+    CACHE_INVALIDATION_DATABASE_URL: Optional[str] = Field(
+        default=None,
+        description=(
+            "Direct or session-pooled connection to listen on, if DATABASE_URL "
+            "goes through transaction pooling, which drops LISTEN"
+        ),
+    )
+    CACHE_INVALIDATION_BATCH_MS: float = Field(
+        default=10.0, description="Notifications within this are delivered together"
+    )
+    CACHE_INVALIDATION_HEARTBEAT_SECONDS: float = Field(
+        default=15.0, description="How often the listening connection is checked"
+    )
+
+    # Bulk export and bulk writes
+    USER_EXPORT_BATCH_SIZE: int = Field(
+        default=1000, description="Rows fetched and flushed per export chunk"
+    )
+    USER_BULK_MAX_ITEMS: int = Field(
+        default=1000, description="Max items in one bulk create/update/delete"
+    )
+
+    # Realtime change callbacks (per subscription)
+    REALTIME_DISPATCH_WORKERS: int = Field(
+        default=1, description="Callbacks running at once; 1 keeps them in order"
+    )
+    REALTIME_DISPATCH_QUEUE_SIZE: int = Field(
+        default=10_000, description="Change events waiting for a callback"
+    )
+    REALTIME_DISPATCH_OVERFLOW: Literal["drop_oldest", "drop_newest"] = Field(
+        default="drop_oldest", description="Which event a full queue drops"
+    )
+
+    # Realtime fan-out to WebSocket/SSE clients (per worker)
+    REALTIME_SUBSCRIBER_QUEUE_SIZE: int = Field(
+        default=256, description="Changes queued per client before it is slow"
+    )
+    REALTIME_SLOW_CONSUMER_POLICY: Literal["drop", "coalesce", "disconnect"] = Field(
+        default="coalesce",
+        description="For a full client queue: drop the oldest change, keep the "
+        "latest per row, or disconnect the client",
+    )
+    REALTIME_MAX_SUBSCRIBERS: int = Field(
+        default=10_000, description="Max realtime clients connected to a worker"
+    )
+    REALTIME_SSE_PING_SECONDS: int = Field(
+        default=15, description="Keep-alive comment interval on SSE streams"
+    )
+
+    # Response encoding
+    RESPONSE_MSGPACK_ENABLED: bool = Field(
+        default=False,
+        description="Answer `Accept: application/msgpack` with MessagePack, "
+        "for internal clients; needs the msgpack extra",
+    )
+
+    # Admission control (per worker): rate limits per client and route class
+    # Off by default: behind a proxy every client shares the proxy's IP, and so
+    # one bucket, until RATE_LIMIT_CLIENT_HEADER or forwarded headers are set up
+    RATE_LIMIT_ENABLED: bool = Field(default=False, description="Rate limit clients")
+    RATE_LIMIT_READ_RATE: float = Field(
+        default=50.0, description="Reads per second allowed per client"
+    )
+    RATE_LIMIT_READ_BURST: int = Field(default=100, description="Read burst size")
+    RATE_LIMIT_WRITE_RATE: float = Field(
+        default=10.0, description="Writes per second allowed per client"
+    )
+    RATE_LIMIT_WRITE_BURST: int = Field(default=20, description="Write burst size")
+    RATE_LIMIT_AUTH_RATE: float = Field(
+        default=0.2, description="Auth calls per second allowed per client"
+    )
+    RATE_LIMIT_AUTH_BURST: int = Field(default=5, description="Auth burst size")
+    RATE_LIMIT_MAX_KEYS: int = Field(
+        default=100_000, description="Clients tracked per route class"
+    )
+    RATE_LIMIT_CLIENT_HEADER: Optional[str] = Field(
+        default=None,
+        description="Header a trusted gateway sets to identify the client (an "
+        "API key id), used before the user id and the IP address",
+    )
+
+    # Load shedding (per worker)
+    LOAD_SHED_ENABLED: bool = Field(
+        default=True, description="Reject requests while the worker is overloaded"
+    )
+    LOAD_SHED_MAX_LOOP_LAG_MS: float = Field(
+        default=200.0, description="Event loop lag above which requests are shed"
+    )
+    LOAD_SHED_MAX_IN_FLIGHT: int = Field(
+        default=500, description="Requests handled at once before new ones are shed"
+    )
+
+    # Request deadlines: X-Request-Timeout (seconds) or X-Request-Deadline
+    # (Unix time) can shorten them
+    REQUEST_TIMEOUT_SECONDS: Optional[float] = Field(
+        default=30.0, description="Deadline of a request, None for no deadline"
+    )
+    REQUEST_TIMEOUT_ROUTES: Dict[str, Optional[float]] = Field(
+        default={
+            "/api/v1/users/bulk": 120.0,
+            "/api/v1/users/export": None,
+            "/api/v1/realtime/": None,
+        },
+        description="Deadlines by path prefix, the longest match wins",
+    )
+
+    # Event loop watchdog (per worker)
+    LOOP_WATCHDOG_ENABLED: bool = Field(
+        default=True, description="Log callbacks that block the event loop"
+    )
+    LOOP_WATCHDOG_THRESHOLD_MS: float = Field(
+        default=100.0, description="How long a callback may block the event loop"
+    )
+    LOOP_WATCHDOG_STRICT: bool = Field(
+        default=False,
+        description="Fail requests whose handler blocked the event loop, for "
+        "tests and benchmarks",
+    )
+
+    # Observability
+    METRICS_ENABLED: bool = Field(
+        default=True, description="Record metrics and serve them on /metrics"
+    )
+    PROFILER_ENABLED: bool = Field(
+        default=False, description="Allow profiling single requests on demand"
+    )
+    PROFILER_TOKEN: Optional[str] = Field(
+        default=None, description="Requests with `X-Profile: <token>` are profiled"
+    )
+    PROFILER_SAMPLE_RATE: float = Field(
+        default=0.0, description="Fraction of requests profiled at random"
+    )
+    PROFILER_INTERVAL_MS: float = Field(
+        default=5.0, description="Sampling interval of the request profiler"
+    )
+    PROFILER_OUTPUT_DIR: str = Field(
+        default="profiles", description="Where collapsed-stack profiles are written"
+    )
 
     # Application
     DEBUG: bool = Field(default=False, description="Debug mode")
     ENVIRONMENT: str = Field(default="development", description="Environment")
     API_V1_PREFIX: str = Field(default="/api/v1", description="API v1 prefix")
 
+    @property
+    def jwt_issuer(self) -> str:
+        return self.JWT_ISSUER or f"{self.SUPABASE_URL.rstrip('/')}/auth/v1"
+
+    @property
+    def jwt_jwks_url(self) -> str:
+        return self.JWT_JWKS_URL or f"{self.jwt_issuer}/.well-known/jwks.json"
+
 
 settings = Settings()
@@ -0,0 +1,85 @@
+import asyncio
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Set,
+    TypeVar,
+)
+
+from app.core import deadline
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class DataLoader(Generic[K, V]):
+    """Batches the `load` calls made in one event-loop tick into a single
+    `batch_load` call.
+
+    `batch_load` receives the distinct keys and returns the values found, by
+    key; each caller then gets the value of its own key, or None. Callers
+    asking for the same key share one result, and a cancelled caller does
+    not cancel it for the others. Batches run without any caller's deadline;
+    each caller waits only until its own.
+    """
+
+    def __init__(
+        self,
+        batch_load: Callable[[List[K]], Awaitable[Dict[K, V]]],
+        max_batch_size: int = 1000,
+    ):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[K, "asyncio.Future[Optional[V]]"] = {}
+        # The event loop only keeps weak references to running tasks
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self.loads = 0
+        self.batches = 0
+
+    async def load(self, key: K) -> Optional[V]:
+        self.loads += 1
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                # Runs once the callers already scheduled in this tick are done
+                with deadline.detached():
+                    loop.call_soon(self._dispatch)
+            future = self._pending[key] = loop.create_future()
+        return await deadline.wait(asyncio.shield(future))
+
+    async def load_many(self, keys: List[K]) -> List[Optional[V]]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        for start in range(0, len(keys), self.max_batch_size):
+            batch = {
+                key: pending[key] for key in keys[start : start + self.max_batch_size]
+            }
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: Dict[K, "asyncio.Future[Optional[V]]"]) -> None:
+        self.batches += 1
+        try:
+            values = await self.batch_load(list(batch))
+            for key, future in batch.items():
+                if not future.done():
+                    future.set_result(values.get(key))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Cancelled, such as on shutdown: its callers must not wait forever
+            for future in batch.values():
+                if not future.done():
+                    future.cancel()
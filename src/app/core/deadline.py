@@ -0,0 +1,69 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+from app.core.exceptions import DeadlineExceededException
+
+T = TypeVar("T")
+
+# time.monotonic() by which the current request must be answered
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(timeout: Optional[float]) -> Iterator[None]:
+    """Work done inside, and the tasks it starts, must finish within
+    `timeout` seconds, or by the enclosing deadline if that is sooner"""
+    if timeout is None:
+        yield
+        return
+    deadline = time.monotonic() + timeout
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def detached() -> Iterator[None]:
+    """Tasks started inside run without the current deadline, such as work
+    shared by several requests, which each wait for it with `wait`"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+async def wait(awaitable: "asyncio.Future[T]") -> T:
+    """Await a shielded shared result until the current deadline, raising
+    DeadlineExceededException once it passes"""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(left, 0.0))
+    except asyncio.TimeoutError:
+        raise DeadlineExceededException("Request deadline exceeded") from None
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline; None without one"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check() -> None:
+    """Raise DeadlineExceededException once the current deadline has passed,
+    before starting work that could not be interrupted"""
+    if expired():
+        raise DeadlineExceededException("Request deadline exceeded")
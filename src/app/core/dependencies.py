@@ -1,11 +1,13 @@
-from typing import AsyncGenerator
+from typing import TYPE_CHECKING, AsyncGenerator
 
-from sqlalchemy.ext.asyncio import AsyncSession
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.infrastructure.database.connection import async_session_maker
 
+async def get_db() -> AsyncGenerator["AsyncSession", None]:
+    # Imported here so that only the SQLAlchemy backend loads SQLAlchemy
+    from app.infrastructure.database.connection import async_session_maker
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         try:
             yield session
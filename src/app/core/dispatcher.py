@@ -0,0 +1,199 @@
+import asyncio
+import itertools
+import logging
+import time
+import weakref
+from collections import OrderedDict
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+from app.core import deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+OverflowPolicy = Literal["drop_oldest", "drop_newest"]
+
+# Dispatchers with running workers, for /metrics
+_dispatchers: "weakref.WeakSet[Dispatcher]" = weakref.WeakSet()
+
+
+def get_dispatcher_stats() -> List[Tuple[Dict[str, str], Dict[str, Any]]]:
+    """Queue depth, lag and drop counters of each running dispatcher"""
+    return [
+        ({"dispatcher": dispatcher.name}, dispatcher.stats())
+        for dispatcher in list(_dispatchers)
+    ]
+
+
+class Dispatcher(Generic[T]):
+    """Runs a callback on submitted items with a fixed number of workers.
+
+    `submit` never blocks and never creates a task: items wait in a queue of
+    at most `queue_size`, and when it is full `overflow` drops the oldest
+    queued item or the new one. With `batch_size`, the callback receives a
+    list of up to that many items per call instead of one item. With
+    `coalesce_key`, an item replaces a queued one with the same key, keeping
+    its place. After an idle period, workers wait `flush_interval` seconds
+    from the first item before taking any, which gives coalescing and
+    batching a window.
+
+    The callback may be sync or async; its exceptions are logged and
+    counted. With more than one worker, calls run concurrently and may
+    complete out of order.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[Any], Any],
+        name: str = "dispatcher",
+        workers: int = 1,
+        queue_size: int = 10_000,
+        overflow: OverflowPolicy = "drop_oldest",
+        batch_size: Optional[int] = None,
+        flush_interval: float = 0.0,
+        coalesce_key: Optional[Callable[[T], Optional[Hashable]]] = None,
+    ):
+        if workers <= 0 or queue_size <= 0:
+            raise ValueError("workers and queue_size must be positive")
+        self.callback = callback
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.overflow = overflow
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.coalesce_key = coalesce_key
+        # slot -> (enqueued at, item); slots are coalescing keys or sequence
+        # numbers
+        self._queue: "OrderedDict[Hashable, Tuple[float, T]]" = OrderedDict()
+        self._sequence = itertools.count()
+        self._ready: Optional[asyncio.Event] = None
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._closing = False
+        self.submitted = 0
+        self.dispatched = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        """Start the workers; done by the first `submit` if not called"""
+        if self._tasks:
+            return
+        self._ready = asyncio.Event()
+        # Workers outlive the request that may have started them
+        with deadline.detached():
+            self._tasks = [
+                asyncio.create_task(self._work(), name=f"{self.name}-{n}")
+                for n in range(self.workers)
+            ]
+        _dispatchers.add(self)
+
+    def submit(self, item: T) -> bool:
+        """Queue an item from the event loop; False if it was dropped"""
+        if self._closing:
+            self.dropped += 1
+            return False
+        self.start()
+        self.submitted += 1
+        key = self.coalesce_key(item) if self.coalesce_key else None
+        if key is not None:
+            slot: Hashable = ("key", key)
+            if slot in self._queue:
+                enqueued_at, _ = self._queue[slot]
+                # Lag is counted from the first of the coalesced items
+                self._queue[slot] = (enqueued_at, item)
+                self.coalesced += 1
+                return True
+        else:
+            slot = next(self._sequence)
+        if len(self._queue) >= self.queue_size:
+            self.dropped += 1
+            if self.overflow == "drop_newest":
+                return False
+            self._queue.popitem(last=False)
+        self._queue[slot] = (time.monotonic(), item)
+        self._ready.set()
+        return True
+
+    def _take(self) -> List[T]:
+        items = []
+        now = time.monotonic()
+        while self._queue and len(items) < (self.batch_size or 1):
+            enqueued_at, item = self._queue.popitem(last=False)[1]
+            self.last_lag = now - enqueued_at
+            self.max_lag = max(self.max_lag, self.last_lag)
+            items.append(item)
+        if not self._queue and not self._closing:
+            self._ready.clear()
+        return items
+
+    async def _call(self, argument: Any) -> None:
+        self.calls += 1
+        try:
+            result = self.callback(argument)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            self.errors += 1
+            logger.exception("%s callback failed", self.name)
+
+    async def _work(self) -> None:
+        while True:
+            await self._ready.wait()
+            if self.flush_interval and not self._closing:
+                # The window opens with the first item after an idle period
+                await asyncio.sleep(self.flush_interval)
+            while True:
+                items = self._take()
+                if not items:
+                    break
+                self.dispatched += len(items)
+                await self._call(items if self.batch_size else items[0])
+                # A sync callback never yields; let the event loop run
+                await asyncio.sleep(0)
+            if self._closing:
+                return
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Stop accepting items, let the workers finish the queued ones for
+        up to `timeout` seconds, then cancel them"""
+        self._closing = True
+        if not self._tasks:
+            return
+        self._ready.set()
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        self.dropped += len(self._queue)
+        self._queue.clear()
+        self._tasks = []
+        _dispatchers.discard(self)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": len(self._queue),
+            "submitted": self.submitted,
+            "dispatched": self.dispatched,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "lag_seconds": self.last_lag,
+            "max_lag_seconds": self.max_lag,
+        }
@@ -1,3 +1,5 @@
+import math
+
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
@@ -22,6 +24,32 @@ class UserAlreadyExistsException(DomainException):
     pass
 
 
+class UserModifiedException(DomainException):
+    """Raised when a conditional update finds the user changed since"""
+
+    pass
+
+
+class ServiceOverloadedException(DomainException):
+    """Raised when work is shed because a bounded queue is full"""
+
+    pass
+
+
+class DeadlineExceededException(DomainException):
+    """Raised when a request's deadline passes before its work is done"""
+
+    pass
+
+
+class UpstreamUnavailableException(DomainException):
+    """Raised when a service the API depends on fails or is failed fast"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 async def http_exception_handler(request: Request, exc: HTTPException):
     return JSONResponse(
         status_code=exc.status_code,
@@ -41,6 +69,22 @@ async def domain_exception_handler(request: Request, exc: DomainException):
         status_code = status.HTTP_404_NOT_FOUND
     elif isinstance(exc, UserAlreadyExistsException):
         status_code = status.HTTP_409_CONFLICT
+    elif isinstance(exc, UserModifiedException):
+        status_code = status.HTTP_412_PRECONDITION_FAILED
+    elif isinstance(exc, DeadlineExceededException):
+        status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    elif isinstance(exc, ServiceOverloadedException):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": str(exc), "status_code": 503},
+            headers={"Retry-After": "1"},
+        )
+    elif isinstance(exc, UpstreamUnavailableException):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": str(exc), "status_code": 503},
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+        )
     else:
         status_code = status.HTTP_400_BAD_REQUEST
 
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+import orjson
+
+from app.core.config import settings
+from app.core.resilience import backoff
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "cache_invalidation"
+# Reconnect delays, with jitter: from RECONNECT_BACKOFF doubling up to the max
+RECONNECT_BACKOFF = 0.5
+
+InvalidateKeys = Callable[[List[Any]], None]
+Flush = Callable[[], None]
+Subscriber = Tuple[InvalidateKeys, Flush]
+
+
+def _dsn(url: str) -> str:
+    # asyncpg takes plain postgresql:// URLs, not SQLAlchemy's
+    return re.sub(r"^postgres(ql)?\+\w+://", "postgresql://", url)
+
+
+def _hashable(key: Any) -> Any:
+    return tuple(key) if isinstance(key, list) else key
+
+
+class InvalidationBus:
+    """Delivers cache invalidations published by any worker or database
+    trigger, through Postgres LISTEN/NOTIFY on one connection per worker.
+
+    Messages are JSON, `{"topic": ..., "keys": [...]}`; without keys, the
+    whole topic is flushed. Those arriving within `batch_window` are merged,
+    so each subscriber of a topic is called once per batch with its distinct
+    keys. The connection is re-established with jittered backoff when lost
+    or when a heartbeat query fails; notifications sent meanwhile are lost
+    for good, so every subscriber is flushed on each connect.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str = CHANNEL,
+        batch_window: float = 0.01,
+        heartbeat: float = 15.0,
+        reconnect_max: float = 30.0,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.batch_window = batch_window
+        self.heartbeat = heartbeat
+        self.reconnect_max = reconnect_max
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+        # Per topic: the keys to invalidate, or None to flush it
+        self._pending: Dict[str, Optional[Set[Any]]] = {}
+        self._batch: Optional[asyncio.TimerHandle] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self.connected = False
+        self.received = 0
+        self.invalid = 0
+        self.batches = 0
+        self.flushes = 0
+        self.reconnects = 0
+
+    def subscribe(self, topic: str, invalidate: InvalidateKeys, flush: Flush) -> None:
+        """Call `invalidate` with the keys of `topic` that changed, and
+        `flush` when any of them may have"""
+        self._subscribers[topic].append((invalidate, flush))
+
+    def start(self) -> None:
+        """Listen in the background; returns before the first connect"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._batch is not None:
+            self._batch.cancel()
+            self._batch = None
+        self._pending.clear()
+
+    async def _run(self) -> None:
+        import asyncpg
+
+        attempt = 0
+        while True:
+            try:
+                connection = await asyncpg.connect(
+                    self.dsn, timeout=self.heartbeat, statement_cache_size=0
+                )
+            except Exception as e:
+                delay = backoff(attempt, RECONNECT_BACKOFF, self.reconnect_max)
+                attempt += 1
+                logger.warning(
+                    "Cache invalidation bus could not connect, retrying in "
+                    "%.1f s: %s",
+                    delay,
+                    e,
+                )
+                await asyncio.sleep(delay)
+                continue
+            attempt = 0
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            try:
+                await connection.add_listener(self.channel, self._on_notification)
+                self.connected = True
+                # Whatever changed while not listening
+                self._flush_all()
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        # A dead peer can go unnoticed by the socket for long
+                        await connection.fetchval("SELECT 1", timeout=self.heartbeat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Cache invalidation bus lost its connection: %s", e)
+            finally:
+                self.connected = False
+                connection.terminate()
+            self.reconnects += 1
+
+    def _on_notification(
+        self, connection: Any, pid: int, channel: str, payload: str
+    ) -> None:
+        self.received += 1
+        try:
+            message = orjson.loads(payload)
+            topic = message["topic"]
+            keys = message.get("keys")
+            if not isinstance(topic, str) or not isinstance(keys, (list, type(None))):
+                raise TypeError
+            keys = None if keys is None else {_hashable(key) for key in keys}
+        except (orjson.JSONDecodeError, KeyError, TypeError):
+            self.invalid += 1
+            logger.warning("Invalid cache invalidation message: %r", payload)
+            return
+        if topic not in self._subscribers:
+            return
+        if keys is None or topic not in self._pending:
+            self._pending[topic] = keys
+        elif self._pending[topic] is not None:
+            self._pending[topic] |= keys
+        if self._batch is None:
+            self._batch = asyncio.get_running_loop().call_later(
+                self.batch_window, self._deliver
+            )
+
+    def _deliver(self) -> None:
+        if self._batch is not None:
+            # Delivered early, on connect
+            self._batch.cancel()
+            self._batch = None
+        self.batches += 1
+        pending, self._pending = self._pending, {}
+        for topic, keys in pending.items():
+            for invalidate, flush in self._subscribers[topic]:
+                try:
+                    if keys is None:
+                        self.flushes += 1
+                        flush()
+                    else:
+                        invalidate(list(keys))
+                except Exception:
+                    logger.exception("Cache invalidation of %s failed", topic)
+
+    def _flush_all(self) -> None:
+        for topic in self._subscribers:
+            self._pending[topic] = None
+        self._deliver()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": int(self.connected),
+            "topics": len(self._subscribers),
+            "received": self.received,
+            "invalid": self.invalid,
+            "batches": self.batches,
+            "flushes": self.flushes,
+            "reconnects": self.reconnects,
+        }
+
+
+invalidation_bus = InvalidationBus(
+    _dsn(settings.CACHE_INVALIDATION_DATABASE_URL or settings.DATABASE_URL),
+    batch_window=settings.CACHE_INVALIDATION_BATCH_MS / 1000,
+    heartbeat=settings.CACHE_INVALIDATION_HEARTBEAT_SECONDS,
+)
@@ -0,0 +1,41 @@
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop runs a timer, every `interval`.
+
+    The lag is how much longer than `interval` a sleep took: the time
+    callbacks that were ready had to wait for the loop, which every request
+    of the worker pays too.
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="loop-lag-monitor")
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.lag = 0.0
+
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, time.perf_counter() - start - self.interval)
+            self.max_lag = max(self.max_lag, self.lag)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"lag_seconds": self.lag, "max_lag_seconds": self.max_lag}
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,243 @@
+"""In-process metrics, exposed in the Prometheus text format.
+
+Recording is cheap: every label combination gets its series the first time
+it is seen, with its histogram buckets preallocated, and later observations
+only increment numbers in place.
+"""
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, TypeVar
+
+LabelValues = Tuple[str, ...]
+
+# Prometheus client defaults, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _header(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        for labels, value in self._values.items():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, labels: LabelValues = (), amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, labels: LabelValues, value: float) -> None:
+        self._values[labels] = value
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, size: int):
+        # One slot per bucket plus the +Inf overflow
+        self.counts = [0] * (size + 1)
+        self.sum = 0.0
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, labels: LabelValues, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries(len(self.buckets))
+        series.counts[bisect_left(self.buckets, value)] += 1
+        series.sum += value
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        bucket_labelnames = self.labelnames + ("le",)
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series.counts):
+                cumulative += count
+                label_text = _format_labels(
+                    bucket_labelnames, labels + (_format_value(bound),)
+                )
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {repr(series.sum)}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+# Returns (labels, stats) pairs; numeric stats become gauges at scrape time
+StatsSource = Callable[[], Iterable[Tuple[Dict[str, str], Dict[str, Any]]]]
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._stats_sources: List[Tuple[str, StatsSource]] = []
+
+    def register(self, metric: M) -> M:
+        self._metrics.append(metric)
+        return metric
+
+    def add_stats_source(self, prefix: str, source: StatsSource) -> None:
+        """Expose a component's stats dicts, read only when scraped"""
+        self._stats_sources.append((prefix, source))
+
+    def _render_stats(self, prefix: str, source: StatsSource) -> List[str]:
+        gauges: Dict[str, Gauge] = {}
+        for labels, stats in source():
+            labelnames = tuple(labels)
+            for key, value in stats.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                gauge = gauges.get(name)
+                if gauge is None:
+                    gauge = gauges[name] = Gauge(name, f"{prefix} {key}", labelnames)
+                gauge.set(tuple(labels.values()), value)
+        return [line for gauge in gauges.values() for line in gauge.render()]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for prefix, source in self._stats_sources:
+            lines.extend(self._render_stats(prefix, source))
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_request_duration = registry.register(
+    Histogram(
+        "http_request_duration_seconds",
+        "HTTP request latency by route",
+        ("method", "route"),
+    )
+)
+http_requests = registry.register(
+    Counter(
+        "http_requests_total",
+        "HTTP requests by route and status code",
+        ("method", "route", "status"),
+    )
+)
+http_requests_in_flight = registry.register(
+    Gauge("http_requests_in_flight", "HTTP requests being handled")
+)
+http_requests_rejected = registry.register(
+    Counter(
+        "http_requests_rejected_total",
+        "HTTP requests turned away by admission control",
+        ("reason", "route_class"),
+    )
+)
+http_cancelled_request_duration = registry.register(
+    Histogram(
+        "http_cancelled_request_duration_seconds",
+        "Work done on requests cancelled by their deadline or a disconnect",
+        ("reason", "route"),
+    )
+)
+cancelled_operations = registry.register(
+    Counter(
+        "cancelled_operations_total",
+        "Database statements and Supabase calls cancelled while in flight",
+        ("operation",),
+    )
+)
+event_loop_block_duration = registry.register(
+    Histogram(
+        "event_loop_block_duration_seconds",
+        "Callbacks that blocked the event loop past the watchdog threshold",
+        ("route",),
+    )
+)
+db_query_duration = registry.register(
+    Histogram(
+        "db_query_duration_seconds",
+        "SQLAlchemy statement execution time",
+        ("operation",),
+        FAST_BUCKETS,
+    )
+)
+supabase_request_duration = registry.register(
+    Histogram(
+        "supabase_request_duration_seconds",
+        "Supabase HTTP call latency, until the response headers arrive",
+        ("api", "resource", "method"),
+    )
+)
+supabase_requests = registry.register(
+    Counter(
+        "supabase_requests_total",
+        "Supabase HTTP calls by status code",
+        ("api", "resource", "method", "status"),
+    )
+)
@@ -0,0 +1,37 @@
+import time
+from typing import List
+
+import bcrypt
+
+# What the password hashing processes run. Kept apart from app.core.security
+# so that a freshly spawned worker imports bcrypt alone, not FastAPI and the
+# settings. Module-level so the functions can be pickled to the workers.
+
+
+def hash_password(password: bytes, rounds: int) -> str:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode()
+
+
+def hash_passwords(passwords: List[bytes], rounds: int) -> List[str]:
+    return [hash_password(password, rounds) for password in passwords]
+
+
+def verify_password(password: bytes, hashed_password: bytes) -> bool:
+    try:
+        return bcrypt.checkpw(password, hashed_password)
+    except ValueError:
+        # Not a bcrypt hash
+        return False
+
+
+def calibrate_rounds(target_seconds: float, min_rounds: int, max_rounds: int) -> int:
+    """Highest cost whose hash time stays within `target_seconds`"""
+    rounds = min_rounds
+    start = time.perf_counter()
+    hash_password(b"calibration", rounds)
+    elapsed = time.perf_counter() - start
+    # Each extra round doubles the work
+    while rounds < max_rounds and elapsed * 2 <= target_seconds:
+        rounds += 1
+        elapsed *= 2
+    return rounds
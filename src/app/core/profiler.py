@@ -0,0 +1,142 @@
+import asyncio
+import sys
+import threading
+from collections import Counter
+from contextvars import ContextVar, Token
+from types import FrameType
+from typing import Any, Callable, List, Optional, Tuple
+
+# The sampler of the request being run; tasks copy it when they are created
+_profiled: ContextVar[Optional["RequestSampler"]] = ContextVar("profiled", default=None)
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _coroutine_frame(awaitable: Any) -> Optional[FrameType]:
+    return getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+
+
+class RequestSampler:
+    """Wall-clock sampling profiler for one request, run from a background
+    thread so that the request itself is not slowed down.
+
+    Besides the request's own task, it follows the tasks started in its
+    context, such as DataLoader batches and single-flight loads: a task
+    factory installed while profiling picks them out by a context variable.
+    At every tick, each task the event loop is running (its anchor frame is
+    on the loop thread's stack) has its running stack recorded; every other
+    one the chain of coroutines it is suspended in, ending in what it
+    awaits. Stacks of spawned tasks start with `[task <name>]`. They are
+    counted in the collapsed format that flamegraph.pl and speedscope read.
+    """
+
+    def __init__(self, anchor: FrameType, task: "asyncio.Task[Any]", interval: float):
+        self.anchor = anchor
+        self.task = task
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Appended to on the loop, copied by the sampling thread
+        self._spawned: List["asyncio.Task[Any]"] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task_factory: Optional[Callable[..., Any]] = None
+        self._context_token: Optional[Token] = None
+
+    def start(self) -> None:
+        """Start sampling; call from the request's task"""
+        self._context_token = _profiled.set(self)
+        self._loop = asyncio.get_running_loop()
+        self._task_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._create_task)
+        self._thread = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling without waiting for the thread; `join` it off the
+        event loop before reading the samples"""
+        self._stop.set()
+        if self._loop is not None:
+            self._loop.set_task_factory(self._task_factory)
+        if self._context_token is not None:
+            _profiled.reset(self._context_token)
+
+    def join(self) -> None:
+        if self._thread is not None:
+            self._thread.join()
+
+    def _create_task(
+        self, loop: asyncio.AbstractEventLoop, coro: Any, **kwargs: Any
+    ) -> "asyncio.Future[Any]":
+        if self._task_factory is not None:
+            task = self._task_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        if _profiled.get() is self:
+            self._spawned.append(task)
+        return task
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            running = self._running_frames()
+            for prefix, task, anchor in self._tracked():
+                stack = self._running_stack(running, anchor) or self._awaiting_stack(
+                    task, anchor
+                )
+                if stack:
+                    self.samples[";".join(prefix + stack)] += 1
+
+    def _tracked(self) -> List[Tuple[List[str], "asyncio.Task[Any]", FrameType]]:
+        """(prefix, task, anchor frame) of the tasks to sample"""
+        tracked = [([], self.task, self.anchor)]
+        for task in self._spawned[:]:
+            anchor = None if task.done() else _coroutine_frame(task.get_coro())
+            if anchor is not None:
+                tracked.append(([f"[task {task.get_name()}]"], task, anchor))
+        return tracked
+
+    def _running_frames(self) -> List[FrameType]:
+        """The loop thread's stack, innermost frame first"""
+        frame = sys._current_frames().get(self._thread_id)
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        return frames
+
+    def _running_stack(self, running: List[FrameType], anchor: FrameType) -> List[str]:
+        for depth, frame in enumerate(running):
+            if frame is anchor:
+                return [_frame_label(frame) for frame in running[depth::-1]]
+        return []
+
+    def _awaiting_stack(
+        self, task: "asyncio.Task[Any]", anchor: FrameType
+    ) -> List[str]:
+        labels: List[str] = []
+        awaitable: Any = task.get_coro()
+        while awaitable is not None:
+            frame = _coroutine_frame(awaitable)
+            if frame is None:
+                break
+            if labels or frame is anchor:
+                labels.append(_frame_label(frame))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(
+                awaitable, "gi_yieldfrom", None
+            )
+        if labels and awaitable is not None:
+            labels.append(f"[await {type(awaitable).__name__}]")
+        return labels
+
+    def collapsed(self, root: str) -> str:
+        """The samples as `root;frame;...;frame count` lines"""
+        root = root.replace(";", ":")
+        return "".join(
+            f"{root};{stack} {count}\n" for stack, count in self.samples.items()
+        )
@@ -0,0 +1,69 @@
+import time
+from typing import Any, Dict, Hashable, Optional
+
+# Intervals summed onto a large monotonic clock are off by a few ulps; without
+# this slack the last request of a burst could be turned away
+TOLERANCE_SLACK = 1e-9
+
+
+class RateLimiter:
+    """Token buckets of `rate` requests per second and `burst` capacity, one
+    per key.
+
+    Each bucket is a single float, its theoretical arrival time (GCRA): a
+    request is admitted if, once it is counted, the bucket would not be
+    more than `burst` requests ahead of now. Buckets are kept in two
+    generations that rotate every `burst / rate` seconds, the time a bucket
+    takes to refill, so idle keys are dropped wholesale instead of swept. A
+    generation reaching `max_keys` rotates early, which forgets some
+    buckets too soon, but bounds memory at twice `max_keys`.
+
+    Not thread-safe: instances are meant to be used from a single event loop.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100_000):
+        if rate <= 0 or burst <= 0 or max_keys <= 0:
+            raise ValueError("rate, burst and max_keys must be positive")
+        self.interval = 1 / rate
+        self.tolerance = burst * self.interval + TOLERANCE_SLACK
+        self.max_keys = max_keys
+        self._current: Dict[Hashable, float] = {}
+        self._previous: Dict[Hashable, float] = {}
+        self._rotated_at = time.monotonic()
+        self.admitted = 0
+        self.limited = 0
+        self.early_rotations = 0
+
+    def _rotate(self, now: float) -> None:
+        if len(self._current) >= self.max_keys:
+            self.early_rotations += 1
+        elif now - self._rotated_at < self.tolerance:
+            return
+        self._previous, self._current = self._current, {}
+        self._rotated_at = now
+
+    def acquire(self, key: Hashable, now: Optional[float] = None) -> float:
+        """Count a request for `key`: 0 if it is admitted, otherwise the
+        seconds until one would be"""
+        now = time.monotonic() if now is None else now
+        self._rotate(now)
+        arrival = self._current.get(key)
+        if arrival is None:
+            arrival = self._previous.pop(key, now)
+        arrival = max(arrival, now)
+        ahead = arrival + self.interval - now
+        if ahead > self.tolerance:
+            self._current[key] = arrival
+            self.limited += 1
+            return ahead - self.tolerance
+        self._current[key] = arrival + self.interval
+        self.admitted += 1
+        return 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._current) + len(self._previous),
+            "admitted": self.admitted,
+            "limited": self.limited,
+            "early_rotations": self.early_rotations,
+        }
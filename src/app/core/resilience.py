@@ -0,0 +1,113 @@
+import random
+import time
+from typing import Any, Dict, Optional
+
+from app.core.exceptions import (
+    DeadlineExceededException,
+    DomainException,
+    UpstreamUnavailableException,
+)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+# For the breaker_state gauge
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Fails calls to a dependency fast while it is unhealthy.
+
+    Closed, it lets every call through and opens after `failure_threshold`
+    consecutive failures. Open, it rejects calls for `reset_timeout`
+    seconds, then half-opens: a single probe call is let through, and its
+    outcome closes the breaker or opens it again.
+
+    Not thread-safe: instances are meant to be used from a single event loop.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self.retry_after() == 0:
+            self._state = HALF_OPEN
+        return self._state
+
+    def retry_after(self) -> float:
+        """Seconds until the open breaker lets a probe through"""
+        if self._state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; a half-open breaker lets one
+        through, which must end with `record_success`, `record_failure` or
+        `release`"""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def check(self, name: str) -> None:
+        """`allow`, raising UpstreamUnavailableException when it does not"""
+        if not self.allow():
+            raise UpstreamUnavailableException(
+                f"{name} is unavailable", retry_after=self.retry_after() or 1.0
+            )
+
+    def record_success(self) -> None:
+        self._state = CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or self._failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.opened += 1
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+    def release(self) -> None:
+        """A call ended without telling whether the dependency is healthy,
+        such as when it was cancelled"""
+        self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breaker_state": STATE_VALUES[self.state],
+            "breaker_opened": self.opened,
+            "breaker_rejected": self.rejected,
+            "consecutive_failures": self._failures,
+        }
+
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """Delay before retry `attempt` (from 0): exponential with full jitter,
+    so clients that failed together do not retry together"""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+def upstream_error(error: Optional[BaseException]) -> Optional[DomainException]:
+    """The deadline or availability error behind `error`; client libraries
+    such as gotrue wrap whatever their HTTP client raised in their own
+    exceptions"""
+    while error is not None:
+        if isinstance(error, (DeadlineExceededException, UpstreamUnavailableException)):
+            return error
+        error = error.__cause__ or error.__context__
+    return None
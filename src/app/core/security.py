@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedException
+from app.core.password_workers import (
+    calibrate_rounds,
+    hash_password,
+    hash_passwords,
+    verify_password,
+)
+
+logger = logging.getLogger(__name__)
+
+# Passwords hashed per submission by `hash_many`
+HASH_BATCH_CHUNK = 8
+
+
+def _hash_rounds(hashed_password: str) -> Optional[int]:
+    # bcrypt hashes look like $2b$12$<salt+digest>
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class _OperationStats:
+    __slots__ = ("count", "total_seconds", "max_seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.count += 1
+        self.total_seconds += seconds
+        if seconds > self.max_seconds:
+            self.max_seconds = seconds
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": self.total_seconds / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class PasswordHasher:
+    """bcrypt hashing offloaded to a process pool.
+
+    At most `workers + queue_size` operations are pending at once; beyond that
+    new work is rejected with ServiceOverloadedException instead of piling up
+    behind the pool. Bulk hashing uses at most `workers - 1` of them.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        queue_size: int = 64,
+        rounds: Optional[int] = None,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = self.workers + queue_size
+        self.rounds = rounds or settings.PASSWORD_HASH_MIN_ROUNDS
+        self._fixed_rounds = rounds is not None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._calibration: Optional[asyncio.Task] = None
+        self._pending = 0
+        self._max_pending_seen = 0
+        self._rejected = 0
+        # Bulk hashing keeps a worker free for logins, and submits short
+        # chunks so they interleave with other operations in the pool's queue
+        self._bulk_slots = asyncio.Semaphore(max(self.workers - 1, 1))
+        self._stats = {
+            "hash": _OperationStats(),
+            "hash_batch": _OperationStats(),
+            "verify": _OperationStats(),
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                # Forking a process that runs an event loop and threads is unsafe
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    async def start(self) -> None:
+        """Start calibrating the bcrypt cost, without waiting for it.
+
+        A worker process has to be spawned and time a hash first; meanwhile
+        verification works as usual and hashing waits for the result, so
+        startup doesn't have to.
+        """
+        self._get_executor()
+        if self._fixed_rounds or self._calibration is not None:
+            return
+        self._calibration = asyncio.create_task(self._calibrate())
+
+    async def _calibrate(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            self.rounds = await loop.run_in_executor(
+                self._get_executor(),
+                calibrate_rounds,
+                settings.PASSWORD_HASH_TARGET_MS / 1000,
+                settings.PASSWORD_HASH_MIN_ROUNDS,
+                settings.PASSWORD_HASH_MAX_ROUNDS,
+            )
+        except Exception:
+            logger.exception(
+                "Could not calibrate the bcrypt cost, using %d rounds", self.rounds
+            )
+
+    async def _current_rounds(self) -> int:
+        if self._calibration is not None and not self._calibration.done():
+            # Shielded: a cancelled request must not cancel the calibration
+            await asyncio.shield(self._calibration)
+        return self.rounds
+
+    def shutdown(self) -> None:
+        if self._calibration is not None:
+            self._calibration.cancel()
+            self._calibration = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _submit(self, operation: str, func: Callable, *args: Any) -> Any:
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise ServiceOverloadedException("Too many password operations pending")
+        # A worker cannot be interrupted, so don't start one for an abandoned
+        # request
+        deadline.check()
+
+        self._pending += 1
+        self._max_pending_seen = max(self._max_pending_seen, self._pending)
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+            self._stats[operation].record(time.perf_counter() - start)
+
+    async def hash(self, password: str) -> str:
+        rounds = await self._current_rounds()
+        return await self._submit("hash", hash_password, password.encode(), rounds)
+
+    async def hash_many(self, passwords: Sequence[str]) -> List[str]:
+        """Hash a batch in small chunks, leaving one worker free for logins"""
+        if not passwords:
+            return []
+        rounds = await self._current_rounds()
+        encoded = [password.encode() for password in passwords]
+
+        async def hash_chunk(chunk: List[bytes]) -> List[str]:
+            async with self._bulk_slots:
+                return await self._submit("hash_batch", hash_passwords, chunk, rounds)
+
+        chunks = await asyncio.gather(
+            *(
+                hash_chunk(encoded[i : i + HASH_BATCH_CHUNK])
+                for i in range(0, len(encoded), HASH_BATCH_CHUNK)
+            )
+        )
+        return [hashed for chunk in chunks for hashed in chunk]
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(
+            "verify", verify_password, password.encode(), hashed_password.encode()
+        )
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """True when the stored hash uses a lower cost than the current one"""
+        rounds = _hash_rounds(hashed_password)
+        return rounds is not None and rounds < self.rounds
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "max_pending_seen": self._max_pending_seen,
+            "rejected": self._rejected,
+            "operations": {
+                name: stats.as_dict() for name, stats in self._stats.items()
+            },
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=settings.PASSWORD_HASH_WORKERS,
+    queue_size=settings.PASSWORD_HASH_QUEUE_SIZE,
+    rounds=settings.PASSWORD_HASH_ROUNDS,
+)
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, TypeVar
+
+from app.core import deadline
+
+T = TypeVar("T")
+
+
+async def _pick(batch: "asyncio.Future[Dict[Hashable, Any]]", key: Hashable) -> Any:
+    return (await batch).get(key)
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution.
+
+    The first caller starts the call as a task; callers arriving while it is
+    in flight await the same task. Each caller awaits it through
+    `asyncio.shield`, so a cancelled caller (say, a client that disconnected)
+    stops waiting without cancelling the call for the others. The call runs
+    without any caller's deadline; each caller waits for it only until its
+    own.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def _finish(self, key: Hashable, task: "asyncio.Future[Any]") -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        # Nobody may be left to see the error when every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Run `func()`, or join the call already in flight for `key`"""
+        self.calls += 1
+        task = self._flights.get(key)
+        if task is None:
+            with deadline.detached():
+                task = asyncio.ensure_future(func())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        return await deadline.wait(asyncio.shield(task))
+
+    async def do_many(
+        self,
+        keys: List[Hashable],
+        func: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ) -> Dict[Hashable, Any]:
+        """Value of each of `keys`, by key, joining the calls in flight for
+        some and making one `func(missing)` call for the rest. That call
+        returns values by key, and is joined per key, by `do` as well"""
+        keys = list(dict.fromkeys(keys))
+        self.calls += len(keys)
+        flights = {key: self._flights.get(key) for key in keys}
+        missing = [key for key, task in flights.items() if task is None]
+        self.coalesced += len(keys) - len(missing)
+        if missing:
+            with deadline.detached():
+                batch = asyncio.ensure_future(func(missing))
+                for key in missing:
+                    flights[key] = asyncio.ensure_future(_pick(batch, key))
+            self.executions += 1
+            for key in missing:
+                task = self._flights[key] = flights[key]
+                task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        values = await deadline.wait(asyncio.shield(asyncio.gather(*flights.values())))
+        return dict(zip(flights, values))
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether a call for `key` is running, which `do` would join"""
+        return key in self._flights
+
+    def forget(self) -> None:
+        """Make later calls start afresh rather than join the calls already in
+        flight, which may have read data a write has since changed; their
+        current callers still get their results"""
+        self._flights.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights),
+        }
@@ -1,12 +1,108 @@
-from supabase import create_client, Client
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+import httpx
+
 from app.core.config import settings
+from app.core.resilience import CircuitBreaker
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+    from app.core.supabase_client import SharedClient
+
+# One client per role and worker. Created at startup when every request needs
+# them, otherwise on first use, so workers that rarely touch Supabase don't
+# import or connect it up front.
+_clients: Dict[str, "SharedClient"] = {}
+_init_lock = asyncio.Lock()
+
+CALL_COUNTS = ("calls", "attempts", "retries", "hedges", "hedge_wins", "unavailable")
+# Per API ("rest", "auth"), shared by the clients of every role
+_breakers: Dict[str, CircuitBreaker] = {}
+_call_counts: Dict[str, Dict[str, int]] = {}
+
+
+async def init_supabase_clients() -> None:
+    """Create the shared anon and service-role clients"""
+    from app.core.supabase_client import create_shared_client
+
+    role_keys = {
+        "anon": settings.SUPABASE_ANON_KEY,
+        "service_role": settings.SUPABASE_SERVICE_ROLE_KEY,
+    }
+    async with _init_lock:
+        for role, key in role_keys.items():
+            if role not in _clients:
+                _clients[role] = await create_shared_client(key)
+
+
+async def close_supabase_clients() -> None:
+    """Close the pooled connections of the shared clients"""
+    for client in _clients.values():
+        await client.close()
+    _clients.clear()
+
+
+async def _get_client(role: str) -> "SharedClient":
+    if role not in _clients:
+        await init_supabase_clients()
+    return _clients[role]
+
+
+def _pool_stats(http_client: httpx.AsyncClient) -> Dict[str, int]:
+    # Under the ResilientTransport and DeadlineTransport
+    transport = http_client._transport
+    while hasattr(transport, "transport"):
+        transport = transport.transport
+    pool = getattr(transport, "_pool", None)
+    if pool is None:
+        return {}
+    connections = pool.connections
+    requests = list(getattr(pool, "_requests", []))
+    return {
+        "connections": len(connections),
+        "idle_connections": sum(1 for c in connections if c.is_idle()),
+        "in_flight_requests": sum(1 for r in requests if not r.is_queued()),
+        "queued_requests": sum(1 for r in requests if r.is_queued()),
+    }
+
+
+def get_supabase_pool_stats() -> Dict[str, Dict[str, Dict[str, int]]]:
+    """Connection pool usage of the shared clients, per role and API"""
+    return {
+        role: {
+            "auth": _pool_stats(client.auth._http_client),
+            "postgrest": _pool_stats(client.postgrest.session),
+        }
+        for role, client in _clients.items()
+    }
+
+
+def call_policy_state(api: str) -> Tuple[CircuitBreaker, Dict[str, int]]:
+    """The circuit breaker and call counts of a Supabase API"""
+    if api not in _breakers:
+        _breakers[api] = CircuitBreaker(
+            settings.SUPABASE_BREAKER_FAILURE_THRESHOLD,
+            settings.SUPABASE_BREAKER_RESET_SECONDS,
+        )
+        _call_counts[api] = dict.fromkeys(CALL_COUNTS, 0)
+    return _breakers[api], _call_counts[api]
+
+
+def get_supabase_call_stats() -> List[Tuple[Dict[str, str], Dict[str, Any]]]:
+    """Breaker state and call, retry and hedge counts per API"""
+    return [
+        ({"api": api}, {**_call_counts[api], **breaker.stats()})
+        for api, breaker in _breakers.items()
+    ]
 
 
-def get_supabase_client() -> Client:
+async def get_supabase_client() -> "AsyncClient":
     """Get Supabase client instance"""
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
+    return await _get_client("anon")
 
 
-def get_supabase_admin_client() -> Client:
+async def get_supabase_admin_client() -> "AsyncClient":
     """Get Supabase admin client with service role key"""
-    return create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_ROLE_KEY)
+    return await _get_client("service_role")
@@ -0,0 +1,308 @@
+import asyncio
+import ssl
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Union
+
+import httpx
+from gotrue import AsyncMemoryStorage
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_TIMEOUT
+from supabase import AClientOptions, ASupabaseAuthClient, AsyncClient
+
+from app.core import deadline
+from app.core.config import settings
+from app.core.exceptions import (
+    DeadlineExceededException,
+    UpstreamUnavailableException,
+)
+from app.core.metrics import (
+    cancelled_operations,
+    supabase_request_duration,
+    supabase_requests,
+)
+from app.core.resilience import backoff
+from app.core.supabase import call_policy_state
+
+# Responses telling that the service, not the request, failed
+UNAVAILABLE_STATUSES = frozenset({502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+TIMEOUT_PHASES = ("connect", "read", "write", "pool")
+
+
+async def _start_timer(request: httpx.Request) -> None:
+    request.extensions["started_at"] = time.perf_counter()
+
+
+async def _record_timing(response: httpx.Response) -> None:
+    request = response.request
+    # /rest/v1/<table>, /auth/v1/<endpoint>/...
+    parts = request.url.path.strip("/").split("/")
+    api = parts[0] if parts else ""
+    resource = parts[2] if len(parts) > 2 else ""
+    labels = (api, resource, request.method)
+    supabase_request_duration.observe(
+        labels, time.perf_counter() - request.extensions["started_at"]
+    )
+    supabase_requests.inc(labels + (str(response.status_code),))
+
+
+class DeadlineTransport(httpx.AsyncBaseTransport):
+    """Caps every timeout of a call at the request's remaining deadline, and
+    counts the calls cancelled in flight"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        remaining = deadline.remaining()
+        if remaining is not None:
+            if remaining <= 0:
+                raise DeadlineExceededException("Request deadline exceeded")
+            request.extensions["timeout"] = {
+                phase: remaining if limit is None else min(limit, remaining)
+                for phase, limit in request.extensions.get("timeout", {}).items()
+            }
+        try:
+            return await self.transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            cancelled_operations.inc(("supabase",))
+            raise
+        except httpx.TimeoutException as e:
+            if deadline.expired():
+                raise DeadlineExceededException("Request deadline exceeded") from e
+            raise
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """Applies the call policy of Settings to every Supabase call.
+
+    Each attempt gets the timeout of its operation (SUPABASE_OPERATION_TIMEOUTS).
+    Reads that fail with a transport error or a 502, 503 or 504 are retried
+    after a jittered backoff, as long as the request's deadline leaves time
+    for it; with SUPABASE_HEDGE_DELAY_MS, a read still unanswered after that
+    delay is sent again and the first answer wins. Those failures count
+    against the API's circuit breaker, which, once open, fails calls at once.
+    Calls that end unavailable, or are failed fast, raise
+    UpstreamUnavailableException.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        api = request.url.path.strip("/").split("/")[0]
+        breaker, counts = call_policy_state(api)
+        read = request.method in IDEMPOTENT_METHODS
+        timeout = settings.SUPABASE_OPERATION_TIMEOUTS.get(
+            f"{api}:{'read' if read else 'write'}"
+        )
+        retries = settings.SUPABASE_RETRY_ATTEMPTS if read else 0
+        hedge = read and settings.SUPABASE_HEDGE_DELAY_MS is not None
+        counts["calls"] += 1
+        attempt = 0
+        while True:
+            breaker.check(f"Supabase {api}")
+            if timeout is not None:
+                request.extensions["timeout"] = dict.fromkeys(TIMEOUT_PHASES, timeout)
+            counts["attempts"] += 1
+            error: Optional[Exception] = None
+            try:
+                if hedge:
+                    response = await self._hedged(request, counts)
+                else:
+                    response = await self.transport.handle_async_request(request)
+            except httpx.PoolTimeout:
+                # Our own pool is saturated, which says nothing of Supabase
+                breaker.release()
+                raise
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                error = e
+            except BaseException:
+                # Deadlines and cancellations
+                breaker.release()
+                raise
+            else:
+                if response.status_code not in UNAVAILABLE_STATUSES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                await response.aclose()
+                error = httpx.HTTPStatusError(
+                    f"{response.status_code} from Supabase {api}",
+                    request=request,
+                    response=response,
+                )
+
+            delay = backoff(
+                attempt,
+                settings.SUPABASE_RETRY_BACKOFF_SECONDS,
+                settings.SUPABASE_RETRY_BACKOFF_MAX_SECONDS,
+            )
+            remaining = deadline.remaining()
+            if attempt >= retries or (remaining is not None and remaining <= delay):
+                counts["unavailable"] += 1
+                raise UpstreamUnavailableException(
+                    f"Supabase {api} is unavailable"
+                ) from error
+            counts["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _hedged(
+        self, request: httpx.Request, counts: Dict[str, int]
+    ) -> httpx.Response:
+        first = asyncio.ensure_future(self.transport.handle_async_request(request))
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(
+                pending, timeout=settings.SUPABASE_HEDGE_DELAY_MS / 1000
+            )
+            if done:
+                return first.result()
+            counts["hedges"] += 1
+            pending.add(
+                asyncio.ensure_future(self.transport.handle_async_request(request))
+            )
+            while True:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                answered = [task for task in done if task.exception() is None]
+                if answered:
+                    winner = answered[0]
+                    for task in answered[1:]:
+                        await task.result().aclose()
+                    if winner is not first:
+                        counts["hedge_wins"] += 1
+                    return winner.result()
+                if not pending:
+                    # Both attempts failed
+                    return next(iter(done)).result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+@lru_cache(maxsize=None)
+def _ssl_context() -> ssl.SSLContext:
+    # Loading the CA bundle takes tens of milliseconds, so do it once and
+    # share it between the clients
+    return httpx.create_ssl_context()
+
+
+def _http_client(
+    timeout: Union[int, float, httpx.Timeout, None] = None,
+    verify: bool = True,
+    proxy: Optional[str] = None,
+    **kwargs: Any,
+) -> httpx.AsyncClient:
+    """HTTP client with the pool limits and call policy configured in
+    Settings, bounded by request deadlines"""
+    transport = httpx.AsyncHTTPTransport(
+        verify=_ssl_context() if verify else False,
+        http2=settings.SUPABASE_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.SUPABASE_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SUPABASE_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SUPABASE_POOL_KEEPALIVE_EXPIRY,
+        ),
+        proxy=proxy,
+    )
+    return httpx.AsyncClient(
+        transport=ResilientTransport(DeadlineTransport(transport)),
+        timeout=timeout or settings.SUPABASE_TIMEOUT_SECONDS,
+        follow_redirects=True,
+        event_hooks=(
+            {"request": [_start_timer], "response": [_record_timing]}
+            if settings.METRICS_ENABLED
+            else None
+        ),
+        **kwargs,
+    )
+
+
+class _PooledPostgrestClient(AsyncPostgrestClient):
+    def create_session(
+        self,
+        base_url: str,
+        headers: Dict[str, str],
+        timeout: Union[int, float, httpx.Timeout],
+        verify: bool = True,
+        proxy: Optional[str] = None,
+    ) -> httpx.AsyncClient:
+        return _http_client(
+            timeout, base_url=base_url, headers=headers, verify=verify, proxy=proxy
+        )
+
+
+class SharedClient(AsyncClient):
+    """Supabase client shared by every request handled by a worker.
+
+    It never adopts the session of a user signing in through it, so one
+    request cannot change the credentials another request uses, and its
+    PostgREST and Auth HTTP connections are pooled and kept alive.
+    """
+
+    def _listen_to_auth_events(self, event, session) -> None:
+        pass
+
+    @staticmethod
+    def _init_supabase_auth_client(
+        auth_url: str,
+        client_options: AClientOptions,
+        verify: bool = True,
+        proxy: Optional[str] = None,
+    ) -> ASupabaseAuthClient:
+        return ASupabaseAuthClient(
+            url=auth_url,
+            auto_refresh_token=False,
+            persist_session=False,
+            storage=AsyncMemoryStorage(),
+            headers=client_options.headers,
+            flow_type=client_options.flow_type,
+            http_client=_http_client(verify=verify, proxy=proxy),
+        )
+
+    @staticmethod
+    def _init_postgrest_client(
+        rest_url: str,
+        headers: Dict[str, str],
+        schema: str,
+        timeout: Union[int, float, httpx.Timeout] = DEFAULT_POSTGREST_CLIENT_TIMEOUT,
+        verify: bool = True,
+        proxy: Optional[str] = None,
+    ) -> AsyncPostgrestClient:
+        return _PooledPostgrestClient(
+            rest_url,
+            headers=headers,
+            schema=schema,
+            timeout=timeout,
+            verify=verify,
+            proxy=proxy,
+        )
+
+    async def close(self) -> None:
+        if self.realtime.is_connected:
+            await self.realtime.close()
+        await self.auth.close()
+        await self.postgrest.aclose()
+
+
+async def create_shared_client(key: str) -> SharedClient:
+    return await SharedClient.create(
+        settings.SUPABASE_URL,
+        key,
+        AClientOptions(
+            auto_refresh_token=False,
+            persist_session=False,
+            postgrest_client_timeout=settings.SUPABASE_TIMEOUT_SECONDS,
+        ),
+    )
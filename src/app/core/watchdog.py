@@ -0,0 +1,225 @@
+import asyncio
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from types import FrameType
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import event_loop_block_duration
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames of the blocking stack that are kept
+STACK_LIMIT = 30
+BACKGROUND = "background"
+SAMPLES_PER_THRESHOLD = 4
+# Runs every callback of the standard event loop, task steps included
+CALLBACK_CODE = asyncio.Handle._run.__code__
+ASYNC_CODE_FLAGS = (
+    inspect.CO_COROUTINE | inspect.CO_ITERABLE_COROUTINE | inspect.CO_ASYNC_GENERATOR
+)
+
+
+def _runner_frame(frame: Optional[FrameType]) -> Optional[FrameType]:
+    """The frame that runs the event loop, below the outermost coroutine of
+    `frame`'s stack; None on the standard loop, whose callbacks are found by
+    their code instead"""
+    outermost = None
+    while frame is not None:
+        if frame.f_code.co_flags & ASYNC_CODE_FLAGS:
+            outermost = frame
+        frame = frame.f_back
+    runner = outermost.f_back if outermost is not None else None
+    if runner is not None and runner.f_code is CALLBACK_CODE:
+        return None
+    return runner
+
+
+def _callback_frame(
+    frame: Optional[FrameType], runner: Optional[FrameType]
+) -> Optional[FrameType]:
+    """The frame running the current event loop callback. On the standard
+    loop it is new for each call; on others, such as uvloop, which run
+    callbacks from C, it is the callback's outermost frame, which a task
+    keeps across its steps"""
+    while frame is not None:
+        if frame.f_code is CALLBACK_CODE or (
+            runner is not None and frame.f_back is runner
+        ):
+            return frame
+        frame = frame.f_back
+    return None
+
+
+class LoopBlockedError(RuntimeError):
+    """A request handler blocked the event loop while the watchdog is strict"""
+
+
+@dataclass
+class BlockReport:
+    route: str
+    seconds: float
+    stack: str
+
+
+class LoopWatchdog:
+    """Detects callbacks that block the event loop, from a side thread.
+
+    The thread samples the loop thread's stack several times per `threshold`,
+    and a heartbeat scheduled on the loop tells it whether the loop went
+    round meanwhile. When it finds the same callback running for `threshold`
+    without a heartbeat, the loop is blocked: the stack is captured right
+    then, the running task is mapped to the route it handles (see `track`),
+    and once the callback returns the block is logged with its duration and
+    counted, on the loop. A backlog of short callbacks is slow, but is not
+    reported.
+
+    When `strict`, blocks are also remembered per task, and `check` raises
+    for a tracked task that blocked, so tests and benchmarks fail instead of
+    merely logging.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.1,
+        strict: bool = False,
+        on_block: Optional[Callable[[BlockReport], None]] = None,
+    ):
+        self.threshold = threshold
+        self.strict = strict
+        self.on_block = on_block
+        self.recent: Deque[BlockReport] = deque(maxlen=20)
+        # task -> (tracked since, describe)
+        self._routes: Dict["asyncio.Task[Any]", Tuple[float, Callable[[], str]]] = {}
+        self._blocked: Dict["asyncio.Task[Any]", BlockReport] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = 0
+        self._runner: Optional[FrameType] = None
+        self._beats = 0
+        self._heartbeat: Optional[asyncio.TimerHandle] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Watch the running event loop"""
+        if self._thread is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        frame = sys._getframe(1)
+        self._runner = _runner_frame(frame)
+        if self._runner is None and _callback_frame(frame, None) is None:
+            logger.warning(
+                "The loop watchdog cannot find the callbacks of %s, so it will "
+                "not report blocks",
+                type(self._loop).__name__,
+            )
+        del frame
+        self._beat()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        self._runner = None
+
+    def _beat(self) -> None:
+        self._beats += 1
+        self._heartbeat = self._loop.call_later(
+            self.threshold / SAMPLES_PER_THRESHOLD, self._beat
+        )
+
+    def track(self, task: "asyncio.Task[Any]", describe: Callable[[], str]) -> None:
+        """Attribute blocks in `task` to what `describe` returns then, if
+        they last `threshold` after this call"""
+        self._routes[task] = (time.perf_counter(), describe)
+
+    def untrack(self, task: "asyncio.Task[Any]") -> Optional[BlockReport]:
+        """Stop tracking `task`; its first block, if it blocked when strict"""
+        self._routes.pop(task, None)
+        return self._blocked.pop(task, None)
+
+    def check(self, task: "asyncio.Task[Any]") -> None:
+        """Untrack `task`, raising LoopBlockedError if it blocked when strict"""
+        report = self.untrack(task)
+        if report is not None:
+            raise LoopBlockedError(
+                f"{report.route} blocked the event loop for over "
+                f"{self.threshold * 1000:.0f} ms at:\n{report.stack}"
+            )
+
+    def _run(self) -> None:
+        running: Optional[FrameType] = None
+        since = 0.0
+        beats = self._beats
+        report: Optional[BlockReport] = None
+        while not self._stop.wait(self.threshold / SAMPLES_PER_THRESHOLD):
+            frame = sys._current_frames().get(self._loop_thread)
+            callback = _callback_frame(frame, self._runner)
+            now = time.perf_counter()
+            # The loop went round, even if a task's frame is still there
+            went_round, beats = self._beats != beats, self._beats
+            if callback is not running or went_round:
+                if report is not None:
+                    report.seconds = now - since
+                    try:
+                        self._loop.call_soon_threadsafe(self._record, report)
+                    except RuntimeError:
+                        # The loop was closed
+                        return
+                running, since, report = callback, now, None
+            elif callback is not None and report is None:
+                if now - since >= self.threshold:
+                    report = self._capture(frame, since, now)
+            # Don't keep the running code's frame alive between samples
+            del frame
+
+    def _capture(self, frame: FrameType, since: float, now: float) -> BlockReport:
+        stack = "".join(traceback.format_stack(frame, STACK_LIMIT))
+        task = asyncio.current_task(self._loop)
+        tracked = self._routes.get(task) if task is not None else None
+        describe = None
+        # A task step can run a request and the code before it, such as an
+        # in-process client's; blame the request only for its own share
+        if tracked is not None and now - max(since, tracked[0]) >= self.threshold:
+            describe = tracked[1]
+        report = BlockReport(describe() if describe else BACKGROUND, 0.0, stack)
+        if self.strict and describe is not None:
+            self._blocked.setdefault(task, report)
+        return report
+
+    def _record(self, report: BlockReport) -> None:
+        self.recent.append(report)
+        logger.warning(
+            "Event loop blocked for %.0f ms in %s at:\n%s",
+            report.seconds * 1000,
+            report.route,
+            report.stack,
+        )
+        if self.on_block is not None:
+            self.on_block(report)
+
+
+loop_watchdog = LoopWatchdog(
+    settings.LOOP_WATCHDOG_THRESHOLD_MS / 1000,
+    strict=settings.LOOP_WATCHDOG_STRICT,
+    on_block=lambda report: event_loop_block_duration.observe(
+        (report.route,), report.seconds
+    ),
+)
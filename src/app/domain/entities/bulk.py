@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.domain.entities.user import User
+
+
+@dataclass
+class BulkItemResult:
+    """Outcome of one item of a bulk operation, by position in the request"""
+
+    index: int
+    status: str  # created, updated, deleted, conflict, not_found or error
+    user: Optional[User] = None
+    detail: Optional[str] = None
+
+
+def split_duplicates(
+    users: Sequence[User],
+) -> Tuple[List[Optional[BulkItemResult]], List[Tuple[int, User]]]:
+    """Results slots with in-request duplicates already marked as conflicts,
+    and the (index, user) pairs left to insert"""
+    results: List[Optional[BulkItemResult]] = [None] * len(users)
+    pending = []
+    seen_emails, seen_usernames = set(), set()
+    for index, user in enumerate(users):
+        if user.email in seen_emails or user.username in seen_usernames:
+            results[index] = BulkItemResult(
+                index, "conflict", detail="Duplicate email or username in request"
+            )
+            continue
+        seen_emails.add(user.email)
+        seen_usernames.add(user.username)
+        pending.append((index, user))
+    return results, pending
+
+
+def split_duplicate_ids(
+    changes: Sequence[Dict[str, Any]],
+) -> Tuple[List[Optional[BulkItemResult]], List[Tuple[int, Dict[str, Any]]]]:
+    """Results slots with repeated ids already marked as conflicts, and the
+    (index, change) pairs left to apply"""
+    results: List[Optional[BulkItemResult]] = [None] * len(changes)
+    pending = []
+    seen_ids = set()
+    for index, change in enumerate(changes):
+        if change["id"] in seen_ids:
+            results[index] = BulkItemResult(
+                index, "conflict", detail="Duplicate id in request"
+            )
+            continue
+        seen_ids.add(change["id"])
+        pending.append((index, change))
+    return results, pending
@@ -8,10 +8,12 @@ from uuid import UUID
 @dataclass
 class User:
     id: Optional[UUID]
-    created_at: Optional[datetime] = None
-    updated_at: Optional[datetime] = None
+    username: str
+    email: str
     hashed_password: str
     is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
 
     def __post_init__(self):
         if self.created_at is None:
@@ -1,7 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 from uuid import UUID
 
+from app.domain.entities.bulk import BulkItemResult
 from app.domain.entities.user import User
 
 
@@ -22,6 +24,79 @@ class UserRepository(ABC):
     async def delete(self, user_id: UUID) -> bool:
         pass
 
+    @abstractmethod
+    async def update_fields(
+        self,
+        user_id: int,
+        fields: Dict[str, Any],
+        if_updated_at: Optional[datetime] = None,
+    ) -> Optional[User]:
+        """Apply a partial update and bump `updated_at`. None when there is no
+        such user or, with `if_updated_at`, its `updated_at` differs"""
+        pass
+
+    @abstractmethod
+    async def get_version(
+        self, field: str, value: Any
+    ) -> Optional[Tuple[int, datetime]]:
+        """(id, updated_at) of the user whose `field` is `value`, without
+        loading the rest of the row"""
+        pass
+
     @abstractmethod
     async def get_by_email(self, email: str) -> Optional[User]:
         pass
+
+    async def get_credentials_by_email(self, email: str) -> Optional[User]:
+        """The user to check a password against: read from the database, never
+        from a cache, so a changed password takes effect at once"""
+        return await self.get_by_email(email)
+
+    @abstractmethod
+    async def get_by_username(self, username: str) -> Optional[User]:
+        pass
+
+    @abstractmethod
+    async def get_many_by_ids(self, user_ids: Sequence[int]) -> List[User]:
+        """The users among `user_ids`, in no particular order"""
+        pass
+
+    @abstractmethod
+    async def get_many_by_emails(self, emails: Sequence[str]) -> List[User]:
+        """The users among `emails`, in no particular order"""
+        pass
+
+    @abstractmethod
+    async def get_all(self, skip: int = 0, limit: int = 100) -> List[User]:
+        """Offset pagination, deprecated in favour of `get_page`"""
+        pass
+
+    @abstractmethod
+    async def get_page(
+        self, after_id: Optional[int] = None, limit: int = 100
+    ) -> List[User]:
+        """Up to `limit` users with an id greater than `after_id`, by id"""
+        pass
+
+    @abstractmethod
+    async def create_many(self, users: Sequence[User]) -> List[BulkItemResult]:
+        """Insert users in batches; email/username clashes are reported per item"""
+        pass
+
+    @abstractmethod
+    async def update_many(
+        self, changes: Sequence[Dict[str, Any]]
+    ) -> List[BulkItemResult]:
+        """Apply partial updates, each mapping holding `id` and changed fields"""
+        pass
+
+    @abstractmethod
+    async def delete_many(self, user_ids: Sequence[int]) -> List[BulkItemResult]:
+        pass
+
+    @abstractmethod
+    def stream_rows(
+        self, columns: Sequence[str], batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        """Every user as `columns` tuples, ordered by id, `batch_size` at a time"""
+        pass
@@ -1,10 +1,11 @@
 from typing import Optional, Dict, Any
-from supabase import Client
+from supabase import AsyncClient
 from app.core.exceptions import UserNotFoundException, UserAlreadyExistsException
+from app.core.resilience import upstream_error
 
 
 class SupabaseAuthService:
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: AsyncClient):
         self.supabase = supabase
 
     async def sign_up(
@@ -12,7 +13,7 @@ class SupabaseAuthService:
     ) -> Dict[str, Any]:
         """Sign up a new user with Supabase Auth"""
         try:
-            response = self.supabase.auth.sign_up(
+            response = await self.supabase.auth.sign_up(
                 {
                     "email": email,
                     "password": password,
@@ -26,6 +27,10 @@ class SupabaseAuthService:
                 raise UserAlreadyExistsException("User registration failed")
 
         except Exception as e:
+            # Supabase being down or slow is not the user's fault
+            upstream = upstream_error(e)
+            if upstream is not None:
+                raise upstream
             if "already registered" in str(e).lower():
                 raise UserAlreadyExistsException("User with this email already exists")
             raise Exception(f"Registration failed: {str(e)}")
@@ -33,7 +38,7 @@ class SupabaseAuthService:
     async def sign_in(self, email: str, password: str) -> Dict[str, Any]:
         """Sign in user with Supabase Auth"""
         try:
-            response = self.supabase.auth.sign_in_with_password(
+            response = await self.supabase.auth.sign_in_with_password(
                 {"email": email, "password": password}
             )
 
@@ -48,14 +53,19 @@ class SupabaseAuthService:
                 raise UserNotFoundException("Invalid credentials")
 
         except Exception as e:
+            # Supabase being down or slow is not the user's fault
+            upstream = upstream_error(e)
+            if upstream is not None:
+                raise upstream
             if "invalid" in str(e).lower():
                 raise UserNotFoundException("Invalid email or password")
             raise Exception(f"Sign in failed: {str(e)}")
 
-    async def sign_out(self) -> bool:
-        """Sign out current user"""
+    async def sign_out(self, access_token: str) -> bool:
+        """Sign out the user owning `access_token`"""
         try:
-            self.supabase.auth.sign_out()
+            # The client is shared between requests and holds no user session
+            await self.supabase.auth.admin.sign_out(access_token)
             return True
         except Exception:
             return False
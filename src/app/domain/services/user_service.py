@@ -1,26 +1,36 @@
-from typing import Optional
-from passlib.context import CryptContext
+import logging
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
-from app.core.exceptions import UserAlreadyExistsException, UserNotFoundException
+from app.core.exceptions import (
+    UserAlreadyExistsException,
+    UserModifiedException,
+    UserNotFoundException,
+)
+from app.core.security import PasswordHasher, password_hasher
+from app.domain.entities.bulk import BulkItemResult
 from app.domain.entities.user import User
 from app.domain.repositories.user_repository import UserRepository
 
+logger = logging.getLogger(__name__)
+
 
 class UserService:
-    def __init__(self, user_repository: UserRepository):
+    def __init__(
+        self,
+        user_repository: UserRepository,
+        hasher: PasswordHasher = password_hasher,
+    ):
         self.user_repository = user_repository
-        self.pwd_context = CryptContext(
-            schemes=["brcrypt"],
-            deprecated="auto",
-        )
+        self.hasher = hasher
 
-    def _hash_password(self, password: str) -> str:
-        return self.pwd_context.hash(password)
+    async def _hash_password(self, password: str) -> str:
+        return await self.hasher.hash(password)
 
-    def _verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        return self.pwd_context.verify(plain_password, hashed_password)
+    async def _verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.hasher.verify(plain_password, hashed_password)
 
-    async def create_user(self, email: str, password: str) -> User:
+    async def create_user(self, username: str, email: str, password: str) -> User:
         # Check if user already exists
         existing_user = await self.user_repository.get_by_email(email)
         if existing_user:
@@ -29,9 +39,10 @@ class UserService:
             )
 
         # Create new user
-        hashed_password = self._hash_password(password)
+        hashed_password = await self._hash_password(password)
         user = User(
             id=None,
+            username=username,
             email=email,
             hashed_password=hashed_password,
             is_active=True,
@@ -39,6 +50,34 @@ class UserService:
 
         return await self.user_repository.create(user)
 
+    async def create_users(
+        self, items: Sequence[Tuple[str, str, str]]
+    ) -> List[BulkItemResult]:
+        """Create users from (username, email, password) tuples"""
+        # Hashed in parallel across the hashing processes
+        hashed_passwords = await self.hasher.hash_many(
+            [password for _, _, password in items]
+        )
+        users = [
+            User(
+                id=None,
+                username=username,
+                email=email,
+                hashed_password=hashed_password,
+                is_active=True,
+            )
+            for (username, email, _), hashed_password in zip(items, hashed_passwords)
+        ]
+        return await self.user_repository.create_many(users)
+
+    async def update_users(
+        self, changes: Sequence[Dict[str, Any]]
+    ) -> List[BulkItemResult]:
+        return await self.user_repository.update_many(changes)
+
+    async def delete_users(self, user_ids: Sequence[int]) -> List[BulkItemResult]:
+        return await self.user_repository.delete_many(user_ids)
+
     async def get_user_by_email(self, email: str) -> User:
         user = await self.user_repository.get_by_email(email)
         if not user:
@@ -51,15 +90,91 @@ class UserService:
             raise UserNotFoundException(f"User with id {user_id} not found")
         return user
 
+    async def get_user_by_username(self, username: str) -> User:
+        user = await self.user_repository.get_by_username(username)
+        if not user:
+            raise UserNotFoundException(f"User with username '{username}' not found")
+        return user
+
+    async def get_user_version(self, field: str, value: Any) -> Tuple[int, datetime]:
+        """(id, updated_at) of a user, for conditional requests"""
+        version = await self.user_repository.get_version(field, value)
+        if version is None:
+            raise UserNotFoundException(f"User with {field} '{value}' not found")
+        return version
+
+    async def update_user(
+        self,
+        user_id: int,
+        username: Optional[str] = None,
+        email: Optional[str] = None,
+        if_updated_at: Optional[datetime] = None,
+    ) -> User:
+        """Change the given fields; with `if_updated_at`, only if the user was
+        not modified since (optimistic concurrency)"""
+        fields = {
+            field: value
+            for field, value in (("username", username), ("email", email))
+            if value is not None
+        }
+        if fields:
+            user = await self.user_repository.update_fields(
+                user_id, fields, if_updated_at
+            )
+            if user is not None:
+                return user
+        else:
+            user = await self.get_user_by_id(user_id)
+            if if_updated_at is None or user.updated_at == if_updated_at:
+                return user
+        # Either there is no such user, or the condition failed
+        await self.get_user_version("id", user_id)
+        raise UserModifiedException(f"User with id {user_id} was modified")
+
+    async def get_all_users(self, skip: int = 0, limit: int = 100) -> List[User]:
+        return await self.user_repository.get_all(skip=skip, limit=limit)
+
+    async def get_users_page(
+        self, after_id: Optional[int] = None, limit: int = 100
+    ) -> Tuple[List[User], Optional[int]]:
+        """A page of users and the id to continue after, if there are more"""
+        # One extra row tells whether another page exists
+        users = await self.user_repository.get_page(after_id=after_id, limit=limit + 1)
+        if len(users) > limit:
+            users = users[:limit]
+            return users, users[-1].id
+        return users, None
+
+    def stream_users(
+        self, columns: Sequence[str], batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        return self.user_repository.stream_rows(columns, batch_size=batch_size)
+
     async def authenticate_user(self, email: str, password: str) -> Optional[User]:
-        try:
-            user = await self.get_user_by_email(email)
-            if not self._verify_password(password, user.hashed_password):
-                return None
-            return user
-        except UserNotFoundException:
+        user = await self.user_repository.get_credentials_by_email(email)
+        if user is None or not await self._verify_password(
+            password, user.hashed_password
+        ):
             return None
 
+        if self.hasher.needs_rehash(user.hashed_password):
+            # Upgrade hashes made with an outdated cost while we have the password
+            try:
+                rehashed = await self._hash_password(password)
+                # Unless the user changed meanwhile, such as their password
+                updated = await self.user_repository.update_fields(
+                    user.id,
+                    {"hashed_password": rehashed},
+                    if_updated_at=user.updated_at,
+                )
+            except Exception:
+                # The login still succeeds; the next one tries again
+                logger.exception("Could not upgrade the password hash of a user")
+            else:
+                if updated is not None:
+                    user = updated
+        return user
+
     async def delete_user(self, user_id: int) -> bool:
         await self.get_user_by_id(user_id)
         return await self.user_repository.delete(user_id)
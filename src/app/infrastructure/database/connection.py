@@ -1,16 +1,223 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+import asyncio
+import logging
+import time
+from typing import Any, Dict
+from uuid import uuid4
 
+from sqlalchemy import event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (
+    AsyncConnection,
+    AsyncSession,
+    create_async_engine,
+    async_sessionmaker,
+)
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core import deadline
 from app.core.config import settings
+from app.core.exceptions import DeadlineExceededException
+from app.core.metrics import cancelled_operations, db_query_duration
+
+logger = logging.getLogger(__name__)
+
+
+class PoolStats:
+    """Checkout wait times, overflow and timeout counts of the engine's pool"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float) -> None:
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        if seconds > self.wait_seconds_max:
+            self.wait_seconds_max = seconds
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """QueuePool that records into `pool_stats`; survives pool recreation
+    because the stats live outside the instance"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.timeouts += 1
+            raise
+        finally:
+            # Includes connecting when the pool had to open a new connection
+            pool_stats.record_wait(time.perf_counter() - start)
+
+    def _inc_overflow(self) -> bool:
+        opened = super()._inc_overflow()
+        # `_overflow` counts from -pool_size, so positive means beyond it
+        if opened and self._overflow > 0:
+            pool_stats.overflow_events += 1
+        return opened
+
+
+def _connect_args() -> Dict[str, Any]:
+    if settings.DB_PGBOUNCER_MODE:
+        # Transaction-pooled PgBouncer/Supavisor: a prepared statement may land
+        # on another server connection, so never cache them and never reuse
+        # statement names
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
 
 # Create async engine
-engine = create_async_engine(settings.DATABASE_URL, echo=settings.DEBUG, future=True)
+engine = create_async_engine(
+    settings.DATABASE_URL,
+    echo=settings.DEBUG,
+    future=True,
+    poolclass=InstrumentedPool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=_connect_args(),
+)
+
+if settings.METRICS_ENABLED:
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+        context.query_started_at = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+        db_query_duration.observe(
+            (operation,), time.perf_counter() - context.query_started_at
+        )
+
+
+# Postgres cancelled the statement: its statement_timeout passed
+QUERY_CANCELED = "57014"
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_cancellation(context) -> None:
+    error = context.original_exception
+    if isinstance(error, asyncio.CancelledError):
+        # The request was abandoned; asyncpg also cancels the query server-side
+        cancelled_operations.inc(("database",))
+    elif getattr(error, "sqlstate", None) == QUERY_CANCELED and deadline.expired():
+        cancelled_operations.inc(("database",))
+        raise DeadlineExceededException("Request deadline exceeded") from error
+
+
+class DeadlineSession(Session):
+    """Session whose transactions time out with the request's deadline"""
+
+
+if settings.DB_DEADLINE_STATEMENT_TIMEOUT:
+
+    @event.listens_for(DeadlineSession, "after_begin")
+    def _apply_deadline(session, transaction, connection) -> None:
+        remaining = deadline.remaining()
+        if remaining is not None:
+            # Local to the transaction, so also right behind transaction pooling
+            connection.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": f"{max(int(remaining * 1000), 1)}ms"},
+            )
+
 
 # Create async session maker
 async_session_maker = async_sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
+    engine,
+    class_=AsyncSession,
+    sync_session_class=DeadlineSession,
+    expire_on_commit=False,
 )
 
 
 class Base(DeclarativeBase):
     pass
+
+
+async def warm_up_pool(connections: int, timeout: float) -> int:
+    """Open up to `connections` pooled connections now rather than on first
+    use, giving up on those not open within `timeout` seconds; returns how
+    many could be opened"""
+
+    async def open_connection() -> AsyncConnection:
+        connection = await engine.connect()
+        try:
+            await connection.execute(text("SELECT 1"))
+        except BaseException:
+            await connection.close()
+            raise
+        return connection
+
+    # All are held at once, so each one is a distinct pooled connection
+    tasks = [
+        asyncio.ensure_future(open_connection())
+        for _ in range(min(connections, settings.DB_POOL_SIZE))
+    ]
+    if not tasks:
+        return 0
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    if pending:
+        logger.warning(
+            "Could not warm up %d database connections within %.1f s",
+            len(pending),
+            timeout,
+        )
+
+    opened = [
+        task.result()
+        for task in tasks
+        if not task.cancelled() and task.exception() is None
+    ]
+    for connection in opened:
+        await connection.close()
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(
+                "Could not warm up a database connection: %s", task.exception()
+            )
+            break
+    return len(opened)
+
+
+def get_db_pool_stats() -> Dict[str, Any]:
+    """Current pool usage and cumulative checkout statistics"""
+    pool = engine.sync_engine.pool
+    checkouts = pool_stats.checkouts
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checkouts": checkouts,
+        "wait_ms_avg": (
+            pool_stats.wait_seconds_total / checkouts * 1000 if checkouts else 0.0
+        ),
+        "wait_ms_max": pool_stats.wait_seconds_max * 1000,
+        "overflow_events": pool_stats.overflow_events,
+        "timeouts": pool_stats.timeouts,
+    }
@@ -19,6 +19,6 @@ class UserModel(Base):
     updated_at = Column(
         DateTime(timezone=True),
         server_default=func.now(),
-        onupdate=func.now(),
+        onupdate=func.clock_timestamp(),
         nullable=False,
     )
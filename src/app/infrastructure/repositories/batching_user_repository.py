@@ -0,0 +1,46 @@
+import asyncio
+from dataclasses import replace
+from typing import Dict, List, Optional
+
+from app.core.dataloader import DataLoader
+from app.domain.entities.user import User
+from app.domain.repositories.user_repository import UserRepository
+from app.infrastructure.repositories.delegating_user_repository import (
+    DelegatingUserRepository,
+)
+
+
+class BatchingUserRepository(DelegatingUserRepository):
+    """Resolves the get_by_id and get_by_email calls made in one event-loop
+    tick with a single query, so N lookups cost one round trip.
+
+    Created per request, like the session of the repository it wraps.
+    """
+
+    def __init__(self, repository: UserRepository, max_batch_size: int = 1000):
+        super().__init__(repository)
+        # A session runs one statement at a time
+        self._lock = asyncio.Lock()
+        self.ids: DataLoader[int, User] = DataLoader(self._load_ids, max_batch_size)
+        self.emails: DataLoader[str, User] = DataLoader(
+            self._load_emails, max_batch_size
+        )
+
+    async def _load_ids(self, user_ids: List[int]) -> Dict[int, User]:
+        async with self._lock:
+            users = await self.repository.get_many_by_ids(user_ids)
+        return {user.id: user for user in users}
+
+    async def _load_emails(self, emails: List[str]) -> Dict[str, User]:
+        async with self._lock:
+            users = await self.repository.get_many_by_emails(emails)
+        return {user.email: user for user in users}
+
+    async def get_by_id(self, user_id: int) -> Optional[User]:
+        user = await self.ids.load(user_id)
+        # Callers that asked for the same key each get their own copy
+        return None if user is None else replace(user)
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        user = await self.emails.load(email)
+        return None if user is None else replace(user)
@@ -0,0 +1,239 @@
+from dataclasses import replace
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.cache import LRUCache
+from app.core.config import settings
+from app.core.supabase import get_supabase_admin_client
+from app.domain.entities.bulk import BulkItemResult
+from app.domain.entities.user import User
+from app.domain.repositories.user_repository import UserRepository
+from app.infrastructure.repositories.delegating_user_repository import (
+    DelegatingUserRepository,
+)
+
+LOOKUP_FIELDS = ("id", "email", "username")
+
+
+class UserCache:
+    """Users of this worker, each reachable by id, email and username.
+
+    Entries are stored once, by id; email and username map to an id and are
+    checked against the entry on lookup, so dropping the id entry invalidates
+    every key of a user. Lookups that found no user are cached separately,
+    with a shorter TTL.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        self._users: LRUCache[User] = LRUCache(max_size, ttl)
+        self._index: LRUCache[Any] = LRUCache(2 * max_size, ttl)
+        self._misses: LRUCache[bool] = LRUCache(max_size, negative_ttl)
+        # Bumped on every invalidation, so a load that raced with a write does
+        # not put the stale row back
+        self.generation = 0
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, field: str, value: Any) -> Tuple[bool, Optional[User]]:
+        """(found, user); found with no user means a cached miss"""
+        if field == "id":
+            user = self._users.get(value)
+        else:
+            user_id = self._index.get((field, value))
+            user = None if user_id is None else self._users.get(user_id)
+            if user is not None and getattr(user, field) != value:
+                user = None
+        if user is not None:
+            self.hits += 1
+            # Callers may modify the user they get back
+            return True, replace(user)
+        if (field, value) in self._misses:
+            self.negative_hits += 1
+            return True, None
+        self.misses += 1
+        return False, None
+
+    def put(self, user: User) -> None:
+        self._users.set(user.id, replace(user))
+        for field in LOOKUP_FIELDS:
+            value = getattr(user, field)
+            self._misses.delete((field, value))
+            if field != "id":
+                self._index.set((field, value), user.id)
+
+    def fill(
+        self, field: str, value: Any, user: Optional[User], generation: int
+    ) -> None:
+        """Store the result of a load started at `generation`"""
+        if generation != self.generation:
+            return
+        if user is None:
+            self._misses.set((field, value), True)
+        else:
+            self.put(user)
+
+    def invalidate(
+        self,
+        user_id: Any = None,
+        email: Optional[str] = None,
+        username: Optional[str] = None,
+    ) -> None:
+        self.generation += 1
+        self.invalidations += 1
+        for field, value in (("id", user_id), ("email", email), ("username", username)):
+            if value is None:
+                continue
+            self._misses.delete((field, value))
+            if field == "id":
+                self._users.delete(value)
+            else:
+                self._index.delete((field, value))
+
+    def handle_change(self, payload: Dict[str, Any]) -> None:
+        """Invalidate the users of a Realtime `postgres_changes` event"""
+        data = payload.get("data", payload)
+        for record in (data.get("record"), data.get("old_record")):
+            if record:
+                self.invalidate(
+                    record.get("id"), record.get("email"), record.get("username")
+                )
+
+    def invalidate_keys(self, keys: Sequence[Sequence[Any]]) -> None:
+        """Invalidate the users of an invalidation bus message, as
+        (id, email, username) keys"""
+        for user_id, email, username in keys:
+            self.invalidate(user_id, email, username)
+
+    def clear(self) -> None:
+        self.generation += 1
+        self._users.clear()
+        self._index.clear()
+        self._misses.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._users),
+            "negative_size": len(self._misses),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            "evictions": self._users.evictions + self._misses.evictions,
+            "expirations": self._users.expirations + self._misses.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+user_cache = UserCache(
+    max_size=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS,
+    negative_ttl=settings.USER_CACHE_NEGATIVE_TTL_SECONDS,
+)
+
+
+def get_user_cache_stats() -> Dict[str, Any]:
+    return user_cache.stats()
+
+
+async def subscribe_user_cache_invalidation() -> Optional[Any]:
+    """Invalidate cached users on changes to the `users` table, from any worker"""
+    from app.infrastructure.supabase.realtime_service import SupabaseRealtimeService
+
+    realtime = SupabaseRealtimeService(await get_supabase_admin_client())
+    # Only the latest change of a row matters: each invalidates the whole user
+    return await realtime.subscribe_to_table(
+        "users", callback=user_cache.handle_change, coalesce=True
+    )
+
+
+class CachedUserRepository(DelegatingUserRepository):
+    """Read-through cache in front of another UserRepository.
+
+    Writes made through it invalidate the cache immediately; writes made
+    elsewhere are picked up through Realtime, or once the TTL expires.
+    Versions, which conditional requests answer 304 on, and the credentials
+    checked at login are always read from the backend.
+    """
+
+    def __init__(self, repository: UserRepository, cache: UserCache = user_cache):
+        super().__init__(repository)
+        self.cache = cache
+
+    async def _get(
+        self,
+        field: str,
+        value: Any,
+        load: Callable[[Any], Awaitable[Optional[User]]],
+    ) -> Optional[User]:
+        found, user = self.cache.lookup(field, value)
+        if found:
+            return user
+        generation = self.cache.generation
+        user = await load(value)
+        self.cache.fill(field, value, user, generation)
+        return user
+
+    async def get_by_id(self, user_id: int) -> Optional[User]:
+        return await self._get("id", user_id, self.repository.get_by_id)
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        return await self._get("email", email, self.repository.get_by_email)
+
+    async def get_by_username(self, username: str) -> Optional[User]:
+        return await self._get("username", username, self.repository.get_by_username)
+
+    async def create(self, user: User) -> User:
+        created = await self.repository.create(user)
+        self.cache.invalidate(created.id, created.email, created.username)
+        return created
+
+    async def update(self, user: User) -> User:
+        try:
+            return await self.repository.update(user)
+        finally:
+            self.cache.invalidate(user.id, user.email, user.username)
+
+    async def update_fields(
+        self,
+        user_id: int,
+        fields: Dict[str, Any],
+        if_updated_at: Optional[datetime] = None,
+    ) -> Optional[User]:
+        try:
+            return await self.repository.update_fields(user_id, fields, if_updated_at)
+        finally:
+            # The old email and username go with the id entry
+            self.cache.invalidate(user_id, fields.get("email"), fields.get("username"))
+
+    async def delete(self, user_id: int) -> bool:
+        try:
+            return await self.repository.delete(user_id)
+        finally:
+            self.cache.invalidate(user_id)
+
+    async def create_many(self, users: Sequence[User]) -> List[BulkItemResult]:
+        results = await self.repository.create_many(users)
+        for user in users:
+            self.cache.invalidate(email=user.email, username=user.username)
+        return results
+
+    async def update_many(
+        self, changes: Sequence[Dict[str, Any]]
+    ) -> List[BulkItemResult]:
+        try:
+            return await self.repository.update_many(changes)
+        finally:
+            for change in changes:
+                self.cache.invalidate(
+                    change["id"], change.get("email"), change.get("username")
+                )
+
+    async def delete_many(self, user_ids: Sequence[int]) -> List[BulkItemResult]:
+        try:
+            return await self.repository.delete_many(user_ids)
+        finally:
+            for user_id in user_ids:
+                self.cache.invalidate(user_id)
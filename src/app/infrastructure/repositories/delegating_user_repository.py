@@ -0,0 +1,78 @@
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.domain.entities.bulk import BulkItemResult
+from app.domain.entities.user import User
+from app.domain.repositories.user_repository import UserRepository
+
+
+class DelegatingUserRepository(UserRepository):
+    """Forwards every call to another UserRepository; subclasses override the
+    calls they add behaviour to"""
+
+    def __init__(self, repository: UserRepository):
+        self.repository = repository
+
+    async def create(self, user: User) -> User:
+        return await self.repository.create(user)
+
+    async def get_by_id(self, user_id: int) -> Optional[User]:
+        return await self.repository.get_by_id(user_id)
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        return await self.repository.get_by_email(email)
+
+    async def get_credentials_by_email(self, email: str) -> Optional[User]:
+        return await self.repository.get_credentials_by_email(email)
+
+    async def get_by_username(self, username: str) -> Optional[User]:
+        return await self.repository.get_by_username(username)
+
+    async def get_many_by_ids(self, user_ids: Sequence[int]) -> List[User]:
+        return await self.repository.get_many_by_ids(user_ids)
+
+    async def get_many_by_emails(self, emails: Sequence[str]) -> List[User]:
+        return await self.repository.get_many_by_emails(emails)
+
+    async def update(self, user: User) -> User:
+        return await self.repository.update(user)
+
+    async def update_fields(
+        self,
+        user_id: int,
+        fields: Dict[str, Any],
+        if_updated_at: Optional[datetime] = None,
+    ) -> Optional[User]:
+        return await self.repository.update_fields(user_id, fields, if_updated_at)
+
+    async def get_version(
+        self, field: str, value: Any
+    ) -> Optional[Tuple[int, datetime]]:
+        return await self.repository.get_version(field, value)
+
+    async def delete(self, user_id: int) -> bool:
+        return await self.repository.delete(user_id)
+
+    async def get_all(self, skip: int = 0, limit: int = 100) -> List[User]:
+        return await self.repository.get_all(skip=skip, limit=limit)
+
+    async def get_page(
+        self, after_id: Optional[int] = None, limit: int = 100
+    ) -> List[User]:
+        return await self.repository.get_page(after_id=after_id, limit=limit)
+
+    async def create_many(self, users: Sequence[User]) -> List[BulkItemResult]:
+        return await self.repository.create_many(users)
+
+    async def update_many(
+        self, changes: Sequence[Dict[str, Any]]
+    ) -> List[BulkItemResult]:
+        return await self.repository.update_many(changes)
+
+    async def delete_many(self, user_ids: Sequence[int]) -> List[BulkItemResult]:
+        return await self.repository.delete_many(user_ids)
+
+    def stream_rows(
+        self, columns: Sequence[str], batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        return self.repository.stream_rows(columns, batch_size=batch_size)
@@ -0,0 +1,205 @@
+from bisect import bisect_left, bisect_right
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from app.core.exceptions import UserAlreadyExistsException
+from app.domain.entities.bulk import (
+    BulkItemResult,
+    split_duplicate_ids,
+    split_duplicates,
+)
+from app.domain.entities.user import User
+from app.domain.repositories.user_repository import UserRepository
+
+
+class InMemoryUserRepository(UserRepository):
+    """UserRepository kept in process memory, for benchmarks and local runs
+    without a database. Enforces the same unique email and username rules."""
+
+    def __init__(self):
+        self._users: Dict[int, User] = {}
+        self._ids: List[int] = []  # sorted, for keyset pages
+        self._by_email: Dict[str, int] = {}
+        self._by_username: Dict[str, int] = {}
+        self._next_id = 1
+
+    def _conflict(self, user: User) -> Optional[str]:
+        for field, index in (
+            ("email", self._by_email),
+            ("username", self._by_username),
+        ):
+            owner = index.get(getattr(user, field))
+            if owner is not None and owner != user.id:
+                return field
+        return None
+
+    def _insert(self, user: User) -> User:
+        stored = replace(user, id=self._next_id)
+        self._next_id += 1
+        self._users[stored.id] = stored
+        self._ids.append(stored.id)
+        self._by_email[stored.email] = stored.id
+        self._by_username[stored.username] = stored.id
+        return replace(stored)
+
+    def _remove(self, user_id: int) -> bool:
+        user = self._users.pop(user_id, None)
+        if user is None:
+            return False
+        del self._ids[bisect_left(self._ids, user_id)]
+        del self._by_email[user.email]
+        del self._by_username[user.username]
+        return True
+
+    def _apply(self, user_id: int, changes: Dict[str, Any]) -> Optional[User]:
+        current = self._users.get(user_id)
+        if current is None:
+            return None
+        updated = replace(current, **changes, updated_at=datetime.now(timezone.utc))
+        field = self._conflict(updated)
+        if field:
+            raise UserAlreadyExistsException(f"User with this {field} already exists")
+        del self._by_email[current.email]
+        del self._by_username[current.username]
+        self._users[user_id] = updated
+        self._by_email[updated.email] = user_id
+        self._by_username[updated.username] = user_id
+        return replace(updated)
+
+    def _get(self, user_id: Optional[int]) -> Optional[User]:
+        user = self._users.get(user_id) if user_id is not None else None
+        return None if user is None else replace(user)
+
+    async def create(self, user: User) -> User:
+        field = self._conflict(replace(user, id=None))
+        if field:
+            raise UserAlreadyExistsException(f"User with this {field} already exists")
+        return self._insert(user)
+
+    async def get_by_id(self, user_id: int) -> Optional[User]:
+        return self._get(user_id)
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        return self._get(self._by_email.get(email))
+
+    async def get_by_username(self, username: str) -> Optional[User]:
+        return self._get(self._by_username.get(username))
+
+    async def get_version(
+        self, field: str, value: Any
+    ) -> Optional[Tuple[int, datetime]]:
+        if field == "id":
+            user_id = value
+        else:
+            user_id = {"email": self._by_email, "username": self._by_username}[
+                field
+            ].get(value)
+        user = self._users.get(user_id)
+        return None if user is None else (user.id, user.updated_at)
+
+    async def get_many_by_ids(self, user_ids: Sequence[int]) -> List[User]:
+        return [user for user in map(self._get, set(user_ids)) if user]
+
+    async def get_many_by_emails(self, emails: Sequence[str]) -> List[User]:
+        ids = {self._by_email.get(email) for email in emails}
+        return [user for user in map(self._get, ids) if user]
+
+    async def get_all(self, skip: int = 0, limit: int = 100) -> List[User]:
+        return [self._get(user_id) for user_id in self._ids[skip : skip + limit]]
+
+    async def get_page(
+        self, after_id: Optional[int] = None, limit: int = 100
+    ) -> List[User]:
+        start = 0 if after_id is None else bisect_right(self._ids, after_id)
+        return [self._get(user_id) for user_id in self._ids[start : start + limit]]
+
+    async def create_many(self, users: Sequence[User]) -> List[BulkItemResult]:
+        results, pending = split_duplicates(users)
+        for index, user in pending:
+            field = self._conflict(replace(user, id=None))
+            if field:
+                results[index] = BulkItemResult(
+                    index, "conflict", detail=f"User with this {field} already exists"
+                )
+            else:
+                results[index] = BulkItemResult(
+                    index, "created", user=self._insert(user)
+                )
+        return results
+
+    async def update_many(
+        self, changes: Sequence[Dict[str, Any]]
+    ) -> List[BulkItemResult]:
+        results, pending = split_duplicate_ids(changes)
+        for index, change in pending:
+            fields = {k: v for k, v in change.items() if k != "id" and v is not None}
+            try:
+                user = self._apply(change["id"], fields)
+            except UserAlreadyExistsException as e:
+                results[index] = BulkItemResult(index, "conflict", detail=str(e))
+                continue
+            if user is None:
+                results[index] = BulkItemResult(
+                    index, "not_found", detail=f"User with id {change['id']} not found"
+                )
+            else:
+                results[index] = BulkItemResult(index, "updated", user=user)
+        return results
+
+    async def delete_many(self, user_ids: Sequence[int]) -> List[BulkItemResult]:
+        # A repeated id is reported deleted each time, as by the other backends
+        deleted = {
+            user_id for user_id in dict.fromkeys(user_ids) if self._remove(user_id)
+        }
+        return [
+            (
+                BulkItemResult(index, "deleted")
+                if user_id in deleted
+                else BulkItemResult(
+                    index, "not_found", detail=f"User with id {user_id} not found"
+                )
+            )
+            for index, user_id in enumerate(user_ids)
+        ]
+
+    async def stream_rows(
+        self, columns: Sequence[str], batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        for start in range(0, len(self._ids), batch_size):
+            yield [
+                tuple(getattr(self._users[user_id], column) for column in columns)
+                for user_id in self._ids[start : start + batch_size]
+            ]
+
+    async def update(self, user: User) -> User:
+        fields = {
+            "username": user.username,
+            "email": user.email,
+            "hashed_password": user.hashed_password,
+            "is_active": user.is_active,
+        }
+        updated = self._apply(user.id, fields)
+        if updated is None:
+            raise ValueError(f"User with id {user.id} not found")
+        return updated
+
+    async def update_fields(
+        self,
+        user_id: int,
+        fields: Dict[str, Any],
+        if_updated_at: Optional[datetime] = None,
+    ) -> Optional[User]:
+        current = self._users.get(user_id)
+        if current is None:
+            return None
+        if if_updated_at is not None and current.updated_at != if_updated_at:
+            return None
+        return self._apply(user_id, fields)
+
+    async def delete(self, user_id: int) -> bool:
+        return self._remove(user_id)
+
+
+# One store per worker process, shared by every request
+memory_user_repository = InMemoryUserRepository()
@@ -0,0 +1,172 @@
+import asyncio
+from dataclasses import replace
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncContextManager,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from app.core.singleflight import SingleFlight
+from app.domain.entities.bulk import BulkItemResult
+from app.domain.entities.user import User
+from app.domain.repositories.user_repository import UserRepository
+from app.infrastructure.repositories.delegating_user_repository import (
+    DelegatingUserRepository,
+)
+
+# Shared by every request of the worker
+user_lookups = SingleFlight()
+
+
+def get_user_lookup_stats() -> Dict[str, int]:
+    return user_lookups.stats()
+
+
+class SingleFlightUserRepository(DelegatingUserRepository):
+    """Concurrent identical lookups by id, email or username share one round
+    trip to the database. Those of get_many_by_ids and get_many_by_emails
+    are shared per key, with each other and with get_by_id and get_by_email,
+    so requests whose lookups are batched still share them.
+
+    A lookup nobody else is making runs on this request's repository. One
+    that joins another request's lookup may see it fail because that request
+    ended and closed its session under it; with `reader_scope`, it then runs
+    the lookup again on a repository of its own.
+
+    Writes make later lookups start afresh instead of joining those already
+    in flight, which may have read the rows before the write committed. Every
+    flight is forgotten, not only the written user's: a write can change
+    keys it does not know, such as the email of a user deleted by id.
+    """
+
+    def __init__(
+        self,
+        repository: UserRepository,
+        reader_scope: Optional[
+            Callable[[], AsyncContextManager[UserRepository]]
+        ] = None,
+        flights: SingleFlight = user_lookups,
+    ):
+        super().__init__(repository)
+        self.reader_scope = reader_scope
+        self.flights = flights
+        # A session runs one statement at a time
+        self._lock = asyncio.Lock()
+
+    async def _read(self, method: str, *args: Any) -> Any:
+        async with self._lock:
+            return await getattr(self.repository, method)(*args)
+
+    async def _shared(self, key: Hashable, method: str, *args: Any) -> Any:
+        joined = self.flights.in_flight(key)
+        try:
+            return await self.flights.do(key, lambda: self._read(method, *args))
+        except Exception:
+            if not joined or self.reader_scope is None:
+                raise
+        async with self.reader_scope() as repository:
+            return await getattr(repository, method)(*args)
+
+    async def _get(self, field: str, value: Any) -> Optional[User]:
+        user = await self._shared((field, value), f"get_by_{field}", value)
+        # Every caller gets its own copy to modify
+        return None if user is None else replace(user)
+
+    async def get_by_id(self, user_id: int) -> Optional[User]:
+        return await self._get("id", user_id)
+
+    async def get_by_email(self, email: str) -> Optional[User]:
+        return await self._get("email", email)
+
+    async def get_by_username(self, username: str) -> Optional[User]:
+        return await self._get("username", username)
+
+    async def _get_many(
+        self, field: str, values: Sequence[Any], method: str
+    ) -> List[User]:
+        keys = [(field, value) for value in values]
+        joined = any(self.flights.in_flight(key) for key in keys)
+
+        async def load(missing: List[Hashable]) -> Dict[Hashable, Optional[User]]:
+            users = await self._read(method, [value for _, value in missing])
+            found = {getattr(user, field): user for user in users}
+            return {key: found.get(key[1]) for key in missing}
+
+        try:
+            users = (await self.flights.do_many(keys, load)).values()
+        except Exception:
+            if not joined or self.reader_scope is None:
+                raise
+            async with self.reader_scope() as repository:
+                return await getattr(repository, method)(values)
+        return [replace(user) for user in users if user is not None]
+
+    async def get_many_by_ids(self, user_ids: Sequence[int]) -> List[User]:
+        return await self._get_many("id", user_ids, "get_many_by_ids")
+
+    async def get_many_by_emails(self, emails: Sequence[str]) -> List[User]:
+        return await self._get_many("email", emails, "get_many_by_emails")
+
+    async def get_version(
+        self, field: str, value: Any
+    ) -> Optional[Tuple[int, datetime]]:
+        # Clients polling with If-None-Match tend to poll the same users
+        return await self._shared(
+            ("version", field, value), "get_version", field, value
+        )
+
+    async def create(self, user: User) -> User:
+        try:
+            return await self.repository.create(user)
+        finally:
+            self.flights.forget()
+
+    async def update(self, user: User) -> User:
+        try:
+            return await self.repository.update(user)
+        finally:
+            self.flights.forget()
+
+    async def update_fields(
+        self,
+        user_id: int,
+        fields: Dict[str, Any],
+        if_updated_at: Optional[datetime] = None,
+    ) -> Optional[User]:
+        try:
+            return await self.repository.update_fields(user_id, fields, if_updated_at)
+        finally:
+            self.flights.forget()
+
+    async def delete(self, user_id: int) -> bool:
+        try:
+            return await self.repository.delete(user_id)
+        finally:
+            self.flights.forget()
+
+    async def create_many(self, users: Sequence[User]) -> List[BulkItemResult]:
+        try:
+            return await self.repository.create_many(users)
+        finally:
+            self.flights.forget()
+
+    async def update_many(
+        self, changes: Sequence[Dict[str, Any]]
+    ) -> List[BulkItemResult]:
+        try:
+            return await self.repository.update_many(changes)
+        finally:
+            self.flights.forget()
+
+    async def delete_many(self, user_ids: Sequence[int]) -> List[BulkItemResult]:
+        try:
+            return await self.repository.delete_many(user_ids)
+        finally:
+            self.flights.forget()
@@ -1,12 +1,42 @@
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import (
+    Integer,
+    String,
+    any_,
+    bindparam,
+    column,
+    delete,
+    func,
+    or_,
+    select,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.exc import IntegrityError, NoResultFound
 
+from app.core.exceptions import UserAlreadyExistsException
+from app.domain.entities.bulk import (
+    BulkItemResult,
+    split_duplicate_ids,
+    split_duplicates,
+)
 from app.domain.entities.user import User
 from app.domain.repositories.user_repository import UserRepository
 from app.infrastructure.database.models import UserModel
 
+# Keeps multi-row statements well below asyncpg's 32767 bind parameter limit
+BULK_CHUNK_SIZE = 1000
+
+
+def _chunks(items: Sequence[Any]) -> List[Sequence[Any]]:
+    return [
+        items[start : start + BULK_CHUNK_SIZE]
+        for start in range(0, len(items), BULK_CHUNK_SIZE)
+    ]
+
 
 class UserRepositoryImpl(UserRepository):
     def __init__(self, session: AsyncSession):
@@ -74,12 +104,248 @@ class UserRepositoryImpl(UserRepository):
         except NoResultFound:
             return None
 
+    async def get_version(
+        self, field: str, value: Any
+    ) -> Optional[Tuple[int, datetime]]:
+        stmt = select(UserModel.id, UserModel.updated_at).where(
+            getattr(UserModel, field) == value
+        )
+        row = (await self.session.execute(stmt)).one_or_none()
+        return None if row is None else (row.id, row.updated_at)
+
+    async def get_many_by_ids(self, user_ids: Sequence[int]) -> List[User]:
+        # One array parameter, so the prepared statement does not vary with
+        # the number of ids
+        stmt = select(UserModel).where(
+            UserModel.id == any_(bindparam("user_ids", list(user_ids), ARRAY(Integer)))
+        )
+        result = await self.session.execute(stmt)
+        return [self._model_to_entity(model) for model in result.scalars()]
+
+    async def get_many_by_emails(self, emails: Sequence[str]) -> List[User]:
+        stmt = select(UserModel).where(
+            UserModel.email == any_(bindparam("emails", list(emails), ARRAY(String)))
+        )
+        result = await self.session.execute(stmt)
+        return [self._model_to_entity(model) for model in result.scalars()]
+
     async def get_all(self, skip: int = 0, limit: int = 100) -> List[User]:
-        stmt = select(UserModel).offset(skip).limit(limit)
+        stmt = select(UserModel).order_by(UserModel.id).offset(skip).limit(limit)
+        result = await self.session.execute(stmt)
+        models = result.scalars().all()
+        return [self._model_to_entity(model) for model in models]
+
+    async def get_page(
+        self, after_id: Optional[int] = None, limit: int = 100
+    ) -> List[User]:
+        # Keyset pagination: a primary-key range scan, whatever the depth
+        stmt = select(UserModel).order_by(UserModel.id).limit(limit)
+        if after_id is not None:
+            stmt = stmt.where(UserModel.id > after_id)
         result = await self.session.execute(stmt)
         models = result.scalars().all()
         return [self._model_to_entity(model) for model in models]
 
+    async def _find_taken(
+        self, emails: Sequence[str], usernames: Sequence[str]
+    ) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Owners (user ids) of the given emails and usernames"""
+        stmt = select(UserModel.id, UserModel.email, UserModel.username).where(
+            or_(UserModel.email.in_(emails), UserModel.username.in_(usernames))
+        )
+        result = await self.session.execute(stmt)
+        taken_emails, taken_usernames = {}, {}
+        for user_id, email, username in result:
+            taken_emails[email] = user_id
+            taken_usernames[username] = user_id
+        return taken_emails, taken_usernames
+
+    async def create_many(self, users: Sequence[User]) -> List[BulkItemResult]:
+        results, pending = split_duplicates(users)
+
+        # Multi-row INSERT ... ON CONFLICT DO NOTHING RETURNING: rows that clash
+        # with existing users are skipped instead of failing the whole batch
+        created: Dict[str, UserModel] = {}
+        for chunk in _chunks(pending):
+            rows = [
+                {
+                    "username": user.username,
+                    "email": user.email,
+                    "hashed_password": user.hashed_password,
+                    "is_active": user.is_active,
+                }
+                for _, user in chunk
+            ]
+            stmt = (
+                insert(UserModel)
+                .values(rows)
+                .on_conflict_do_nothing()
+                .returning(UserModel)
+            )
+            for model in await self.session.scalars(stmt):
+                created[model.email] = model
+        await self.session.commit()
+
+        skipped = [
+            (index, user) for index, user in pending if user.email not in created
+        ]
+        taken_emails: Dict[str, int] = {}
+        if skipped:
+            taken_emails, _ = await self._find_taken(
+                [user.email for _, user in skipped],
+                [user.username for _, user in skipped],
+            )
+        for index, user in pending:
+            model = created.get(user.email)
+            if model is not None:
+                results[index] = BulkItemResult(
+                    index, "created", user=self._model_to_entity(model)
+                )
+            else:
+                field = "email" if user.email in taken_emails else "username"
+                results[index] = BulkItemResult(
+                    index, "conflict", detail=f"User with this {field} already exists"
+                )
+        return results
+
+    async def _update_rows(self, changes: Sequence[Dict[str, Any]]) -> List[User]:
+        """UPDATE ... FROM (VALUES ...) RETURNING, with NULL meaning "leave
+        this column unchanged"; ids must be unique"""
+        new_values = values(
+            column("id", Integer),
+            column("username", String),
+            column("email", String),
+            column("hashed_password", String),
+            name="new_values",
+        ).data(
+            [
+                (
+                    change["id"],
+                    change.get("username"),
+                    change.get("email"),
+                    change.get("hashed_password"),
+                )
+                for change in changes
+            ]
+        )
+        table = UserModel.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == new_values.c.id)
+            .values(
+                username=func.coalesce(new_values.c.username, table.c.username),
+                email=func.coalesce(new_values.c.email, table.c.email),
+                hashed_password=func.coalesce(
+                    new_values.c.hashed_password, table.c.hashed_password
+                ),
+                updated_at=func.clock_timestamp(),
+            )
+            .returning(*table.c)
+        )
+        return [self._model_to_entity(row) for row in await self.session.execute(stmt)]
+
+    async def update_many(
+        self, changes: Sequence[Dict[str, Any]]
+    ) -> List[BulkItemResult]:
+        results, candidates = split_duplicate_ids(changes)
+        taken_emails, taken_usernames = await self._find_taken(
+            [change["email"] for _, change in candidates if change.get("email")],
+            [change["username"] for _, change in candidates if change.get("username")],
+        )
+
+        pending = []
+        for index, change in candidates:
+            user_id = change["id"]
+            clash = None
+            for field, taken in (
+                ("email", taken_emails),
+                ("username", taken_usernames),
+            ):
+                value = change.get(field)
+                if value and taken.get(value, user_id) != user_id:
+                    clash = field
+                    break
+                if value:
+                    # Two items of this request may not claim the same value
+                    taken[value] = user_id
+            if clash:
+                results[index] = BulkItemResult(
+                    index, "conflict", detail=f"User with this {clash} already exists"
+                )
+            else:
+                pending.append((index, change))
+
+        updated: Dict[int, User] = {}
+        for chunk in _chunks(pending):
+            try:
+                async with self.session.begin_nested():
+                    users = await self._update_rows([change for _, change in chunk])
+            except IntegrityError:
+                # A concurrent change took a value checked above: retry the
+                # chunk row by row, each in its own savepoint, so only the
+                # clashing items fail
+                users = []
+                for index, change in chunk:
+                    try:
+                        async with self.session.begin_nested():
+                            users += await self._update_rows([change])
+                    except IntegrityError:
+                        results[index] = BulkItemResult(
+                            index,
+                            "conflict",
+                            detail="User with this email or username already exists",
+                        )
+            updated.update((user.id, user) for user in users)
+        await self.session.commit()
+
+        for index, change in pending:
+            if results[index] is not None:
+                continue
+            user = updated.get(change["id"])
+            if user is not None:
+                results[index] = BulkItemResult(index, "updated", user=user)
+            else:
+                results[index] = BulkItemResult(
+                    index, "not_found", detail=f"User with id {change['id']} not found"
+                )
+        return results
+
+    async def delete_many(self, user_ids: Sequence[int]) -> List[BulkItemResult]:
+        deleted = set()
+        for chunk in _chunks(list(dict.fromkeys(user_ids))):
+            stmt = (
+                delete(UserModel)
+                .where(UserModel.id.in_(chunk))
+                .returning(UserModel.id)
+                .execution_options(synchronize_session=False)
+            )
+            deleted.update(await self.session.scalars(stmt))
+        await self.session.commit()
+
+        return [
+            (
+                BulkItemResult(index, "deleted")
+                if user_id in deleted
+                else BulkItemResult(
+                    index, "not_found", detail=f"User with id {user_id} not found"
+                )
+            )
+            for index, user_id in enumerate(user_ids)
+        ]
+
+    async def stream_rows(
+        self, columns: Sequence[str], batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        # Server-side cursor: only one batch of rows is held in memory
+        stmt = (
+            select(*(getattr(UserModel, column) for column in columns))
+            .order_by(UserModel.id)
+            .execution_options(yield_per=batch_size)
+        )
+        result = await self.session.stream(stmt)
+        async for partition in result.partitions(batch_size):
+            yield partition
+
     async def update(self, user: User) -> User:
         stmt = select(UserModel).where(UserModel.id == user.id)
         result = await self.session.execute(stmt)
@@ -95,6 +361,32 @@ class UserRepositoryImpl(UserRepository):
         await self.session.refresh(model)
         return self._model_to_entity(model)
 
+    async def update_fields(
+        self,
+        user_id: int,
+        fields: Dict[str, Any],
+        if_updated_at: Optional[datetime] = None,
+    ) -> Optional[User]:
+        table = UserModel.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == user_id)
+            .values(**fields, updated_at=func.clock_timestamp())
+            .returning(*table.c)
+        )
+        if if_updated_at is not None:
+            # Compare-and-set: the row only changes if nobody changed it since
+            stmt = stmt.where(table.c.updated_at == if_updated_at)
+        try:
+            row = (await self.session.execute(stmt)).one_or_none()
+            await self.session.commit()
+        except IntegrityError:
+            await self.session.rollback()
+            raise UserAlreadyExistsException(
+                "User with this email or username already exists"
+            )
+        return None if row is None else self._model_to_entity(row)
+
     async def delete(self, user_id: int) -> bool:
         try:
             stmt = select(UserModel).where(UserModel.id == user_id)
@@ -0,0 +1,309 @@
+import asyncio
+import itertools
+import logging
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Literal,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+import orjson
+
+from app.core.exceptions import ServiceOverloadedException
+
+logger = logging.getLogger(__name__)
+
+SlowConsumerPolicy = Literal["drop", "coalesce", "disconnect"]
+ChannelKey = Tuple[str, str]  # (table, event)
+ColumnFilter = Tuple[str, str]  # (column, value)
+
+# Rows are told apart by this column when coalescing
+KEY_COLUMN = "id"
+
+
+def filter_value(value: Any) -> str:
+    """A column value as it is written in a filter: `true`, `42`, `alice`"""
+    return value if isinstance(value, str) else orjson.dumps(value).decode()
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    table: str
+    type: str  # INSERT, UPDATE or DELETE
+    key: Any
+    record: Dict[str, Any]
+    old_record: Dict[str, Any]
+    # Encoded once, then sent as is to every subscriber
+    data: str
+
+
+class Subscriber:
+    """One downstream client: a bounded queue of the changes it asked for.
+
+    When the queue is full, `drop` discards the oldest change, `coalesce`
+    keeps only the latest change of each row still queued (and otherwise
+    drops the oldest), and `disconnect` closes the subscriber, leaving the
+    client to reconnect and catch up.
+    """
+
+    def __init__(
+        self,
+        table: str,
+        event: str,
+        column_filter: Optional[ColumnFilter],
+        queue_size: int,
+        policy: SlowConsumerPolicy,
+    ):
+        self.table = table
+        self.event = event
+        self.column_filter = column_filter
+        self.queue_size = queue_size
+        self.policy = policy
+        self.closed_reason: Optional[str] = None
+        self._queue: "OrderedDict[Any, ChangeEvent]" = OrderedDict()
+        self._sequence = itertools.count()
+        self._ready = asyncio.Event()
+
+    @property
+    def channel_key(self) -> ChannelKey:
+        return (self.table, self.event)
+
+    def offer(self, change: ChangeEvent) -> str:
+        """Queue a change; returns what became of it"""
+        if self.closed_reason is not None:
+            return "closed"
+        if self.policy == "coalesce" and change.key is not None:
+            slot: Any = ("row", change.key)
+            if slot in self._queue:
+                # Keeps its place in the queue, with the latest state
+                self._queue[slot] = change
+                return "coalesced"
+        else:
+            slot = next(self._sequence)
+        outcome = "queued"
+        if len(self._queue) >= self.queue_size:
+            if self.policy == "disconnect":
+                self.close("slow consumer")
+                return "disconnected"
+            self._queue.popitem(last=False)
+            outcome = "dropped"
+        self._queue[slot] = change
+        self._ready.set()
+        return outcome
+
+    def close(self, reason: str) -> None:
+        if self.closed_reason is None:
+            self.closed_reason = reason
+            self._queue.clear()
+            self._ready.set()
+
+    async def __aiter__(self) -> AsyncIterator[ChangeEvent]:
+        """Queued changes as they arrive, until the subscriber is closed"""
+        while self.closed_reason is None:
+            if not self._queue:
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+            yield self._queue.popitem(last=False)[1]
+
+
+class RealtimeHub:
+    """Fans Supabase Realtime changes out to many subscribers in this worker.
+
+    Each table and event has at most one upstream channel, opened with the
+    first subscriber and removed with the last, however many clients listen.
+    Subscribers may filter on a column value; the hub indexes them by that
+    value, so a change costs only the subscribers it is delivered to. Only
+    the `columns` listed for a table are ever sent, or can be filtered on.
+    """
+
+    def __init__(
+        self,
+        get_client: Callable[[], Awaitable[Any]],
+        columns: Dict[str, Sequence[str]],
+        queue_size: int = 256,
+        policy: SlowConsumerPolicy = "coalesce",
+        max_subscribers: int = 10_000,
+    ):
+        self.get_client = get_client
+        self.columns = columns
+        self.queue_size = queue_size
+        self.policy = policy
+        self.max_subscribers = max_subscribers
+        self._channels: Dict[ChannelKey, Any] = {}
+        self._unfiltered: Dict[ChannelKey, Set[Subscriber]] = defaultdict(set)
+        self._filtered: Dict[ChannelKey, Dict[ColumnFilter, Set[Subscriber]]] = (
+            defaultdict(lambda: defaultdict(set))
+        )
+        # How many subscribers filter on each column, per channel
+        self._filter_columns: Dict[ChannelKey, Counter] = defaultdict(Counter)
+        self._subscribers = 0
+        self._lock = asyncio.Lock()
+        self._events = 0
+        self._outcomes: Counter = Counter()
+
+    def _subscribers_of(self, key: ChannelKey) -> int:
+        return len(self._unfiltered[key]) + sum(
+            len(subscribers) for subscribers in self._filtered[key].values()
+        )
+
+    def _add(self, subscriber: Subscriber) -> None:
+        key = subscriber.channel_key
+        if subscriber.column_filter is None:
+            self._unfiltered[key].add(subscriber)
+        else:
+            self._filtered[key][subscriber.column_filter].add(subscriber)
+            self._filter_columns[key][subscriber.column_filter[0]] += 1
+        self._subscribers += 1
+
+    def _remove(self, subscriber: Subscriber) -> bool:
+        key = subscriber.channel_key
+        if subscriber.column_filter is None:
+            found = subscriber in self._unfiltered[key]
+            self._unfiltered[key].discard(subscriber)
+        else:
+            column = subscriber.column_filter[0]
+            matching = self._filtered[key].get(subscriber.column_filter, set())
+            found = subscriber in matching
+            matching.discard(subscriber)
+            if not matching:
+                self._filtered[key].pop(subscriber.column_filter, None)
+            if found:
+                self._filter_columns[key][column] -= 1
+                if not self._filter_columns[key][column]:
+                    del self._filter_columns[key][column]
+        if found:
+            self._subscribers -= 1
+        return found
+
+    async def subscribe(
+        self,
+        table: str,
+        event: str = "*",
+        column_filter: Optional[ColumnFilter] = None,
+        policy: Optional[SlowConsumerPolicy] = None,
+    ) -> Subscriber:
+        if table not in self.columns:
+            raise ValueError(f"Table {table} is not streamed")
+        if column_filter is not None and column_filter[0] not in self.columns[table]:
+            raise ValueError(f"Cannot filter {table} on {column_filter[0]}")
+        if self._subscribers >= self.max_subscribers:
+            raise ServiceOverloadedException("Too many realtime subscribers")
+
+        subscriber = Subscriber(
+            table, event, column_filter, self.queue_size, policy or self.policy
+        )
+        self._add(subscriber)
+        try:
+            async with self._lock:
+                if subscriber.channel_key not in self._channels:
+                    self._channels[subscriber.channel_key] = await self._open_channel(
+                        table, event
+                    )
+        except BaseException:
+            await self.unsubscribe(subscriber)
+            raise
+        return subscriber
+
+    async def unsubscribe(self, subscriber: Subscriber) -> None:
+        subscriber.close("unsubscribed")
+        self._remove(subscriber)
+        key = subscriber.channel_key
+        async with self._lock:
+            if self._subscribers_of(key) or key not in self._channels:
+                return
+            channel = self._channels.pop(key)
+            try:
+                client = await self.get_client()
+                await client.remove_channel(channel)
+            except Exception:
+                logger.exception("Could not remove the realtime channel of %s", key)
+
+    async def _open_channel(self, table: str, event: str) -> Any:
+        client = await self.get_client()
+        channel = client.channel(f"hub:{table}:{event}")
+        channel.on_postgres_changes(
+            event=event,
+            schema="public",
+            table=table,
+            callback=lambda payload: self.publish(table, event, payload),
+        )
+        await channel.subscribe()
+        return channel
+
+    def _change(self, table: str, payload: Dict[str, Any]) -> ChangeEvent:
+        data = payload.get("data", payload)
+        columns = self.columns[table]
+        record = {c: v for c, v in (data.get("record") or {}).items() if c in columns}
+        old_record = {
+            c: v for c, v in (data.get("old_record") or {}).items() if c in columns
+        }
+        change_type = data.get("type") or data.get("eventType") or ""
+        return ChangeEvent(
+            table=table,
+            type=change_type,
+            key=record.get(KEY_COLUMN, old_record.get(KEY_COLUMN)),
+            record=record,
+            old_record=old_record,
+            data=orjson.dumps(
+                {
+                    "type": change_type,
+                    "table": table,
+                    "record": record,
+                    "old_record": old_record,
+                    "commit_timestamp": data.get("commit_timestamp"),
+                }
+            ).decode(),
+        )
+
+    def publish(self, table: str, event: str, payload: Dict[str, Any]) -> None:
+        """Deliver an upstream change to the matching subscribers"""
+        key = (table, event)
+        change = self._change(table, payload)
+        self._events += 1
+
+        targets = set(self._unfiltered[key])
+        filtered = self._filtered[key]
+        for column in self._filter_columns[key]:
+            # A row moving out of a filter is still news to its subscribers
+            for row in (change.record, change.old_record):
+                if column in row:
+                    targets |= filtered.get((column, filter_value(row[column])), set())
+
+        for subscriber in targets:
+            outcome = subscriber.offer(change)
+            self._outcomes[outcome] += 1
+            if outcome == "disconnected":
+                self._remove(subscriber)
+
+    async def close(self) -> None:
+        """Disconnect every subscriber and remove the upstream channels"""
+        subscribers = [s for group in self._unfiltered.values() for s in group] + [
+            s
+            for groups in self._filtered.values()
+            for group in groups.values()
+            for s in group
+        ]
+        for subscriber in subscribers:
+            subscriber.close("shutting down")
+            await self.unsubscribe(subscriber)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channels": len(self._channels),
+            "subscribers": self._subscribers,
+            "events": self._events,
+            "queued": self._outcomes["queued"],
+            "coalesced": self._outcomes["coalesced"],
+            "dropped": self._outcomes["dropped"],
+            "disconnected": self._outcomes["disconnected"],
+        }
@@ -1,65 +1,93 @@
-from typing import Callable, Dict, Any
-from supabase import Client
-import asyncio
+import logging
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from supabase import AsyncClient
+
+from app.core.config import settings
+from app.core.dispatcher import Dispatcher
+
+logger = logging.getLogger(__name__)
+
+
+def change_key(payload: Dict[str, Any]) -> Optional[Hashable]:
+    """The table and primary key of the row a `postgres_changes` event is about"""
+    data = payload.get("data", payload)
+    record = data.get("record") or data.get("old_record") or {}
+    if record.get("id") is None:
+        return None
+    return (data.get("table"), record["id"])
 
 
 class SupabaseRealtimeService:
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: AsyncClient):
         self.supabase = supabase
         self.subscriptions: Dict[str, Any] = {}
+        self.dispatchers: Dict[str, Dispatcher] = {}
 
     async def subscribe_to_table(
         self,
         table: str,
         event: str = "*",
         callback: Callable[[Dict[str, Any]], None] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: float = 0.0,
+        coalesce: bool = False,
     ):
-        """Subscribe to real-time changes on a table"""
+        """Subscribe to real-time changes on a table.
+
+        Events are queued and run through `callback` by a fixed pool of
+        workers (see Dispatcher). With `batch_size`, the callback receives a
+        list of events. With `coalesce`, an event replaces the one queued for
+        the same row, so only the latest state of a row is delivered.
+        """
+        key = f"{table}_{event}"
+        dispatcher: Dispatcher[Dict[str, Any]] = Dispatcher(
+            callback or self._log_change,
+            name=key,
+            workers=settings.REALTIME_DISPATCH_WORKERS,
+            queue_size=settings.REALTIME_DISPATCH_QUEUE_SIZE,
+            overflow=settings.REALTIME_DISPATCH_OVERFLOW,
+            batch_size=batch_size,
+            flush_interval=flush_interval,
+            coalesce_key=change_key if coalesce else None,
+        )
         try:
             channel = self.supabase.channel(f"{table}_changes")
-
-            def handle_change(payload):
-                if callback:
-                    asyncio.create_task(self._async_callback(callback, payload))
-                else:
-                    print(f"Real-time event on {table}: {payload}")
-
             channel.on_postgres_changes(
-                event=event, schema="public", table=table, callback=handle_change
+                event=event, schema="public", table=table, callback=dispatcher.submit
             )
 
-            channel.subscribe()
-            self.subscriptions[f"{table}_{event}"] = channel
+            await channel.subscribe()
+            self.subscriptions[key] = channel
+            self.dispatchers[key] = dispatcher
 
             return channel
 
-        except Exception as e:
-            print(f"Failed to subscribe to {table}: {str(e)}")
+        except Exception:
+            logger.exception("Failed to subscribe to %s", table)
+            await dispatcher.close()
             return None
 
-    async def _async_callback(self, callback: Callable, payload: Dict[str, Any]):
-        """Wrapper to handle async callbacks"""
-        try:
-            if asyncio.iscoroutinefunction(callback):
-                await callback(payload)
-            else:
-                callback(payload)
-        except Exception as e:
-            print(f"Callback error: {str(e)}")
+    @staticmethod
+    def _log_change(payload: Any) -> None:
+        logger.info("Real-time event: %s", payload)
 
-    def unsubscribe(self, subscription_key: str):
+    async def unsubscribe(self, subscription_key: str):
         """Unsubscribe from real-time updates"""
         if subscription_key in self.subscriptions:
             try:
-                self.subscriptions[subscription_key].unsubscribe()
+                channel = self.subscriptions[subscription_key]
+                await self.supabase.remove_channel(channel)
                 del self.subscriptions[subscription_key]
-                return True
-            except Exception as e:
-                print(f"Failed to unsubscribe: {str(e)}")
+            except Exception:
+                logger.exception("Failed to unsubscribe %s", subscription_key)
                 return False
+            # Runs the events already queued, for a moment
+            await self.dispatchers.pop(subscription_key).close()
+            return True
         return False
 
-    def unsubscribe_all(self):
+    async def unsubscribe_all(self):
         """Unsubscribe from all real-time updates"""
         for key in list(self.subscriptions.keys()):
-            self.unsubscribe(key)
+            await self.unsubscribe(key)
@@ -1,11 +1,56 @@
-from typing import List, Optional, Dict, Any
-from supabase import Client
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from supabase import AsyncClient
+from app.core.exceptions import (
+    DeadlineExceededException,
+    UpstreamUnavailableException,
+    UserAlreadyExistsException,
+)
+from app.domain.entities.bulk import (
+    BulkItemResult,
+    split_duplicate_ids,
+    split_duplicates,
+)
 from app.domain.entities.user import User
 from app.domain.repositories.user_repository import UserRepository
 
+# Rows per bulk insert, and values per `in.(...)` filter (kept short for the URL)
+BULK_INSERT_CHUNK_SIZE = 1000
+BULK_FILTER_CHUNK_SIZE = 200
+# PostgREST has no multi-row UPDATE with per-row values
+BULK_UPDATE_CONCURRENCY = 20
+
+
+# PostgreSQL unique_violation, which PostgREST answers with 409
+UNIQUE_VIOLATION = "23505"
+
+
+def _is_conflict(error: Exception) -> bool:
+    return getattr(error, "code", None) == UNIQUE_VIOLATION
+
+
+def _failed(index: int, error: Exception) -> BulkItemResult:
+    """Per-item report of a write that raised, so the rest of the batch,
+    partly committed already, is still reported"""
+    if _is_conflict(error):
+        return BulkItemResult(
+            index, "conflict", detail="User with this email or username already exists"
+        )
+    return BulkItemResult(index, "error", detail=str(error) or type(error).__name__)
+
+
+def _chunks(items: Sequence[Any], size: int) -> List[Sequence[Any]]:
+    return [items[start : start + size] for start in range(0, len(items), size)]
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    """PostgREST returns timestamps as ISO 8601 strings"""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
 
 class SupabaseUserRepository(UserRepository):
-    def __init__(self, supabase: Client):
+    def __init__(self, supabase: AsyncClient):
         self.supabase = supabase
         self.table_name = "users"
 
@@ -17,8 +62,8 @@ class SupabaseUserRepository(UserRepository):
             email=data.get("email"),
             hashed_password=data.get("hashed_password", ""),
             is_active=data.get("is_active", True),
-            created_at=data.get("created_at"),
-            updated_at=data.get("updated_at"),
+            created_at=_timestamp(data.get("created_at")),
+            updated_at=_timestamp(data.get("updated_at")),
         )
 
     def _entity_to_dict(self, user: User) -> Dict[str, Any]:
@@ -43,19 +88,21 @@ class SupabaseUserRepository(UserRepository):
         """Create user in Supabase"""
         try:
             data = self._entity_to_dict(user)
-            response = self.supabase.table(self.table_name).insert(data).execute()
+            response = await self.supabase.table(self.table_name).insert(data).execute()
 
             if response.data:
                 return self._dict_to_entity(response.data[0])
             else:
                 raise Exception("Failed to create user")
+        except (DeadlineExceededException, UpstreamUnavailableException):
+            raise
         except Exception as e:
             raise Exception(f"Database error: {str(e)}")
 
     async def get_by_id(self, user_id: int) -> Optional[User]:
         """Get user by ID"""
         try:
-            response = (
+            response = await (
                 self.supabase.table(self.table_name)
                 .select("*")
                 .eq("id", user_id)
@@ -65,13 +112,15 @@ class SupabaseUserRepository(UserRepository):
             if response.data:
                 return self._dict_to_entity(response.data[0])
             return None
+        except (DeadlineExceededException, UpstreamUnavailableException):
+            raise
         except Exception:
             return None
 
     async def get_by_username(self, username: str) -> Optional[User]:
         """Get user by username"""
         try:
-            response = (
+            response = await (
                 self.supabase.table(self.table_name)
                 .select("*")
                 .eq("username", username)
@@ -81,13 +130,29 @@ class SupabaseUserRepository(UserRepository):
             if response.data:
                 return self._dict_to_entity(response.data[0])
             return None
+        except (DeadlineExceededException, UpstreamUnavailableException):
+            raise
         except Exception:
             return None
 
+    async def get_version(
+        self, field: str, value: Any
+    ) -> Optional[Tuple[int, datetime]]:
+        """Get the id and updated_at of a user"""
+        response = await (
+            self.supabase.table(self.table_name)
+            .select("id,updated_at")
+            .eq(field, value)
+            .execute()
+        )
+        if not response.data:
+            return None
+        return response.data[0]["id"], _timestamp(response.data[0]["updated_at"])
+
     async def get_by_email(self, email: str) -> Optional[User]:
         """Get user by email"""
         try:
-            response = (
+            response = await (
                 self.supabase.table(self.table_name)
                 .select("*")
                 .eq("email", email)
@@ -97,28 +162,280 @@ class SupabaseUserRepository(UserRepository):
             if response.data:
                 return self._dict_to_entity(response.data[0])
             return None
+        except (DeadlineExceededException, UpstreamUnavailableException):
+            raise
         except Exception:
             return None
 
+    async def _get_many(self, field: str, values: Sequence[Any]) -> List[User]:
+        responses = await asyncio.gather(
+            *(
+                self.supabase.table(self.table_name)
+                .select("*")
+                .in_(field, list(chunk))
+                .execute()
+                for chunk in _chunks(values, BULK_FILTER_CHUNK_SIZE)
+            )
+        )
+        return [
+            self._dict_to_entity(item)
+            for response in responses
+            for item in response.data
+        ]
+
+    async def get_many_by_ids(self, user_ids: Sequence[int]) -> List[User]:
+        """Get users by ID, with one `id=in.(...)` request per chunk"""
+        return await self._get_many("id", user_ids)
+
+    async def get_many_by_emails(self, emails: Sequence[str]) -> List[User]:
+        """Get users by email, with one `email=in.(...)` request per chunk"""
+        return await self._get_many("email", emails)
+
     async def get_all(self, skip: int = 0, limit: int = 100) -> List[User]:
         """Get all users with pagination"""
         try:
-            response = (
+            response = await (
                 self.supabase.table(self.table_name)
                 .select("*")
+                .order("id")
                 .range(skip, skip + limit - 1)
                 .execute()
             )
 
             return [self._dict_to_entity(item) for item in response.data]
+        except (DeadlineExceededException, UpstreamUnavailableException):
+            raise
         except Exception:
             return []
 
+    async def get_page(
+        self, after_id: Optional[int] = None, limit: int = 100
+    ) -> List[User]:
+        """Get users after a given id (keyset pagination)"""
+        try:
+            query = self.supabase.table(self.table_name).select("*")
+            if after_id is not None:
+                query = query.gt("id", after_id)
+            response = await query.order("id").limit(limit).execute()
+
+            return [self._dict_to_entity(item) for item in response.data]
+        except (DeadlineExceededException, UpstreamUnavailableException):
+            raise
+        except Exception:
+            return []
+
+    async def _find_taken(
+        self, emails: Sequence[str], usernames: Sequence[str]
+    ) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """Owners (user ids) of the given emails and usernames"""
+        queries = [
+            self.supabase.table(self.table_name)
+            .select("id,email,username")
+            .in_(field, list(chunk))
+            .execute()
+            for field, wanted in (("email", emails), ("username", usernames))
+            for chunk in _chunks(wanted, BULK_FILTER_CHUNK_SIZE)
+        ]
+        taken_emails, taken_usernames = {}, {}
+        for response in await asyncio.gather(*queries):
+            for item in response.data:
+                taken_emails[item["email"]] = item["id"]
+                taken_usernames[item["username"]] = item["id"]
+        return taken_emails, taken_usernames
+
+    async def create_many(self, users: Sequence[User]) -> List[BulkItemResult]:
+        """Create users with one multi-row insert per chunk"""
+        results, pending = split_duplicates(users)
+        taken_emails, taken_usernames = await self._find_taken(
+            [user.email for _, user in pending],
+            [user.username for _, user in pending],
+        )
+        insertable = []
+        for index, user in pending:
+            if user.email in taken_emails or user.username in taken_usernames:
+                field = "email" if user.email in taken_emails else "username"
+                results[index] = BulkItemResult(
+                    index, "conflict", detail=f"User with this {field} already exists"
+                )
+            else:
+                insertable.append((index, user))
+
+        for chunk in _chunks(insertable, BULK_INSERT_CHUNK_SIZE):
+            rows = []
+            for _, user in chunk:
+                data = self._entity_to_dict(user)
+                # Let the database set the timestamps
+                data.pop("created_at", None)
+                data.pop("updated_at", None)
+                rows.append(data)
+            try:
+                response = (
+                    await self.supabase.table(self.table_name).insert(rows).execute()
+                )
+            except Exception as e:
+                if not _is_conflict(e):
+                    for index, _ in chunk:
+                        results[index] = _failed(index, e)
+                    continue
+                # A concurrent signup took a value since _find_taken: insert the
+                # chunk row by row to tell which items conflict
+                await self._insert_each(chunk, rows, results)
+                continue
+            # PostgREST returns the inserted rows in the order they were sent
+            for (index, _), row in zip(chunk, response.data):
+                results[index] = BulkItemResult(
+                    index, "created", user=self._dict_to_entity(row)
+                )
+        return results
+
+    async def _insert_each(
+        self,
+        chunk: Sequence[Tuple[int, User]],
+        rows: List[Dict[str, Any]],
+        results: List[Optional[BulkItemResult]],
+    ) -> None:
+        semaphore = asyncio.Semaphore(BULK_UPDATE_CONCURRENCY)
+
+        async def insert(index: int, row: Dict[str, Any]) -> None:
+            try:
+                async with semaphore:
+                    response = (
+                        await self.supabase.table(self.table_name).insert(row).execute()
+                    )
+            except Exception as e:
+                results[index] = _failed(index, e)
+                return
+            results[index] = BulkItemResult(
+                index, "created", user=self._dict_to_entity(response.data[0])
+            )
+
+        await asyncio.gather(
+            *(insert(index, row) for (index, _), row in zip(chunk, rows))
+        )
+
+    async def update_many(
+        self, changes: Sequence[Dict[str, Any]]
+    ) -> List[BulkItemResult]:
+        """Apply partial updates concurrently, a bounded number at a time"""
+        results, candidates = split_duplicate_ids(changes)
+        taken_emails, taken_usernames = await self._find_taken(
+            [change["email"] for _, change in candidates if change.get("email")],
+            [change["username"] for _, change in candidates if change.get("username")],
+        )
+        semaphore = asyncio.Semaphore(BULK_UPDATE_CONCURRENCY)
+
+        async def apply(index: int, change: Dict[str, Any]) -> None:
+            data = {
+                field: value
+                for field, value in change.items()
+                if field != "id" and value is not None
+            }
+            try:
+                async with semaphore:
+                    response = await (
+                        self.supabase.table(self.table_name)
+                        .update(data)
+                        .eq("id", change["id"])
+                        .execute()
+                    )
+            except Exception as e:
+                # The other updates, some committed already, are still reported
+                results[index] = _failed(index, e)
+                return
+            if response.data:
+                user = self._dict_to_entity(response.data[0])
+                results[index] = BulkItemResult(index, "updated", user=user)
+            else:
+                results[index] = BulkItemResult(
+                    index, "not_found", detail=f"User with id {change['id']} not found"
+                )
+
+        updates = []
+        for index, change in candidates:
+            user_id = change["id"]
+            clash = None
+            for field, taken in (
+                ("email", taken_emails),
+                ("username", taken_usernames),
+            ):
+                value = change.get(field)
+                if value and taken.get(value, user_id) != user_id:
+                    clash = field
+                    break
+                if value:
+                    # Two items of this request may not claim the same value
+                    taken[value] = user_id
+            if clash:
+                results[index] = BulkItemResult(
+                    index, "conflict", detail=f"User with this {clash} already exists"
+                )
+            else:
+                updates.append(apply(index, change))
+        await asyncio.gather(*updates)
+        return results
+
+    async def delete_many(self, user_ids: Sequence[int]) -> List[BulkItemResult]:
+        """Delete users with one `id=in.(...)` request per chunk"""
+        unique_ids = list(dict.fromkeys(user_ids))
+        deleted = set()
+        failed: Dict[int, Exception] = {}
+
+        async def delete(chunk: Sequence[int]) -> None:
+            try:
+                response = await (
+                    self.supabase.table(self.table_name)
+                    .delete()
+                    .in_("id", list(chunk))
+                    .execute()
+                )
+            except Exception as e:
+                failed.update(dict.fromkeys(chunk, e))
+                return
+            deleted.update(item["id"] for item in response.data)
+
+        await asyncio.gather(
+            *(delete(chunk) for chunk in _chunks(unique_ids, BULK_FILTER_CHUNK_SIZE))
+        )
+        return [
+            (
+                BulkItemResult(index, "deleted")
+                if user_id in deleted
+                else (
+                    _failed(index, failed[user_id])
+                    if user_id in failed
+                    else BulkItemResult(
+                        index, "not_found", detail=f"User with id {user_id} not found"
+                    )
+                )
+            )
+            for index, user_id in enumerate(user_ids)
+        ]
+
+    async def stream_rows(
+        self, columns: Sequence[str], batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[Any, ...]]]:
+        """Stream users in keyset-paginated batches"""
+        select_columns = ",".join(dict.fromkeys(["id", *columns]))
+        after_id = None
+        while True:
+            query = self.supabase.table(self.table_name).select(select_columns)
+            if after_id is not None:
+                query = query.gt("id", after_id)
+            response = await query.order("id").limit(batch_size).execute()
+            if not response.data:
+                return
+            yield [
+                tuple(item.get(column) for column in columns) for item in response.data
+            ]
+            if len(response.data) < batch_size:
+                return
+            after_id = response.data[-1]["id"]
+
     async def update(self, user: User) -> User:
         """Update user"""
         try:
             data = self._entity_to_dict(user)
-            response = (
+            response = await (
                 self.supabase.table(self.table_name)
                 .update(data)
                 .eq("id", user.id)
@@ -129,13 +446,37 @@ class SupabaseUserRepository(UserRepository):
                 return self._dict_to_entity(response.data[0])
             else:
                 raise Exception("Failed to update user")
+        except (DeadlineExceededException, UpstreamUnavailableException):
+            raise
         except Exception as e:
             raise Exception(f"Database error: {str(e)}")
 
+    async def update_fields(
+        self,
+        user_id: int,
+        fields: Dict[str, Any],
+        if_updated_at: Optional[datetime] = None,
+    ) -> Optional[User]:
+        """Update some fields of a user, if unchanged since `if_updated_at`"""
+        # PostgREST cannot set now(), so the API's clock stands in for it
+        data = {**fields, "updated_at": datetime.now(timezone.utc).isoformat()}
+        query = self.supabase.table(self.table_name).update(data).eq("id", user_id)
+        if if_updated_at is not None:
+            query = query.eq("updated_at", if_updated_at.isoformat())
+        try:
+            response = await query.execute()
+        except Exception as e:
+            if not _is_conflict(e):
+                raise
+            raise UserAlreadyExistsException(
+                f"Update failed, the email or username is taken: {str(e)}"
+            ) from e
+        return self._dict_to_entity(response.data[0]) if response.data else None
+
     async def delete(self, user_id: int) -> bool:
         """Delete user"""
         try:
-            response = (
+            response = await (
                 self.supabase.table(self.table_name)
                 .delete()
                 .eq("id", user_id)
@@ -143,5 +484,7 @@ class SupabaseUserRepository(UserRepository):
             )
 
             return len(response.data) > 0
+        except (DeadlineExceededException, UpstreamUnavailableException):
+            raise
         except Exception:
             return False
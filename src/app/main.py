@@ -1,9 +1,165 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
+from app.core.auth import (
+    clear_auth_caches,
+    get_auth_stats,
+    invalidate_verified_tokens,
+)
 from app.core.config import settings
+from app.core.dispatcher import get_dispatcher_stats
 from app.core.exceptions import add_exception_handlers
+from app.core.invalidation import invalidation_bus
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import registry
+from app.core.security import password_hasher
+from app.core.supabase import (
+    close_supabase_clients,
+    get_supabase_call_stats,
+    get_supabase_pool_stats,
+    init_supabase_clients,
+)
+from app.core.watchdog import loop_watchdog
+from app.infrastructure.repositories.cached_user_repository import (
+    get_user_cache_stats,
+    subscribe_user_cache_invalidation,
+    user_cache,
+)
+from app.infrastructure.repositories.singleflight_user_repository import (
+    get_user_lookup_stats,
+)
+from app.presentation.api.dependencies import realtime_hub
 from app.presentation.api.v1.router import api_router
+from app.presentation.middleware.admission import (
+    AdmissionMiddleware,
+    get_rate_limit_stats,
+)
+from app.presentation.middleware.deadline import DeadlineMiddleware
+from app.presentation.middleware.metrics import MetricsMiddleware
+from app.presentation.middleware.profiling import ProfilingMiddleware
+from app.presentation.middleware.watchdog import LoopWatchdogMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The bcrypt cost is calibrated in the background
+    await password_hasher.start()
+    # Load shedding reads the event loop lag it measures
+    loop_monitor.start()
+    if settings.USER_REPOSITORY_BACKEND == "sqlalchemy":
+        from app.infrastructure.database.connection import warm_up_pool
+
+        # Connect now so the first requests after a deploy don't pay for it, but
+        # don't hold up startup for long when the database is unreachable
+        await warm_up_pool(
+            (
+                settings.DB_POOL_WARMUP_CONNECTIONS
+                if settings.DB_POOL_WARMUP_CONNECTIONS is not None
+                else settings.DB_POOL_SIZE
+            ),
+            settings.DB_POOL_WARMUP_TIMEOUT_SECONDS,
+        )
+    realtime_invalidation = (
+        settings.USER_CACHE_ENABLED
+        and settings.USER_CACHE_REALTIME_INVALIDATION
+        and not settings.CACHE_INVALIDATION_BUS_ENABLED
+        and settings.USER_REPOSITORY_BACKEND != "memory"
+    )
+    if settings.USER_REPOSITORY_BACKEND == "supabase" or realtime_invalidation:
+        # Needed right away, and building them blocks the event loop; otherwise
+        # they are created on first use, by the auth endpoints
+        await init_supabase_clients()
+    invalidation = None
+    if realtime_invalidation:
+        # Connecting to Realtime retries with backoff, so don't hold up startup
+        invalidation = asyncio.create_task(subscribe_user_cache_invalidation())
+    if settings.CACHE_INVALIDATION_BUS_ENABLED:
+        _subscribe_cache_invalidation()
+        # Connects in the background, flushing the caches once listening
+        invalidation_bus.start()
+    # Built once here rather than by the first request for the docs
+    app.openapi()
+    if settings.LOOP_WATCHDOG_ENABLED:
+        # Started last: startup is allowed to block
+        loop_watchdog.start()
+    try:
+        yield
+    finally:
+        if invalidation is not None:
+            invalidation.cancel()
+        await invalidation_bus.stop()
+        loop_watchdog.stop()
+        await realtime_hub.close()
+        password_hasher.shutdown()
+        loop_monitor.stop()
+        await close_supabase_clients()
+        if settings.USER_REPOSITORY_BACKEND == "sqlalchemy":
+            from app.infrastructure.database.connection import engine
+
+            await engine.dispose()
+
+
+def _get_db_pool_stats() -> Dict[str, Any]:
+    from app.infrastructure.database.connection import get_db_pool_stats
+
+    return get_db_pool_stats()
+
+
+def _subscribe_cache_invalidation() -> None:
+    """Subscribe the caches of this worker to the invalidation bus"""
+    if settings.USER_CACHE_ENABLED and settings.USER_REPOSITORY_BACKEND != "memory":
+        invalidation_bus.subscribe(
+            "users", user_cache.invalidate_keys, user_cache.clear
+        )
+    invalidation_bus.subscribe("auth", invalidate_verified_tokens, clear_auth_caches)
+
+
+def _register_stats_sources() -> None:
+    """Expose the stats of the pools and caches on /metrics"""
+    if settings.USER_REPOSITORY_BACKEND == "sqlalchemy":
+        registry.add_stats_source("db_pool", lambda: [({}, _get_db_pool_stats())])
+    registry.add_stats_source(
+        "supabase_pool",
+        lambda: [
+            ({"role": role, "api": api}, stats)
+            for role, apis in get_supabase_pool_stats().items()
+            for api, stats in apis.items()
+        ],
+    )
+    registry.add_stats_source("supabase_calls", get_supabase_call_stats)
+    registry.add_stats_source("user_cache", lambda: [({}, get_user_cache_stats())])
+    if settings.CACHE_INVALIDATION_BUS_ENABLED:
+        registry.add_stats_source(
+            "cache_invalidation", lambda: [({}, invalidation_bus.stats())]
+        )
+    registry.add_stats_source("realtime_hub", lambda: [({}, realtime_hub.stats())])
+    registry.add_stats_source("dispatcher", get_dispatcher_stats)
+    registry.add_stats_source("event_loop", lambda: [({}, loop_monitor.stats())])
+    registry.add_stats_source("rate_limit", get_rate_limit_stats)
+    registry.add_stats_source("user_lookups", lambda: [({}, get_user_lookup_stats())])
+    registry.add_stats_source(
+        "auth_token_cache", lambda: [({}, get_auth_stats()["token_cache"])]
+    )
+    registry.add_stats_source(
+        "auth",
+        lambda: [
+            ({"method": method}, {"verifications": count})
+            for method, count in get_auth_stats()["verifications"].items()
+        ],
+    )
+    registry.add_stats_source(
+        "password_hasher",
+        lambda: [({}, password_hasher.stats())]
+        + [
+            ({"operation": operation}, stats)
+            for operation, stats in password_hasher.stats()["operations"].items()
+        ],
+    )
 
 
 def create_app() -> FastAPI:
@@ -12,6 +168,7 @@ def create_app() -> FastAPI:
         description="A FastAPI application following clean architecture principles",
         version="1.0.0",
         debug=settings.DEBUG,
+        lifespan=lifespan,
     )
 
     # Set up CORS
@@ -23,6 +180,19 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    # Innermost, so admission control and profiling are not part of the budget
+    app.add_middleware(DeadlineMiddleware)
+    if settings.LOOP_WATCHDOG_ENABLED:
+        app.add_middleware(LoopWatchdogMiddleware)
+    if settings.PROFILER_ENABLED:
+        app.add_middleware(ProfilingMiddleware)
+    if settings.RATE_LIMIT_ENABLED or settings.LOAD_SHED_ENABLED:
+        # Outside the profiler, so rejected requests cost as little as possible
+        app.add_middleware(AdmissionMiddleware)
+    if settings.METRICS_ENABLED:
+        # Added last so it is outermost and sees every request
+        app.add_middleware(MetricsMiddleware)
+
     # Add exception handlers
     add_exception_handlers(app)
 
@@ -37,9 +207,20 @@ def create_app() -> FastAPI:
     async def health_check():
         return {"status": "healthy"}
 
+    if settings.METRICS_ENABLED:
+
+        @app.get("/metrics", include_in_schema=False)
+        async def metrics():
+            return PlainTextResponse(
+                registry.render(), media_type="text/plain; version=0.0.4"
+            )
+
     return app
 
 
+if settings.METRICS_ENABLED:
+    _register_stats_sources()
+
 app = create_app()
 
 if __name__ == "__main__":
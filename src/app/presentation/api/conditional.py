@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException, Request, status
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def _utc(moment: datetime) -> datetime:
+    # Naive timestamps are UTC, as the database stores them
+    if moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def _tags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",")]
+
+
+def make_etag(user_id: int, updated_at: datetime) -> str:
+    """Strong ETag of a user version: its id and updated_at in microseconds,
+    which If-Match turns back into the updated_at to compare and set"""
+    return f'"{user_id}-{(_utc(updated_at) - EPOCH) // MICROSECOND}"'
+
+
+def version_headers(user_id: int, updated_at: datetime) -> Dict[str, str]:
+    return {
+        "ETag": make_etag(user_id, updated_at),
+        "Last-Modified": format_datetime(_utc(updated_at), usegmt=True),
+        # Caches must revalidate, which the ETag makes cheap, rather than guess
+        # a freshness lifetime from Last-Modified
+        "Cache-Control": "no-cache",
+    }
+
+
+def has_conditions(request: Request) -> bool:
+    """Whether a GET carries If-None-Match or If-Modified-Since"""
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, user_id: int, updated_at: datetime) -> bool:
+    """Whether a GET can be answered with 304 (RFC 9110, section 13.2.2)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        etag = make_etag(user_id, updated_at)
+        # Weak comparison, as for every GET
+        return any(
+            tag == "*" or tag.removeprefix("W/") == etag for tag in _tags(if_none_match)
+        )
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            # Invalid dates are ignored
+            return False
+        # Last-Modified only has a resolution of seconds
+        return _utc(updated_at).replace(microsecond=0) <= _utc(since)
+    return False
+
+
+def if_match_updated_at(request: Request, user_id: int) -> Optional[datetime]:
+    """The updated_at a write's If-Match requires the user to still have;
+    None when the request has no such condition"""
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    prefix = f'"{user_id}-'
+    for tag in _tags(if_match):
+        # Strong comparison: weak tags never match
+        if tag.startswith(prefix) and tag.endswith('"'):
+            try:
+                return EPOCH + int(tag[len(prefix) : -1]) * MICROSECOND
+            except ValueError:
+                continue
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="If-Match does not match this user",
+    )
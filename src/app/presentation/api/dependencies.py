@@ -1,34 +1,166 @@
+from contextlib import asynccontextmanager
+from typing import (
+    TYPE_CHECKING,
+    AsyncContextManager,
+    AsyncIterator,
+    Callable,
+    Optional,
+)
+
 from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from supabase import Client
 
+from app.core.config import settings
 from app.core.dependencies import get_db
-from app.core.supabase import get_supabase_client
+from app.core.supabase import get_supabase_admin_client, get_supabase_client
+from app.domain.repositories.user_repository import UserRepository
 from app.domain.services.user_service import UserService
-from app.infrastructure.repositories.user_repository_impl import UserRepositoryImpl
+from app.infrastructure.repositories.batching_user_repository import (
+    BatchingUserRepository,
+)
+from app.infrastructure.repositories.cached_user_repository import (
+    CachedUserRepository,
+)
+from app.infrastructure.repositories.memory_user_repository import (
+    memory_user_repository,
+)
+from app.infrastructure.repositories.singleflight_user_repository import (
+    SingleFlightUserRepository,
+)
+from app.infrastructure.supabase.realtime_hub import RealtimeHub
+
+# Backend-specific modules are imported where used, so a worker only loads
+# SQLAlchemy or the Supabase client when its backend needs them
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from supabase import AsyncClient
+
+
+@asynccontextmanager
+async def sqlalchemy_user_repository_scope() -> AsyncIterator[UserRepository]:
+    """UserRepositoryImpl with its own session"""
+    from app.infrastructure.database.connection import async_session_maker
+    from app.infrastructure.repositories.user_repository_impl import (
+        UserRepositoryImpl,
+    )
+
+    async with async_session_maker() as session:
+        yield UserRepositoryImpl(session)
+
+
+@asynccontextmanager
+async def user_repository_scope() -> AsyncIterator[UserRepository]:
+    """The configured backend's repository, outside the request dependencies"""
+    if settings.USER_REPOSITORY_BACKEND == "sqlalchemy":
+        async with sqlalchemy_user_repository_scope() as user_repository:
+            yield user_repository
+    elif settings.USER_REPOSITORY_BACKEND == "supabase":
+        from app.infrastructure.supabase.supabase_repository import (
+            SupabaseUserRepository,
+        )
+
+        yield SupabaseUserRepository(await get_supabase_client())
+    else:
+        yield memory_user_repository
+
+
+def _wrap(
+    user_repository: UserRepository,
+    reader_scope: Optional[Callable[[], AsyncContextManager[UserRepository]]] = None,
+) -> UserRepository:
+    """Add single-flight and batched lookups and the user cache, as configured"""
+    if settings.USER_SINGLE_FLIGHT_ENABLED:
+        user_repository = SingleFlightUserRepository(user_repository, reader_scope)
+    if settings.USER_BATCH_LOOKUPS_ENABLED:
+        user_repository = BatchingUserRepository(user_repository)
+    if settings.USER_CACHE_ENABLED:
+        user_repository = CachedUserRepository(user_repository)
+    return user_repository
+
+
+def get_sqlalchemy_user_repository(
+    db: "AsyncSession" = Depends(get_db),
+) -> UserRepository:
+    from app.infrastructure.repositories.user_repository_impl import (
+        UserRepositoryImpl,
+    )
+
+    return _wrap(UserRepositoryImpl(db), sqlalchemy_user_repository_scope)
+
+
+def get_supabase_user_repository(
+    supabase: "AsyncClient" = Depends(get_supabase_client),
+) -> UserRepository:
+    from app.infrastructure.supabase.supabase_repository import SupabaseUserRepository
+
+    return _wrap(SupabaseUserRepository(supabase))
 
 
-def get_user_service(db: AsyncSession = Depends(get_db)) -> UserService:
-    user_repository = UserRepositoryImpl(db)
+def get_memory_user_repository() -> UserRepository:
+    return _wrap(memory_user_repository)
+
+
+USER_REPOSITORY_BACKENDS = {
+    "sqlalchemy": get_sqlalchemy_user_repository,
+    "supabase": get_supabase_user_repository,
+    "memory": get_memory_user_repository,
+}
+
+# Chosen once, so FastAPI only resolves the dependencies of the backend in use
+get_user_repository = USER_REPOSITORY_BACKENDS[settings.USER_REPOSITORY_BACKEND]
+
+
+def get_user_service(
+    user_repository: UserRepository = Depends(get_user_repository),
+) -> UserService:
     return UserService(user_repository)
 
 
+@asynccontextmanager
+async def user_service_scope() -> AsyncIterator[UserService]:
+    """UserService with its own session, for work that outlives the request
+    dependencies, such as a streaming response body"""
+    async with user_repository_scope() as user_repository:
+        yield UserService(user_repository)
+
+
+def get_user_service_scope() -> Callable[[], AsyncContextManager[UserService]]:
+    return user_service_scope
+
+
 def get_supabase_user_service(
-    supabase: Client = Depends(get_supabase_client),
+    user_repository: UserRepository = Depends(get_supabase_user_repository),
 ) -> UserService:
-    from app.infrastructure.supabase.supabase_repository import SupabaseUserRepository
-
-    user_repository = SupabaseUserRepository(supabase)
     return UserService(user_repository)
 
 
-def get_supabase_auth_service(supabase: Client = Depends(get_supabase_client)):
+def get_supabase_auth_service(supabase: "AsyncClient" = Depends(get_supabase_client)):
     from app.domain.services.auth_service import SupabaseAuthService
 
     return SupabaseAuthService(supabase)
 
 
-def get_realtime_service(supabase: Client = Depends(get_supabase_client)):
+def get_realtime_service(supabase: "AsyncClient" = Depends(get_supabase_client)):
     from app.infrastructure.supabase.realtime_service import SupabaseRealtimeService
 
     return SupabaseRealtimeService(supabase)
+
+
+# Columns streamed to realtime clients, and the only ones they may filter on
+REALTIME_TABLES = {
+    "users": ("id", "username", "email", "is_active", "created_at", "updated_at"),
+}
+# The column of a streamed table holding the email of the user a row belongs
+# to: apart from the service role, users may only stream their own rows
+REALTIME_OWNER_COLUMNS = {"users": "email"}
+
+realtime_hub = RealtimeHub(
+    get_supabase_admin_client,
+    REALTIME_TABLES,
+    queue_size=settings.REALTIME_SUBSCRIBER_QUEUE_SIZE,
+    policy=settings.REALTIME_SLOW_CONSUMER_POLICY,
+    max_subscribers=settings.REALTIME_MAX_SUBSCRIBERS,
+)
+
+
+def get_realtime_hub() -> RealtimeHub:
+    return realtime_hub
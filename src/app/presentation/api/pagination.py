@@ -0,0 +1,28 @@
+import base64
+import json
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(after_id: Optional[int]) -> Optional[str]:
+    """Opaque cursor pointing after the given id"""
+    if after_id is None:
+        return None
+    raw = json.dumps({"id": after_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        after_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+        if not isinstance(after_id, int):
+            raise ValueError(after_id)
+        return after_id
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
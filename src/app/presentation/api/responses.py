@@ -0,0 +1,68 @@
+from typing import Any, Dict, Generic, Optional, Type, TypeVar
+
+from fastapi import Request
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import TypeAdapter
+
+from app.core.config import settings
+
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+if settings.RESPONSE_MSGPACK_ENABLED:
+    # Opt-in, installed with the `msgpack` extra; fail at startup if missing
+    import msgpack
+
+T = TypeVar("T")
+
+
+class MsgPackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPES[0]
+
+    def render(self, content: Any) -> bytes:
+        return msgpack.packb(content)
+
+
+def wants_msgpack(request: Request) -> bool:
+    """Whether the client listed a MessagePack media type in `Accept`"""
+    if not settings.RESPONSE_MSGPACK_ENABLED:
+        return False
+    accept = request.headers.get("accept", "")
+    return any(
+        media_range.split(";", 1)[0].strip() in MSGPACK_MEDIA_TYPES
+        for media_range in accept.split(",")
+    )
+
+
+class Serializer(Generic[T]):
+    """Renders handler results as `T` with one validation pass.
+
+    FastAPI validates and serializes whatever a handler returns against its
+    `response_model`, which repeats the work done when the handler built the
+    model. Returning `serializer.response(...)` instead validates the domain
+    objects once, with a TypeAdapter compiled at import, and encodes them
+    with orjson or MessagePack. Keep `response_model=T` on the route for
+    the OpenAPI schema.
+    """
+
+    def __init__(self, type_: Type[T]):
+        self.adapter = TypeAdapter(type_)
+
+    def response(
+        self,
+        request: Request,
+        value: Any,
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Response:
+        validated = self.adapter.validate_python(value, from_attributes=True)
+        # The same JSON-compatible values for both encodings, so datetimes are
+        # ISO 8601 strings in MessagePack too
+        content = self.adapter.dump_python(validated, mode="json")
+        if wants_msgpack(request):
+            response: Response = MsgPackResponse(content, status_code, headers)
+        else:
+            response = ORJSONResponse(content, status_code, headers)
+        if settings.RESPONSE_MSGPACK_ENABLED:
+            # Shared caches must not serve one encoding to the other clients
+            response.headers["Vary"] = "Accept"
+        return response
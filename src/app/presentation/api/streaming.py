@@ -0,0 +1,40 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Sequence, Tuple
+
+Batches = AsyncIterator[List[Tuple[Any, ...]]]
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def ndjson_chunks(columns: Sequence[str], batches: Batches) -> AsyncIterator[str]:
+    """One JSON object per line, one chunk per batch"""
+    encode = json.JSONEncoder(default=_json_default, separators=(",", ":")).encode
+    async for batch in batches:
+        yield "".join(encode(dict(zip(columns, row))) + "\n" for row in batch)
+
+
+async def csv_chunks(columns: Sequence[str], batches: Batches) -> AsyncIterator[str]:
+    """CSV with a header row, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for batch in batches:
+        writer.writerows(
+            [
+                value.isoformat() if isinstance(value, datetime) else value
+                for value in row
+            ]
+            for row in batch
+        )
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
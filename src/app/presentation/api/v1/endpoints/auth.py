@@ -1,7 +1,6 @@
-from typing import Dict, Any
+from typing import TYPE_CHECKING, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status
 
-from app.domain.services.auth_service import SupabaseAuthService
 from app.presentation.api.dependencies import get_supabase_auth_service
 from app.presentation.schemas.auth import (
     SignUpRequest,
@@ -12,8 +11,15 @@ from app.presentation.schemas.auth import (
     UpdateProfileRequest,
 )
 from app.core.auth import get_current_user
+from app.core.exceptions import (
+    DeadlineExceededException,
+    UpstreamUnavailableException,
+)
 from app.presentation.schemas.user import UserResponse
 
+if TYPE_CHECKING:
+    from app.domain.services.auth_service import SupabaseAuthService
+
 
 router = APIRouter()
 
@@ -23,7 +29,7 @@ router = APIRouter()
 )
 async def sign_up(
     user_data: SignUpRequest,
-    auth_service: SupabaseAuthService = Depends(get_supabase_auth_service),
+    auth_service: "SupabaseAuthService" = Depends(get_supabase_auth_service),
 ):
     """Sign up a new user with Supabase Auth"""
     try:
@@ -44,6 +50,8 @@ async def sign_up(
             "user": result["user"],
             "session": result["session"],
         }
+    except (DeadlineExceededException, UpstreamUnavailableException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -51,7 +59,7 @@ async def sign_up(
 @router.post("/signin", response_model=Dict[str, Any])
 async def sign_in(
     credentials: SignInRequest,
-    auth_service: SupabaseAuthService = Depends(get_supabase_auth_service),
+    auth_service: "SupabaseAuthService" = Depends(get_supabase_auth_service),
 ):
     try:
         user = await auth_service.sign_in(
@@ -60,5 +68,7 @@ async def sign_in(
 
         return UserResponse.model_validate(user)
 
+    except (DeadlineExceededException, UpstreamUnavailableException):
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
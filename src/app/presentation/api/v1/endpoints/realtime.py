@@ -0,0 +1,179 @@
+import asyncio
+from typing import Literal, Optional
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    WebSocket,
+    WebSocketDisconnect,
+    WebSocketException,
+    status,
+)
+from sse_starlette.sse import EventSourceResponse
+
+from app.core.auth import AuthService, get_auth_service, get_current_user
+from app.core.config import settings
+from app.core.exceptions import (
+    DeadlineExceededException,
+    ServiceOverloadedException,
+    UpstreamUnavailableException,
+)
+from app.infrastructure.supabase.realtime_hub import (
+    RealtimeHub,
+    SlowConsumerPolicy,
+    Subscriber,
+)
+from app.presentation.api.dependencies import (
+    REALTIME_OWNER_COLUMNS,
+    get_realtime_hub,
+)
+
+router = APIRouter()
+
+ChangeType = Literal["*", "INSERT", "UPDATE", "DELETE"]
+
+
+def _check_access(
+    claims: dict, table: str, column: Optional[str], value: Optional[str]
+) -> None:
+    if claims.get("role") == "service_role":
+        return
+    owner = REALTIME_OWNER_COLUMNS.get(table)
+    if owner is None:
+        raise HTTPException(
+            status.HTTP_403_FORBIDDEN, f"Table {table} is not streamed to users"
+        )
+    if column != owner or value != claims.get("email"):
+        raise HTTPException(
+            status.HTTP_403_FORBIDDEN,
+            f"Only your own rows can be streamed: filter on {owner} = your email",
+        )
+
+
+async def _subscribe(
+    hub: RealtimeHub,
+    claims: dict,
+    table: str,
+    event: str,
+    column: Optional[str],
+    value: Optional[str],
+    policy: Optional[SlowConsumerPolicy],
+) -> Subscriber:
+    if table not in hub.columns:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, f"Table {table} is not streamed")
+    if (column is None) != (value is None):
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST, "column and value must be given together"
+        )
+    if column is not None and column not in hub.columns[table]:
+        raise HTTPException(
+            status.HTTP_400_BAD_REQUEST, f"Cannot filter {table} on {column}"
+        )
+    _check_access(claims, table, column, value)
+    column_filter = (column, value) if column is not None else None
+    try:
+        return await hub.subscribe(table, event, column_filter, policy)
+    except ServiceOverloadedException:
+        raise
+    except Exception:
+        raise HTTPException(
+            status.HTTP_503_SERVICE_UNAVAILABLE, "Realtime is unavailable"
+        )
+
+
+@router.get("/{table}/events")
+async def stream_events(
+    table: str,
+    event: ChangeType = "*",
+    column: Optional[str] = Query(
+        None, description="Only changes to rows whose column..."
+    ),
+    value: Optional[str] = Query(None, description="...has this value"),
+    policy: Optional[SlowConsumerPolicy] = Query(
+        None, description="When this client falls behind, defaults to the server's"
+    ),
+    hub: RealtimeHub = Depends(get_realtime_hub),
+    current_user: dict = Depends(get_current_user),
+):
+    """Stream changes to a table as Server-Sent Events"""
+    subscriber = await _subscribe(
+        hub, current_user, table, event, column, value, policy
+    )
+
+    async def events():
+        try:
+            async for change in subscriber:
+                yield {"event": change.type.lower(), "data": change.data}
+            if subscriber.closed_reason == "slow consumer":
+                yield {"event": "close", "data": subscriber.closed_reason}
+        finally:
+            # The stream is cancelled when the client goes away
+            await asyncio.shield(hub.unsubscribe(subscriber))
+
+    return EventSourceResponse(events(), ping=settings.REALTIME_SSE_PING_SECONDS)
+
+
+@router.websocket("/{table}/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    table: str,
+    event: ChangeType = "*",
+    column: Optional[str] = None,
+    value: Optional[str] = None,
+    policy: Optional[SlowConsumerPolicy] = None,
+    token: Optional[str] = Query(
+        None, description="Access token; browsers cannot send headers here"
+    ),
+    hub: RealtimeHub = Depends(get_realtime_hub),
+    auth_service: AuthService = Depends(get_auth_service),
+):
+    """Send changes to a table as WebSocket text messages"""
+    if token is None:
+        raise WebSocketException(status.WS_1008_POLICY_VIOLATION, "Not authenticated")
+    try:
+        claims = await auth_service.get_current_user(token)
+        subscriber = await _subscribe(hub, claims, table, event, column, value, policy)
+    except (
+        DeadlineExceededException,
+        ServiceOverloadedException,
+        UpstreamUnavailableException,
+    ) as exc:
+        raise WebSocketException(status.WS_1013_TRY_AGAIN_LATER, str(exc))
+    except HTTPException as exc:
+        code = (
+            status.WS_1013_TRY_AGAIN_LATER
+            if exc.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+            else status.WS_1008_POLICY_VIOLATION
+        )
+        raise WebSocketException(code, exc.detail)
+
+    async def send() -> None:
+        async for change in subscriber:
+            await websocket.send_text(change.data)
+
+    async def receive() -> None:
+        # Nothing is expected from the client; this notices it leaving
+        while True:
+            await websocket.receive_text()
+
+    try:
+        await websocket.accept()
+        sender = asyncio.create_task(send())
+        receiver = asyncio.create_task(receive())
+        done, _ = await asyncio.wait(
+            {sender, receiver}, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in (sender, receiver):
+            task.cancel()
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+        if sender in done and sender.exception() is None:
+            # The hub closed the subscriber: a slow consumer, or shutdown
+            await websocket.close(
+                status.WS_1013_TRY_AGAIN_LATER, subscriber.closed_reason
+            )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await asyncio.shield(hub.unsubscribe(subscriber))
@@ -1,55 +1,232 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import (
+    Any,
+    AsyncContextManager,
+    Callable,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Union,
+)
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 
+from app.core.config import settings
+from app.domain.entities.user import User
 from app.domain.services.user_service import UserService
-from app.presentation.api.dependencies import get_user_service
-from app.presentation.schemas.user import UserCreate, UserResponse, UserUpdate
+from app.presentation.api.conditional import (
+    has_conditions,
+    if_match_updated_at,
+    is_not_modified,
+    version_headers,
+)
+from app.presentation.api.dependencies import get_user_service, get_user_service_scope
+from app.presentation.api.pagination import decode_cursor, encode_cursor
+from app.presentation.api.responses import Serializer
+from app.presentation.api.streaming import csv_chunks, ndjson_chunks
+from app.presentation.schemas.user import (
+    BulkResponse,
+    UserBulkCreate,
+    UserBulkDelete,
+    UserBulkUpdate,
+    UserCreate,
+    UserPage,
+    UserResponse,
+    UserUpdate,
+)
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# Handlers return these responses directly, so FastAPI skips validating the
+# result against `response_model` again
+USER = Serializer(UserResponse)
+USER_PAGE = Serializer(UserPage)
+USER_LIST = Serializer(List[UserResponse])
+BULK = Serializer(BulkResponse)
+
+EXPORT_COLUMNS = ("id", "username", "email", "is_active", "created_at", "updated_at")
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+    "csv": (csv_chunks, "text/csv"),
+}
+
+
+def _user_response(request: Request, user: User, status_code: int = 200) -> Response:
+    """The user, with the headers that let clients revalidate it"""
+    return USER.response(
+        request, user, status_code, version_headers(user.id, user.updated_at)
+    )
+
+
+def _next_page_headers(
+    request: Request, next_cursor: Optional[str], limit: int
+) -> Dict[str, str]:
+    """`X-Next-Cursor` and an RFC 8288 `Link` to the next page, if any"""
+    if next_cursor is None:
+        return {}
+    next_url = request.url.remove_query_params("skip").include_query_params(
+        cursor=next_cursor, limit=limit
+    )
+    return {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+
+
+async def _conditional_get(
+    request: Request, user_service: UserService, field: str, value: Any
+) -> Optional[Response]:
+    """304 when the client's copy is current, checked without loading the
+    user; None when the full user must be sent"""
+    if not has_conditions(request):
+        return None
+    user_id, updated_at = await user_service.get_user_version(field, value)
+    if is_not_modified(request, user_id, updated_at):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED,
+            headers=version_headers(user_id, updated_at),
+        )
+    return None
 
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(
-    user_data: UserCreate, user_service: UserService = Depends(get_user_service)
-) -> UserResponse:
+    request: Request,
+    user_data: UserCreate,
+    user_service: UserService = Depends(get_user_service),
+) -> Response:
     """Create a new user"""
     user = await user_service.create_user(
         username=user_data.username, email=user_data.email, password=user_data.password
     )
-    return UserResponse.model_validate(user)
+    return _user_response(request, user, status.HTTP_201_CREATED)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_users(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    service_scope: Callable[[], AsyncContextManager[UserService]] = Depends(
+        get_user_service_scope
+    ),
+) -> StreamingResponse:
+    """Stream every user as NDJSON or CSV"""
+    encode, media_type = EXPORT_FORMATS[format]
+
+    async def body():
+        # The session must live as long as the stream, not the request scope
+        async with service_scope() as user_service:
+            batches = user_service.stream_users(
+                EXPORT_COLUMNS, batch_size=settings.USER_EXPORT_BATCH_SIZE
+            )
+            async for chunk in encode(EXPORT_COLUMNS, batches):
+                yield chunk
+
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="users.{format}"'},
+    )
+
+
+@router.post("/bulk", response_model=BulkResponse)
+async def create_users(
+    request: Request,
+    bulk_data: UserBulkCreate,
+    user_service: UserService = Depends(get_user_service),
+) -> Response:
+    """Create many users; conflicts are reported per item"""
+    results = await user_service.create_users(
+        [(item.username, item.email, item.password) for item in bulk_data.items]
+    )
+    return BULK.response(request, {"results": results})
+
+
+@router.patch("/bulk", response_model=BulkResponse)
+async def update_users(
+    request: Request,
+    bulk_data: UserBulkUpdate,
+    user_service: UserService = Depends(get_user_service),
+) -> Response:
+    """Update many users; conflicts and unknown ids are reported per item"""
+    results = await user_service.update_users(
+        [item.model_dump(exclude_none=True) for item in bulk_data.items]
+    )
+    return BULK.response(request, {"results": results})
+
+
+@router.post("/bulk/delete", response_model=BulkResponse)
+async def delete_users(
+    request: Request,
+    bulk_data: UserBulkDelete,
+    user_service: UserService = Depends(get_user_service),
+) -> Response:
+    """Delete many users; unknown ids are reported per item"""
+    results = await user_service.delete_users(bulk_data.ids)
+    return BULK.response(request, {"results": results})
 
 
 @router.get("/{user_id}", response_model=UserResponse)
 async def get_user(
-    user_id: int, user_service: UserService = Depends(get_user_service)
-) -> UserResponse:
-    """Get user by ID"""
+    request: Request,
+    user_id: int,
+    user_service: UserService = Depends(get_user_service),
+) -> Response:
+    """Get user by ID; honours If-None-Match and If-Modified-Since"""
+    not_modified = await _conditional_get(request, user_service, "id", user_id)
+    if not_modified is not None:
+        return not_modified
     user = await user_service.get_user_by_id(user_id)
-    return UserResponse.model_validate(user)
+    return _user_response(request, user)
 
 
-@router.get("/", response_model=List[UserResponse])
+@router.get("/", response_model=Union[UserPage, List[UserResponse]])
 async def get_users(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    cursor: Optional[str] = Query(
+        None, description="`next_cursor` returned by the previous page"
+    ),
+    limit: int = Query(100, ge=1, le=1000),
+    skip: Optional[int] = Query(
+        None,
+        ge=0,
+        deprecated=True,
+        description="Offset pagination, use `cursor`; returns a plain list",
+    ),
     user_service: UserService = Depends(get_user_service),
-) -> List[UserResponse]:
-    """Get all users with pagination"""
-    users = await user_service.get_all_users(skip=skip, limit=limit)
-    return [UserResponse.model_validate(user) for user in users]
+) -> Response:
+    """Get users, paginated by cursor"""
+    if skip is not None:
+        # Offset clients keep their list body; the cursor to switch to from
+        # this page goes in the headers
+        users = await user_service.get_all_users(skip=skip, limit=limit)
+        next_cursor = encode_cursor(users[-1].id) if len(users) == limit else None
+        return USER_LIST.response(
+            request, users, headers=_next_page_headers(request, next_cursor, limit)
+        )
+
+    users, next_after_id = await user_service.get_users_page(
+        after_id=decode_cursor(cursor), limit=limit
+    )
+    next_cursor = encode_cursor(next_after_id)
+    return USER_PAGE.response(
+        request,
+        {"items": users, "next_cursor": next_cursor},
+        headers=_next_page_headers(request, next_cursor, limit),
+    )
 
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(
+    request: Request,
     user_id: int,
     user_data: UserUpdate,
     user_service: UserService = Depends(get_user_service),
-) -> UserResponse:
-    """Update user"""
+) -> Response:
+    """Update user; with If-Match, only if it is unchanged since that ETag"""
     user = await user_service.update_user(
-        user_id=user_id, username=user_data.username, email=user_data.email
+        user_id=user_id,
+        username=user_data.username,
+        email=user_data.email,
+        if_updated_at=if_match_updated_at(request, user_id),
     )
-    return UserResponse.model_validate(user)
+    return _user_response(request, user)
 
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -62,8 +239,13 @@ async def delete_user(
 
 @router.get("/username/{username}", response_model=UserResponse)
 async def get_user_by_username(
-    username: str, user_service: UserService = Depends(get_user_service)
-) -> UserResponse:
-    """Get user by username"""
+    request: Request,
+    username: str,
+    user_service: UserService = Depends(get_user_service),
+) -> Response:
+    """Get user by username; honours If-None-Match and If-Modified-Since"""
+    not_modified = await _conditional_get(request, user_service, "username", username)
+    if not_modified is not None:
+        return not_modified
     user = await user_service.get_user_by_username(username)
-    return UserResponse.model_validate(user)
+    return _user_response(request, user)
@@ -1,8 +1,9 @@
 from fastapi import APIRouter
 
-from app.presentation.api.v1.endpoints import users, auth
+from app.presentation.api.v1.endpoints import users, auth, realtime
 
 api_router = APIRouter()
 
 api_router.include_router(auth.router, prefix="/auth", tags=["authentication"])
 api_router.include_router(users.router, prefix="/users", tags=["users"])
+api_router.include_router(realtime.router, prefix="/realtime", tags=["realtime"])
@@ -0,0 +1,147 @@
+import hashlib
+import math
+from typing import Any, Dict, List, Tuple
+
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.auth import verified_token_cache
+from app.core.config import settings
+from app.core.loop_monitor import loop_monitor
+from app.core.metrics import http_requests_rejected
+from app.core.ratelimit import RateLimiter
+
+# Probes and scrapes must keep working when the worker is overloaded
+EXEMPT_PATHS = {"/health", "/metrics"}
+AUTH_PREFIX = f"{settings.API_V1_PREFIX}/auth/"
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Per worker, shared by every app instance
+rate_limiters = {
+    "auth": RateLimiter(
+        settings.RATE_LIMIT_AUTH_RATE,
+        settings.RATE_LIMIT_AUTH_BURST,
+        settings.RATE_LIMIT_MAX_KEYS,
+    ),
+    "write": RateLimiter(
+        settings.RATE_LIMIT_WRITE_RATE,
+        settings.RATE_LIMIT_WRITE_BURST,
+        settings.RATE_LIMIT_MAX_KEYS,
+    ),
+    "read": RateLimiter(
+        settings.RATE_LIMIT_READ_RATE,
+        settings.RATE_LIMIT_READ_BURST,
+        settings.RATE_LIMIT_MAX_KEYS,
+    ),
+}
+
+
+def get_rate_limit_stats() -> List[Tuple[Dict[str, str], Dict[str, Any]]]:
+    return [
+        ({"route_class": route_class}, limiter.stats())
+        for route_class, limiter in rate_limiters.items()
+    ]
+
+
+def route_class(scope: Scope) -> str:
+    """The budget a request draws from: auth is the strictest, as it may
+    call Supabase and bcrypt; writes are stricter than reads"""
+    if scope["path"].startswith(AUTH_PREFIX):
+        return "auth"
+    return "read" if scope["method"] in READ_METHODS else "write"
+
+
+class AdmissionMiddleware:
+    """Turns requests away before they cost the worker anything.
+
+    While the event loop lags by more than LOAD_SHED_MAX_LOOP_LAG_MS, or
+    LOAD_SHED_MAX_IN_FLIGHT requests are being handled, new requests get a
+    503, so the admitted ones keep their latency; requests whose response
+    has started, such as streams, no longer count as in flight. Each client then has a
+    token bucket per route class, and gets a 429 once it is empty. Both
+    carry `Retry-After`.
+
+    A client is the RATE_LIMIT_CLIENT_HEADER value, when configured; else
+    the user of a bearer token this worker already verified (so unverified
+    tokens cannot mint fresh buckets); else the IP address, which is the
+    proxy's unless uvicorn trusts its forwarded headers.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.client_header = (
+            settings.RATE_LIMIT_CLIENT_HEADER.lower().encode()
+            if settings.RATE_LIMIT_CLIENT_HEADER
+            else None
+        )
+        self.max_loop_lag = settings.LOAD_SHED_MAX_LOOP_LAG_MS / 1000
+        self.max_in_flight = settings.LOAD_SHED_MAX_IN_FLIGHT
+        self.in_flight = 0
+
+    def _client_key(self, scope: Scope) -> str:
+        authorization = None
+        for name, value in scope["headers"]:
+            if name == self.client_header and value:
+                return f"client:{value.decode('latin-1')}"
+            if name == b"authorization":
+                authorization = value
+        if authorization and authorization[:7].lower() == b"bearer ":
+            claims = verified_token_cache.peek(
+                hashlib.sha256(authorization[7:]).digest()
+            )
+            if claims and claims.get("sub"):
+                return f"user:{claims['sub']}"
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}"
+
+    def _overloaded(self) -> bool:
+        return (
+            loop_monitor.lag > self.max_loop_lag or self.in_flight >= self.max_in_flight
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        budget = route_class(scope)
+        if settings.LOAD_SHED_ENABLED and self._overloaded():
+            http_requests_rejected.inc(("overloaded", budget))
+            response = ORJSONResponse(
+                {"detail": "Server is overloaded", "status_code": 503},
+                status_code=503,
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        if settings.RATE_LIMIT_ENABLED:
+            wait = rate_limiters[budget].acquire(self._client_key(scope))
+            if wait:
+                http_requests_rejected.inc(("rate_limited", budget))
+                response = ORJSONResponse(
+                    {"detail": "Too many requests", "status_code": 429},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(wait))},
+                )
+                await response(scope, receive, send)
+                return
+
+        # Counted until the response starts: a streaming response, such as
+        # SSE events or an export, then holds the connection but not the
+        # worker, and must not shed the requests behind it
+        counted = True
+        self.in_flight += 1
+
+        async def send_counted(message: Message) -> None:
+            nonlocal counted
+            if counted and message["type"] == "http.response.start":
+                counted = False
+                self.in_flight -= 1
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_counted)
+        finally:
+            if counted:
+                self.in_flight -= 1
@@ -0,0 +1,189 @@
+import asyncio
+import time
+from typing import List, Optional, Tuple
+
+from fastapi.responses import ORJSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.deadline import deadline_scope
+from app.core.metrics import http_cancelled_request_duration
+from app.presentation.middleware.metrics import route_name
+
+# Requests that finish sooner, most of them, never pay for watching the
+# connection
+WATCH_DISCONNECT_AFTER = 0.05
+DISCONNECT: Message = {"type": "http.disconnect"}
+
+
+class DeadlineMiddleware:
+    """Gives each request a deadline and cancels its work once the deadline
+    passes or the client disconnects.
+
+    The deadline is the route's (REQUEST_TIMEOUT_ROUTES, else
+    REQUEST_TIMEOUT_SECONDS), shortened by an `X-Request-Timeout` in seconds
+    or an `X-Request-Deadline` in Unix time. It is visible to the code the
+    request runs through app.core.deadline, which caps Supabase call and
+    database statement timeouts with it. When it passes, the request task is
+    cancelled, which cancels the queries and calls in flight, and the client
+    gets a 504 unless the response had started. A disconnect before the
+    response is complete cancels the request the same way; it is watched
+    for once the request has run for WATCH_DISCONNECT_AFTER.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        # Longest prefix first
+        self.routes: List[Tuple[str, Optional[float]]] = sorted(
+            settings.REQUEST_TIMEOUT_ROUTES.items(),
+            key=lambda route: len(route[0]),
+            reverse=True,
+        )
+
+    def _timeout(self, scope: Scope) -> Optional[float]:
+        timeout = next(
+            (
+                timeout
+                for prefix, timeout in self.routes
+                if scope["path"].startswith(prefix)
+            ),
+            settings.REQUEST_TIMEOUT_SECONDS,
+        )
+        for name, value in scope["headers"]:
+            try:
+                if name == b"x-request-timeout":
+                    requested = float(value)
+                elif name == b"x-request-deadline":
+                    requested = float(value) - time.time()
+                else:
+                    continue
+            except ValueError:
+                continue
+            timeout = requested if timeout is None else min(timeout, requested)
+        return timeout
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timeout = self._timeout(scope)
+        if timeout is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        if timeout <= 0:
+            http_cancelled_request_duration.observe(
+                ("deadline", route_name(scope)), 0.0
+            )
+            await self._respond_timeout(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        cancelling = task.cancelling()
+        deadline_at = loop.time() + timeout
+        # Why the task was cancelled: "deadline" or "disconnect"
+        reason: Optional[str] = None
+        receiving = False
+        body_received = False
+        response_started = False
+        response_complete = False
+        # Once watching, messages are read ahead into a queue for the app
+        messages: Optional["asyncio.Queue[Message]"] = None
+        watcher: Optional["asyncio.Task[None]"] = None
+
+        def cancel(why: str) -> None:
+            nonlocal reason
+            if reason is None:
+                reason = why
+                task.cancel()
+
+        async def watch_receive() -> None:
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    # Servers also report a disconnect once the response is
+                    # complete; the work that follows is not abandoned
+                    if not response_complete:
+                        cancel("disconnect")
+                    return
+
+        def on_timer() -> None:
+            # One timer per request: it starts watching the connection, then
+            # fires again at the deadline
+            nonlocal timer, messages, watcher
+            if loop.time() >= deadline_at:
+                cancel("deadline")
+                return
+            if watcher is None and not response_complete:
+                if not receiving:
+                    messages = asyncio.Queue()
+                    watcher = asyncio.create_task(watch_receive())
+                elif not body_received:
+                    # Reading the body; try again between two chunks
+                    timer = loop.call_at(
+                        min(loop.time() + WATCH_DISCONNECT_AFTER, deadline_at),
+                        on_timer,
+                    )
+                    return
+                # Otherwise the app waits on receive itself, like a streaming
+                # response, and handles disconnects already
+            timer = loop.call_at(deadline_at, on_timer)
+
+        async def receive_tracked() -> Message:
+            nonlocal receiving, body_received
+            if messages is not None:
+                if watcher.done() and messages.empty():
+                    return DISCONNECT
+                return await messages.get()
+            receiving = True
+            try:
+                message = await receive()
+            finally:
+                receiving = False
+            if message["type"] == "http.request" and not message.get("more_body"):
+                body_received = True
+            return message
+
+        async def send_tracked(message: Message) -> None:
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body":
+                response_complete = not message.get("more_body", False)
+            await send(message)
+
+        timer = loop.call_at(
+            min(loop.time() + WATCH_DISCONNECT_AFTER, deadline_at), on_timer
+        )
+        try:
+            with deadline_scope(timeout):
+                await self.app(scope, receive_tracked, send_tracked)
+        except asyncio.CancelledError:
+            # Also cancelled from outside, such as by the server shutting down
+            if reason is None or task.uncancel() > cancelling:
+                raise
+            http_cancelled_request_duration.observe(
+                (reason, route_name(scope)), time.perf_counter() - start
+            )
+            if reason == "deadline" and not response_started:
+                await self._respond_timeout(scope, receive, send)
+        else:
+            if reason is not None:
+                # The app swallowed the cancellation
+                task.uncancel()
+        finally:
+            timer.cancel()
+            if watcher is not None:
+                watcher.cancel()
+
+    async def _respond_timeout(
+        self, scope: Scope, receive: Receive, send: Send
+    ) -> None:
+        response = ORJSONResponse(
+            {"detail": "Request deadline exceeded", "status_code": 504},
+            status_code=504,
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,51 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import (
+    http_request_duration,
+    http_requests,
+    http_requests_in_flight,
+)
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_name(scope: Scope) -> str:
+    """Path template of the matched route, to keep label cardinality bounded"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Plain Starlette routes (docs, /openapi.json) have no templates
+    return scope["path"] if "endpoint" in scope else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Records latency, status code and concurrency of every HTTP request"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            labels = (scope["method"], route_name(scope))
+            http_request_duration.observe(labels, elapsed)
+            http_requests.inc(labels + (str(status_code),))
@@ -0,0 +1,79 @@
+import asyncio
+import os
+import random
+import re
+import secrets
+import sys
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.profiler import RequestSampler
+
+PROFILE_HEADER = b"x-profile"
+
+
+class ProfilingMiddleware:
+    """Profiles single requests on demand and writes collapsed stacks.
+
+    A request is profiled when it carries `X-Profile: <PROFILER_TOKEN>`, or
+    at random with probability PROFILER_SAMPLE_RATE, and no other profile is
+    running. The profile file name is returned in `X-Profile-File`. Other
+    requests only pay for a header lookup.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.token = (
+            settings.PROFILER_TOKEN.encode() if settings.PROFILER_TOKEN else None
+        )
+        self.sample_rate = settings.PROFILER_SAMPLE_RATE
+        self.interval = settings.PROFILER_INTERVAL_MS / 1000
+        self.output_dir = settings.PROFILER_OUTPUT_DIR
+        self._active = False
+
+    def _wants_profile(self, scope: Scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return secrets.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self._active or not self._wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        await self._profile(scope, receive, send)
+
+    async def _profile(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self._active = True
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_") or "root"
+        filename = (
+            f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}"
+            f"-{scope['method']}-{slug}.folded"
+        )
+
+        async def send_with_filename(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-file", filename.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        sampler = RequestSampler(sys._getframe(), asyncio.current_task(), self.interval)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_filename)
+        finally:
+            sampler.stop()
+            self._active = False
+            root = f"{scope['method']} {scope['path']}"
+            # The sampler may be mid-tick: wait for it off the event loop
+            await asyncio.to_thread(self._write, filename, sampler, root)
+
+    def _write(self, filename: str, sampler: RequestSampler, root: str) -> None:
+        sampler.join()
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, filename), "w") as f:
+            f.write(sampler.collapsed(root))
@@ -0,0 +1,29 @@
+import asyncio
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.watchdog import loop_watchdog
+from app.presentation.middleware.metrics import route_name
+
+
+class LoopWatchdogMiddleware:
+    """Tells the loop watchdog which route each request task handles; when
+    it is strict, a request whose handler blocked the event loop raises
+    LoopBlockedError once it is done"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        loop_watchdog.track(task, lambda: f"{scope['method']} {route_name(scope)}")
+        try:
+            await self.app(scope, receive, send)
+        except BaseException:
+            loop_watchdog.untrack(task)
+            raise
+        loop_watchdog.check(task)
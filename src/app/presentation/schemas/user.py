@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, EmailStr, Field
 
+from app.core.config import settings
+
 
 class UserBase(BaseModel):
     username: str = Field(..., min_length=3, max_length=50)
@@ -18,6 +20,9 @@ class UserUpdate(BaseModel):
 
 
 class UserResponse(UserBase):
+    # Validated when it was stored; checking every email of a page again
+    # costs more than the rest of the response
+    email: str = Field(..., json_schema_extra={"format": "email"})
     id: int
     is_active: bool
     created_at: datetime
@@ -25,3 +30,44 @@ class UserResponse(UserBase):
 
     class Config:
         from_attributes = True
+
+
+class UserPage(BaseModel):
+    items: List[UserResponse]
+    next_cursor: Optional[str] = Field(
+        None, description="Pass as `cursor` to fetch the next page"
+    )
+
+
+class UserBulkCreate(BaseModel):
+    items: List[UserCreate] = Field(
+        ..., min_length=1, max_length=settings.USER_BULK_MAX_ITEMS
+    )
+
+
+class UserBulkUpdateItem(UserUpdate):
+    id: int
+
+
+class UserBulkUpdate(BaseModel):
+    items: List[UserBulkUpdateItem] = Field(
+        ..., min_length=1, max_length=settings.USER_BULK_MAX_ITEMS
+    )
+
+
+class UserBulkDelete(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=settings.USER_BULK_MAX_ITEMS)
+
+
+class BulkItemResponse(BaseModel):
+    index: int = Field(..., description="Position of the item in the request")
+    status: Literal["created", "updated", "deleted", "conflict", "not_found", "error"]
+    user: Optional[UserResponse] = None
+    detail: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class BulkResponse(BaseModel):
+    results: List[BulkItemResponse]
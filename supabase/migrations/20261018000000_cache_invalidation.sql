@@ -0,0 +1,79 @@
+-- Cache invalidation bus: writes publish what they changed on the
+-- cache_invalidation channel, and every worker listening on it drops those
+-- entries from its in-process caches (app.core.invalidation).
+--
+-- Messages are JSON: {"topic": "users", "keys": [[id, email, username], ...]}.
+-- A message without keys tells subscribers to flush the whole topic. Other
+-- caches can be invalidated from SQL the same way, for instance after
+-- rotating the JWT signing keys:
+--
+--     select public.publish_cache_invalidation('auth');
+
+create or replace function public.publish_cache_invalidation(
+    topic text,
+    keys jsonb default null
+) returns void
+language plpgsql
+as $$
+declare
+    message text := jsonb_build_object('topic', topic, 'keys', keys)::text;
+begin
+    -- NOTIFY payloads must stay under 8000 bytes; past that, flush the topic
+    if keys is null or octet_length(message) > 7900 then
+        message := jsonb_build_object('topic', topic)::text;
+    end if;
+    -- Sent on commit, and identical messages of a transaction are sent once
+    perform pg_notify('cache_invalidation', message);
+end;
+$$;
+
+-- One message per statement, so bulk writes don't flood the channel. Both
+-- the old and new keys of updated rows are sent: the cache also remembers
+-- lookups that found nothing, by email and username.
+create or replace function public.users_cache_invalidation()
+returns trigger
+language plpgsql
+as $$
+declare
+    keys jsonb;
+begin
+    if tg_op = 'INSERT' then
+        select jsonb_agg(jsonb_build_array(id, email, username)) into keys
+        from new_rows;
+    elsif tg_op = 'UPDATE' then
+        select jsonb_agg(jsonb_build_array(id, email, username)) into keys
+        from (
+            select id, email, username from new_rows
+            union
+            select id, email, username from old_rows
+        ) as changed;
+    else
+        select jsonb_agg(jsonb_build_array(id, email, username)) into keys
+        from old_rows;
+    end if;
+    -- Statements that changed no row
+    if keys is not null then
+        perform public.publish_cache_invalidation('users', keys);
+    end if;
+    return null;
+end;
+$$;
+
+-- Transition tables allow a single event per trigger
+drop trigger if exists users_cache_invalidation_insert on public.users;
+create trigger users_cache_invalidation_insert
+    after insert on public.users
+    referencing new table as new_rows
+    for each statement execute function public.users_cache_invalidation();
+
+drop trigger if exists users_cache_invalidation_update on public.users;
+create trigger users_cache_invalidation_update
+    after update on public.users
+    referencing old table as old_rows new table as new_rows
+    for each statement execute function public.users_cache_invalidation();
+
+drop trigger if exists users_cache_invalidation_delete on public.users;
+create trigger users_cache_invalidation_delete
+    after delete on public.users
+    referencing old table as old_rows
+    for each statement execute function public.users_cache_invalidation();
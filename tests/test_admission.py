@@ -0,0 +1,179 @@
+import asyncio
+import hashlib
+import time
+
+import httpx
+import pytest
+
+from app.core.auth import clear_auth_caches, verified_token_cache
+from app.core.config import settings
+from app.core.loop_monitor import loop_monitor
+from app.core.ratelimit import RateLimiter
+from app.presentation.middleware import admission
+from app.presentation.middleware.admission import AdmissionMiddleware
+
+
+def test_a_burst_is_admitted_then_requests_are_spaced_by_the_rate():
+    limiter = RateLimiter(rate=10, burst=3)
+    now = time.monotonic()
+
+    assert [limiter.acquire("a", now) for _ in range(3)] == [0.0] * 3
+    assert limiter.acquire("a", now) == pytest.approx(0.1)
+    assert limiter.acquire("b", now) == 0.0
+    assert limiter.acquire("a", now + 0.1) == 0.0
+    assert limiter.stats()["limited"] == 1
+
+
+def test_limited_requests_do_not_push_the_bucket_further():
+    limiter = RateLimiter(rate=10, burst=1)
+    now = time.monotonic()
+    limiter.acquire("a", now)
+
+    waits = [limiter.acquire("a", now + 0.05) for _ in range(3)]
+
+    assert waits == [pytest.approx(0.05)] * 3
+    assert limiter.acquire("a", now + 0.1) == 0.0
+
+
+def test_idle_buckets_are_dropped_after_two_rollovers():
+    limiter = RateLimiter(rate=10, burst=2)
+    now = time.monotonic()
+    limiter.acquire("a", now)
+
+    # Every burst / rate seconds
+    limiter.acquire("b", now + 0.25)
+    assert limiter.stats()["keys"] == 2
+    limiter.acquire("b", now + 0.5)
+
+    assert limiter.stats()["keys"] == 1
+
+
+def test_buckets_carry_over_into_the_next_generation():
+    limiter = RateLimiter(rate=10, burst=2, max_keys=2)
+    now = time.monotonic()
+    limiter.acquire("a", now)
+    limiter.acquire("a", now)
+
+    limiter.acquire("b", now)
+    limiter.acquire("c", now)
+
+    assert limiter.stats()["early_rotations"] == 1
+    assert limiter.acquire("a", now) > 0
+
+
+def test_a_full_generation_rotates_early():
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    now = time.monotonic()
+
+    for key in "abcde":
+        limiter.acquire(key, now)
+
+    assert limiter.stats()["early_rotations"] == 2
+    assert limiter.stats()["keys"] <= 2 * limiter.max_keys
+
+
+@pytest.fixture
+def settings_for(monkeypatch):
+    def apply(**overrides):
+        for name, value in overrides.items():
+            monkeypatch.setattr(settings, name, value)
+
+    apply(RATE_LIMIT_ENABLED=False, LOAD_SHED_ENABLED=False)
+    clear_auth_caches()
+    yield apply
+    clear_auth_caches()
+
+
+def _scope(*headers, client=("10.0.0.1", 1234)):
+    return {"headers": list(headers), "client": client}
+
+
+@pytest.mark.parametrize("header", [None, "x-client-id"])
+def test_only_verified_tokens_key_clients_by_user(settings_for, header):
+    settings_for(RATE_LIMIT_CLIENT_HEADER=header)
+    middleware = AdmissionMiddleware(None)
+    verified_token_cache.set(hashlib.sha256(b"verified").digest(), {"sub": "user-1"})
+
+    assert middleware._client_key(_scope((b"authorization", b"Bearer verified"))) == (
+        "user:user-1"
+    )
+    assert middleware._client_key(_scope((b"authorization", b"Bearer forged"))) == (
+        "ip:10.0.0.1"
+    )
+    assert middleware._client_key(_scope(client=None)) == "ip:unknown"
+
+
+def test_a_configured_client_header_comes_first(settings_for):
+    settings_for(RATE_LIMIT_CLIENT_HEADER="X-Client-Id")
+    verified_token_cache.set(hashlib.sha256(b"verified").digest(), {"sub": "user-1"})
+
+    key = AdmissionMiddleware(None)._client_key(
+        _scope((b"authorization", b"Bearer verified"), (b"x-client-id", b"mobile"))
+    )
+
+    assert key == "client:mobile"
+
+
+class App:
+    """Responds 200, holding the response until `release` is set"""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, scope, receive, send):
+        await self.release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+def _client(app) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=AdmissionMiddleware(app))
+    return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+
+@pytest.mark.asyncio
+async def test_emptied_buckets_get_429_with_retry_after(settings_for, monkeypatch):
+    settings_for(RATE_LIMIT_ENABLED=True)
+    monkeypatch.setitem(admission.rate_limiters, "write", RateLimiter(0.5, 1))
+
+    async with _client(App()) as client:
+        first = await client.post("/items")
+        limited = await client.post("/items")
+        read = await client.get("/items")
+
+    assert first.status_code == read.status_code == 200
+    assert limited.status_code == 429
+    assert limited.headers["Retry-After"] == "2"
+
+
+@pytest.mark.asyncio
+async def test_a_lagging_loop_sheds_requests_but_not_probes(settings_for, monkeypatch):
+    settings_for(LOAD_SHED_ENABLED=True)
+    monkeypatch.setattr(loop_monitor, "lag", 10.0)
+
+    async with _client(App()) as client:
+        shed = await client.get("/items")
+        health = await client.get("/health")
+
+    assert shed.status_code == 503 and shed.headers["Retry-After"] == "1"
+    assert health.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_requests_beyond_the_in_flight_limit_are_shed(settings_for, monkeypatch):
+    settings_for(LOAD_SHED_ENABLED=True, LOAD_SHED_MAX_IN_FLIGHT=1)
+    monkeypatch.setattr(loop_monitor, "lag", 0.0)
+    app = App()
+    app.release.clear()
+
+    async with _client(app) as client:
+        held = asyncio.create_task(client.get("/items"))
+        await asyncio.sleep(0.01)
+        shed = await client.get("/items")
+        app.release.set()
+        assert (await held).status_code == 200
+        after = await client.get("/items")
+
+    assert shed.status_code == 503
+    assert after.status_code == 200
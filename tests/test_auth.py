@@ -0,0 +1,254 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+
+from app.core import auth
+from app.core.auth import (
+    AuthService,
+    clear_auth_caches,
+    invalidate_verified_tokens,
+    verification_counts,
+    verified_token_cache,
+)
+from app.core.config import settings
+from app.core.exceptions import DeadlineExceededException, UpstreamUnavailableException
+
+HS = object()
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    clear_auth_caches()
+    verification_counts.clear()
+    yield
+    clear_auth_caches()
+
+
+class Jwks:
+    """Serves the JWKS endpoint, counting fetches"""
+
+    def __init__(self):
+        self.keys = {}
+        self.fetches = 0
+        self.status = 200
+
+    def add_key(self, kid: str) -> ec.EllipticCurvePrivateKey:
+        key = ec.generate_private_key(ec.SECP256R1())
+        jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(key.public_key()))
+        self.keys[kid] = {**jwk, "kid": kid, "alg": "ES256", "use": "sig"}
+        return key
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.fetches += 1
+        return httpx.Response(self.status, json={"keys": list(self.keys.values())})
+
+
+@pytest.fixture
+def jwks(monkeypatch):
+    served = Jwks()
+    client = httpx.AsyncClient
+
+    def mocked_client(**kwargs):
+        return client(transport=httpx.MockTransport(served.handle), **kwargs)
+
+    monkeypatch.setattr(auth.httpx, "AsyncClient", mocked_client)
+    return served
+
+
+class FakeSupabase:
+    """Supabase Auth's get_user, answering with `outcome`"""
+
+    def __init__(self, outcome=None):
+        self.outcome = outcome
+        self.calls = 0
+        self.auth = SimpleNamespace(get_user=self.get_user)
+
+    async def get_user(self, token):
+        self.calls += 1
+        if isinstance(self.outcome, BaseException):
+            raise self.outcome
+        return SimpleNamespace(user=self.outcome)
+
+
+def _token(key=HS, kid=None, **claims) -> str:
+    payload = {
+        "sub": "user-1",
+        "aud": settings.JWT_AUDIENCE,
+        "iss": settings.jwt_issuer,
+        "exp": int(time.time()) + 600,
+        **claims,
+    }
+    payload = {name: value for name, value in payload.items() if value is not None}
+    headers = {"kid": kid} if kid else None
+    if key is HS:
+        return jwt.encode(
+            payload, settings.JWT_SECRET, settings.JWT_ALGORITHM, headers=headers
+        )
+    return jwt.encode(payload, key, "ES256", headers=headers)
+
+
+async def _verify(token, supabase=None) -> dict:
+    return await AuthService(supabase or FakeSupabase()).get_current_user(token)
+
+
+@pytest.mark.asyncio
+async def test_a_valid_token_is_verified_locally_and_cached():
+    token = _token(role="authenticated")
+
+    claims = await _verify(token)
+    again = await _verify(token)
+
+    assert claims["sub"] == "user-1" and claims == again
+    assert verification_counts == {"local": 1}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"aud": "someone-else"},
+        {"iss": "https://attacker.example.com/auth/v1"},
+        {"exp": None},
+        {"sub": None},
+        {"exp": int(time.time()) - 60},
+    ],
+    ids=["audience", "issuer", "no exp", "no sub", "expired"],
+)
+async def test_tokens_with_bad_claims_are_rejected(claims):
+    with pytest.raises(HTTPException) as raised:
+        await _verify(_token(**claims))
+
+    assert raised.value.status_code == 401
+    assert verification_counts == {"rejected": 1}
+
+
+@pytest.mark.asyncio
+async def test_an_hmac_token_signed_with_the_public_key_is_rejected(jwks):
+    key = jwks.add_key("key-1")
+    public_pem = key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+
+    def b64(data: bytes) -> bytes:
+        return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+    # Algorithm confusion: the public key used as the HMAC secret
+    header = b64(json.dumps({"alg": "HS256", "typ": "JWT", "kid": "key-1"}).encode())
+    payload = _token().split(".")[1].encode()
+    signature = b64(
+        hmac.new(public_pem, header + b"." + payload, hashlib.sha256).digest()
+    )
+    forged = b".".join((header, payload, signature)).decode()
+
+    with pytest.raises(HTTPException) as raised:
+        await _verify(forged)
+
+    assert raised.value.status_code == 401
+    assert jwks.fetches == 0
+
+
+@pytest.mark.asyncio
+async def test_unknown_kids_refresh_the_jwks_but_not_too_often(jwks, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_REMOTE_FALLBACK", False)
+    first = jwks.add_key("key-1")
+    assert (await _verify(_token(first, "key-1")))["sub"] == "user-1"
+    assert jwks.fetches == 1
+
+    # A key rotated in since the fetch
+    second = jwks.add_key("key-2")
+    monkeypatch.setattr(auth.jwks_cache, "min_refresh_interval", 0)
+    assert (await _verify(_token(second, "key-2")))["sub"] == "user-1"
+    assert jwks.fetches == 2
+
+    # Made-up kids cannot make every request fetch the JWKS
+    monkeypatch.setattr(auth.jwks_cache, "min_refresh_interval", 30)
+    with pytest.raises(HTTPException):
+        await _verify(_token(first, "made-up"))
+    assert jwks.fetches == 2
+
+
+@pytest.mark.asyncio
+async def test_tokens_not_verifiable_locally_fall_back_to_supabase(jwks, monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_REMOTE_FALLBACK", True)
+    jwks.status = 500
+    key = ec.generate_private_key(ec.SECP256R1())
+    supabase = FakeSupabase(outcome={"id": "user-1"})
+
+    claims = await _verify(_token(key, "key-1"), supabase)
+
+    assert claims["sub"] == "user-1"
+    assert supabase.calls == 1
+    assert verification_counts == {"remote_fallback": 1}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "upstream",
+    [
+        UpstreamUnavailableException("Supabase auth is unavailable"),
+        DeadlineExceededException("Request deadline exceeded"),
+    ],
+    ids=["unavailable", "deadline"],
+)
+async def test_an_unavailable_supabase_is_not_a_bad_token(jwks, monkeypatch, upstream):
+    monkeypatch.setattr(settings, "AUTH_REMOTE_FALLBACK", True)
+    jwks.status = 500
+    key = ec.generate_private_key(ec.SECP256R1())
+    # As gotrue wraps the error of its HTTP client
+    wrapped = RuntimeError("get_user failed")
+    wrapped.__cause__ = upstream
+
+    # Mapped to 503 and 504 by the domain exception handler
+    with pytest.raises(type(upstream)):
+        await _verify(_token(key, "key-1"), FakeSupabase(outcome=wrapped))
+
+
+@pytest.mark.asyncio
+async def test_tokens_are_cached_no_longer_than_they_are_valid():
+    # Still accepted within the leeway, but already expired
+    expired = _token(exp=int(time.time()) - 2)
+    await _verify(expired)
+    await _verify(expired)
+    assert verification_counts == {"local": 2}
+
+    expiring = _token(exp=int(time.time()) + 1)
+    await _verify(expiring)
+    await asyncio.sleep(1.1)
+    await _verify(expiring)
+    assert verification_counts == {"local": 4}
+
+
+@pytest.mark.asyncio
+async def test_callers_get_their_own_copy_of_cached_claims():
+    token = _token(app_metadata={"roles": ["reader"]})
+
+    claims = await _verify(token)
+    claims["sub"] = "someone-else"
+    claims["app_metadata"]["roles"].append("admin")
+
+    assert await _verify(token) == {
+        **claims,
+        "sub": "user-1",
+        "app_metadata": {"roles": ["reader"]},
+    }
+
+
+def test_invalid_digests_do_not_keep_the_rest_of_the_batch_cached():
+    digests = [hashlib.sha256(token).digest() for token in (b"first", b"second")]
+    for digest in digests:
+        verified_token_cache.set(digest, {"sub": "user"})
+
+    invalidate_verified_tokens([digests[0].hex(), "not hex", 42, digests[1].hex()])
+
+    assert all(verified_token_cache.get(digest) is None for digest in digests)
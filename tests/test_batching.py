@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from app.core.config import settings
+from app.core.dataloader import DataLoader
+from app.presentation.api.dependencies import _wrap
+from conftest import started
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_batches_of_concurrent_requests_share_one_lookup(
+    slow_repository, monkeypatch
+):
+    monkeypatch.setattr(settings, "USER_SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(settings, "USER_BATCH_LOOKUPS_ENABLED", True)
+    monkeypatch.setattr(settings, "USER_CACHE_ENABLED", False)
+    user = await slow_repository.add("ada")
+
+    # One wrapped repository per request, as the dependencies build them
+    lookups = [
+        asyncio.ensure_future(_wrap(slow_repository).get_by_id(user.id))
+        for _ in range(100)
+    ]
+    await started()
+    slow_repository.release.set()
+
+    assert {found.id for found in await asyncio.gather(*lookups)} == {user.id}
+    assert slow_repository.calls == {"get_many_by_ids": 1}
+
+
+async def test_loads_in_one_tick_make_one_batch_call():
+    batches = []
+
+    async def batch_load(keys):
+        batches.append(sorted(keys))
+        return {key: key * 2 for key in keys if key != 3}
+
+    loader = DataLoader(batch_load, max_batch_size=2)
+    values = await asyncio.gather(*(loader.load(key) for key in (1, 2, 2, 3)))
+
+    assert values == [2, 4, 4, None]
+    assert batches == [[1, 2], [3]]
+
+
+async def test_a_cancelled_batch_releases_its_callers():
+    async def batch_load(keys):
+        await asyncio.Event().wait()
+
+    loader = DataLoader(batch_load)
+    caller = asyncio.ensure_future(loader.load(1))
+    await started()
+    for task in list(loader._tasks):
+        task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await asyncio.wait_for(caller, 1)
@@ -0,0 +1,143 @@
+import uuid
+
+import pytest
+
+from app.domain.entities.user import User
+from app.infrastructure.repositories.memory_user_repository import (
+    InMemoryUserRepository,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(params=["memory", "database"])
+def repository(request):
+    if request.param == "memory":
+        return InMemoryUserRepository()
+    from app.infrastructure.repositories.user_repository_impl import (
+        UserRepositoryImpl,
+    )
+
+    return UserRepositoryImpl(request.getfixturevalue("database_session"))
+
+
+@pytest.fixture
+def names():
+    """Unique names, as the database may hold other users"""
+    prefix = uuid.uuid4().hex[:8]
+    return lambda name: f"{prefix}-{name}"
+
+
+def _user(name: str) -> User:
+    return User(
+        id=None, username=name, email=f"{name}@example.com", hashed_password="x"
+    )
+
+
+async def _create(repository, *names):
+    return [await repository.create(_user(name)) for name in names]
+
+
+def _statuses(results):
+    return [(result.index, result.status) for result in results]
+
+
+async def test_create_many_reports_conflicts_per_item(repository, names):
+    (alice,) = await _create(repository, names("alice"))
+
+    results = await repository.create_many(
+        [
+            _user(names("bob")),
+            _user(names("alice")),
+            _user(names("carol")),
+            _user(names("bob")),
+        ]
+    )
+
+    assert _statuses(results) == [
+        (0, "created"),
+        (1, "conflict"),
+        (2, "created"),
+        (3, "conflict"),
+    ]
+    assert results[0].user.id not in (None, alice.id)
+    assert (await repository.get_by_email(f"{names('carol')}@example.com")).id == (
+        results[2].user.id
+    )
+
+
+async def test_update_many_reports_conflicts_and_unknown_ids(repository, names):
+    alice, bob = await _create(repository, names("alice"), names("bob"))
+
+    results = await repository.update_many(
+        [
+            {"id": alice.id, "username": names("alicia")},
+            {"id": bob.id, "email": alice.email},
+            {"id": 2**31 - 1, "username": names("nobody")},
+            {"id": bob.id, "username": names("alicia")},
+        ]
+    )
+
+    assert _statuses(results) == [
+        (0, "updated"),
+        (1, "conflict"),
+        (2, "not_found"),
+        (3, "conflict"),
+    ]
+    assert results[0].user.username == names("alicia")
+    assert (await repository.get_by_id(bob.id)).email == bob.email
+
+
+async def test_update_many_rejects_repeated_ids(repository, names):
+    (alice,) = await _create(repository, names("alice"))
+
+    results = await repository.update_many(
+        [
+            {"id": alice.id, "username": names("first")},
+            {"id": alice.id, "username": names("second")},
+        ]
+    )
+
+    assert _statuses(results) == [(0, "updated"), (1, "conflict")]
+    assert results[1].detail == "Duplicate id in request"
+    assert (await repository.get_by_id(alice.id)).username == names("first")
+
+
+async def test_update_many_fails_only_the_items_a_concurrent_change_clashes_with(
+    database_session, names, monkeypatch
+):
+    from app.infrastructure.repositories.user_repository_impl import (
+        UserRepositoryImpl,
+    )
+
+    repository = UserRepositoryImpl(database_session)
+    alice, bob, carol = await _create(
+        repository, names("alice"), names("bob"), names("carol")
+    )
+
+    # As if alice took the email after the conflict check
+    async def nothing_taken(emails, usernames):
+        return {}, {}
+
+    monkeypatch.setattr(repository, "_find_taken", nothing_taken)
+    results = await repository.update_many(
+        [
+            {"id": bob.id, "username": names("robert")},
+            {"id": carol.id, "email": alice.email},
+            {"id": alice.id, "username": names("alicia")},
+        ]
+    )
+
+    assert _statuses(results) == [(0, "updated"), (1, "conflict"), (2, "updated")]
+    assert (await repository.get_by_id(bob.id)).username == names("robert")
+    assert (await repository.get_by_id(carol.id)).email == carol.email
+
+
+async def test_delete_many_reports_unknown_ids(repository, names):
+    alice, bob = await _create(repository, names("alice"), names("bob"))
+
+    results = await repository.delete_many([alice.id, 2**31 - 1, alice.id])
+
+    assert _statuses(results) == [(0, "deleted"), (1, "not_found"), (2, "deleted")]
+    assert await repository.get_by_id(alice.id) is None
+    assert await repository.get_by_id(bob.id) is not None
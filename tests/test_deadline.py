@@ -0,0 +1,137 @@
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from app.core import deadline
+from app.core.exceptions import DeadlineExceededException
+from app.core.supabase_client import DeadlineTransport
+from app.presentation.middleware.deadline import DeadlineMiddleware
+
+pytestmark = pytest.mark.asyncio
+
+
+class App:
+    """Takes `seconds`, then answers with the deadline it saw"""
+
+    def __init__(self, seconds: float = 0.0):
+        self.seconds = seconds
+        self.remaining = []
+
+    async def __call__(self, scope, receive, send):
+        self.remaining.append(deadline.remaining())
+        await asyncio.sleep(self.seconds)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _get(app, path="/api/v1/users/", **headers) -> httpx.Response:
+    transport = httpx.ASGITransport(app=DeadlineMiddleware(app))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers=headers)
+
+
+async def test_requests_past_their_deadline_get_504():
+    app = App(seconds=1)
+
+    response = await _get(app, **{"X-Request-Timeout": "0.05"})
+
+    assert response.status_code == 504
+    assert response.json()["detail"] == "Request deadline exceeded"
+    assert 0 < app.remaining[0] <= 0.05
+
+
+async def test_an_expired_deadline_is_answered_without_running_the_request():
+    app = App()
+
+    response = await _get(app, **{"X-Request-Deadline": "1"})
+
+    assert response.status_code == 504
+    assert app.remaining == []
+
+
+async def test_requests_within_their_deadline_see_what_is_left():
+    app = App()
+
+    response = await _get(app, **{"X-Request-Timeout": "5"})
+    unbounded = await _get(app, "/api/v1/users/export")
+
+    assert response.status_code == unbounded.status_code == 200
+    assert 4 < app.remaining[0] <= 5
+    assert app.remaining[1] is None
+
+
+class Recorder(httpx.AsyncBaseTransport):
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.timeouts = []
+
+    async def handle_async_request(self, request):
+        self.timeouts.append(request.extensions.get("timeout"))
+        if self.error is not None:
+            raise self.error
+        return httpx.Response(200)
+
+
+def _request() -> httpx.Request:
+    request = httpx.Request("GET", "http://supabase.test/rest/v1/users")
+    request.extensions["timeout"] = {"connect": 5.0, "read": None}
+    return request
+
+
+async def test_http_calls_are_capped_at_the_deadline():
+    transport = Recorder()
+
+    with deadline.deadline_scope(0.5):
+        await DeadlineTransport(transport).handle_async_request(_request())
+    await DeadlineTransport(transport).handle_async_request(_request())
+
+    first, second = transport.timeouts
+    assert 0.4 < first["connect"] <= 0.5 and 0.4 < first["read"] <= 0.5
+    assert second == {"connect": 5.0, "read": None}
+
+
+async def test_http_calls_are_not_started_past_the_deadline():
+    transport = Recorder()
+
+    with deadline.deadline_scope(0):
+        with pytest.raises(DeadlineExceededException):
+            await DeadlineTransport(transport).handle_async_request(_request())
+
+    assert transport.timeouts == []
+
+
+async def test_http_timeouts_at_the_deadline_are_deadline_errors():
+    transport = Recorder(error=httpx.ReadTimeout("timed out"))
+
+    with deadline.deadline_scope(0.01):
+        with pytest.raises(DeadlineExceededException):
+            await asyncio.sleep(0.02)
+            await DeadlineTransport(transport).handle_async_request(_request())
+
+    with pytest.raises(httpx.ReadTimeout):
+        await DeadlineTransport(transport).handle_async_request(_request())
+
+
+@pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL is not set"
+)
+async def test_database_statements_time_out_with_the_deadline():
+    from sqlalchemy import text
+
+    from app.infrastructure.database.connection import async_session_maker, engine
+
+    try:
+        with deadline.deadline_scope(0.3):
+            async with async_session_maker() as session:
+                timeout = await session.scalar(text("SHOW statement_timeout"))
+                with pytest.raises(DeadlineExceededException):
+                    await session.execute(text("SELECT pg_sleep(5)"))
+        async with async_session_maker() as session:
+            default = await session.scalar(text("SHOW statement_timeout"))
+    finally:
+        await engine.dispose()
+
+    assert 200 <= int(timeout.removesuffix("ms")) <= 300
+    assert default == "0"
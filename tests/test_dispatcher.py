@@ -0,0 +1,128 @@
+import asyncio
+from typing import Any, List
+
+import pytest
+
+from app.core.dispatcher import Dispatcher, get_dispatcher_stats
+
+pytestmark = pytest.mark.asyncio
+
+
+class Recorder:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls: List[Any] = []
+
+    async def __call__(self, argument: Any) -> None:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.calls.append(argument)
+
+
+async def test_a_full_queue_drops_the_oldest_items():
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder, queue_size=3)
+
+    accepted = [dispatcher.submit(n) for n in range(5)]
+    await dispatcher.close()
+
+    assert accepted == [True] * 5
+    assert recorder.calls == [2, 3, 4]
+    assert dispatcher.stats()["dropped"] == 2
+
+
+async def test_a_full_queue_can_drop_the_newest_items():
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder, queue_size=3, overflow="drop_newest")
+
+    accepted = [dispatcher.submit(n) for n in range(5)]
+    await dispatcher.close()
+
+    assert accepted == [True, True, True, False, False]
+    assert recorder.calls == [0, 1, 2]
+
+
+async def test_items_with_the_same_key_are_coalesced_in_place():
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder, coalesce_key=lambda item: item.get("id"))
+
+    for item in ({"id": 1, "v": 1}, {"id": 2}, {}, {"id": 1, "v": 2}, {}):
+        dispatcher.submit(item)
+    await dispatcher.close()
+
+    assert recorder.calls == [{"id": 1, "v": 2}, {"id": 2}, {}, {}]
+    assert dispatcher.stats()["coalesced"] == 1
+
+
+async def test_items_are_passed_in_batches():
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder, batch_size=2)
+
+    for n in range(5):
+        dispatcher.submit(n)
+    await dispatcher.close()
+
+    assert recorder.calls == [[0, 1], [2, 3], [4]]
+    assert dispatcher.stats()["dispatched"] == 5
+
+
+async def test_the_flush_interval_collects_a_batch():
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder, batch_size=10, flush_interval=0.05)
+
+    dispatcher.submit(0)
+    await asyncio.sleep(0.01)
+    dispatcher.submit(1)
+    dispatcher.submit(2)
+    await asyncio.sleep(0.1)
+
+    assert recorder.calls == [[0, 1, 2]]
+    await dispatcher.close()
+
+
+async def test_failing_callbacks_are_counted_and_do_not_stop_the_workers():
+    calls = []
+
+    def callback(item):
+        calls.append(item)
+        if item == 0:
+            raise RuntimeError("boom")
+
+    dispatcher = Dispatcher(callback, workers=2)
+    for n in range(3):
+        dispatcher.submit(n)
+    await dispatcher.close()
+
+    assert sorted(calls) == [0, 1, 2]
+    assert dispatcher.stats()["errors"] == 1
+
+
+async def test_closing_drains_the_queue_and_refuses_new_items():
+    recorder = Recorder(delay=0.01)
+    dispatcher = Dispatcher(recorder, name="drain")
+    for n in range(3):
+        dispatcher.submit(n)
+    assert ({"dispatcher": "drain"}, dispatcher.stats()) in get_dispatcher_stats()
+
+    await dispatcher.close(timeout=1)
+
+    assert recorder.calls == [0, 1, 2]
+    assert not dispatcher.submit(3)
+    assert dispatcher.stats()["dropped"] == 1
+    assert all(
+        labels != {"dispatcher": "drain"} for labels, _ in get_dispatcher_stats()
+    )
+
+
+async def test_closing_gives_up_on_items_left_after_the_timeout():
+    recorder = Recorder(delay=0.1)
+    dispatcher = Dispatcher(recorder)
+    for n in range(5):
+        dispatcher.submit(n)
+
+    await dispatcher.close(timeout=0.05)
+
+    assert recorder.calls == []
+    # The item being handled is cancelled, the other four never taken
+    assert dispatcher.stats()["dropped"] == 4
+    assert dispatcher.stats()["queue_depth"] == 0
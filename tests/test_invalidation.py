@@ -0,0 +1,175 @@
+"""Cache invalidation bus against a real Postgres, with the migration of
+supabase/migrations applied. Set TEST_DATABASE_URL to run them."""
+
+import asyncio
+import os
+import uuid
+from pathlib import Path
+from typing import Any, List, Tuple
+
+import pytest
+import pytest_asyncio
+
+from app.core.invalidation import InvalidationBus, _dsn
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+MIGRATION = (
+    Path(__file__).parent.parent
+    / "supabase"
+    / "migrations"
+    / "20261018000000_cache_invalidation.sql"
+)
+
+pytestmark = [
+    pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set"),
+    pytest.mark.asyncio,
+]
+
+
+class Recorder:
+    """Subscriber recording what the bus delivers"""
+
+    def __init__(self):
+        self.calls: List[Tuple[str, Any]] = []
+        self.changed = asyncio.Event()
+
+    def invalidate(self, keys: List[Any]) -> None:
+        self.calls.append(("invalidate", set(keys)))
+        self.changed.set()
+
+    def flush(self) -> None:
+        self.calls.append(("flush", None))
+        self.changed.set()
+
+    async def next(self, timeout: float = 5.0) -> Tuple[str, Any]:
+        while not self.calls:
+            self.changed.clear()
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        return self.calls.pop(0)
+
+
+async def _wait_until(condition, timeout: float = 5.0) -> None:
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+@pytest_asyncio.fixture
+async def connection():
+    import asyncpg
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from app.infrastructure.database.models import UserModel
+
+    engine = create_async_engine(TEST_DATABASE_URL)
+    async with engine.begin() as conn:
+        await conn.run_sync(UserModel.metadata.create_all)
+    await engine.dispose()
+
+    connection = await asyncpg.connect(_dsn(TEST_DATABASE_URL))
+    await connection.execute(MIGRATION.read_text())
+    yield connection
+    await connection.close()
+
+
+@pytest_asyncio.fixture
+async def bus(connection):
+    bus = InvalidationBus(_dsn(TEST_DATABASE_URL), batch_window=0.05, heartbeat=30)
+    recorder = Recorder()
+    bus.subscribe("users", recorder.invalidate, recorder.flush)
+    bus.start()
+    # Every connect flushes what changed while not listening
+    assert await recorder.next() == ("flush", None)
+    yield bus, recorder
+    await bus.stop()
+
+
+async def _insert_user(connection, name: str) -> Tuple[int, str, str]:
+    email = f"{name}@example.com"
+    user_id = await connection.fetchval(
+        "insert into users (username, email, hashed_password, is_active) "
+        "values ($1, $2, 'x', true) returning id",
+        name,
+        email,
+    )
+    return user_id, email, name
+
+
+def _name() -> str:
+    return f"bus-{uuid.uuid4().hex[:12]}"
+
+
+async def test_trigger_sends_the_keys_of_inserted_updated_and_deleted_rows(
+    connection, bus
+):
+    _, recorder = bus
+
+    user_id, email, username = await _insert_user(connection, _name())
+    assert await recorder.next() == ("invalidate", {(user_id, email, username)})
+
+    renamed = _name()
+    await connection.execute(
+        "update users set username = $1 where id = $2", renamed, user_id
+    )
+    # The old keys too: lookups of the old username must miss from now on
+    assert await recorder.next() == (
+        "invalidate",
+        {(user_id, email, username), (user_id, email, renamed)},
+    )
+
+    await connection.execute("delete from users where id = $1", user_id)
+    assert await recorder.next() == ("invalidate", {(user_id, email, renamed)})
+
+
+async def test_notifications_within_the_batch_window_are_delivered_once(
+    connection, bus
+):
+    bus, recorder = bus
+    batches = bus.batches
+
+    # Separate transactions, so separate notifications
+    first = await _insert_user(connection, _name())
+    second = await _insert_user(connection, _name())
+
+    assert await recorder.next() == ("invalidate", {first, second})
+    assert bus.batches == batches + 1
+    await connection.execute(
+        "delete from users where id = any($1::int[])", [first[0], second[0]]
+    )
+
+
+async def test_oversize_notification_flushes_the_topic(connection, bus):
+    bus, recorder = bus
+    prefix = _name()
+
+    # Their keys don't fit in a NOTIFY payload
+    await connection.execute(
+        "insert into users (username, email, hashed_password, is_active) "
+        "select $1 || n, $1 || n || '@example.com', 'x', true "
+        "from generate_series(1, 300) as n",
+        prefix,
+    )
+
+    assert await recorder.next() == ("flush", None)
+    assert bus.flushes == 2
+    await connection.execute("delete from users where username like $1", prefix + "%")
+
+
+async def test_reconnects_and_flushes_after_losing_the_connection(connection, bus):
+    bus, recorder = bus
+
+    terminated = await connection.fetchval(
+        "select count(pg_terminate_backend(pid)) from pg_stat_activity "
+        "where pid <> pg_backend_pid() and query = $1",
+        f'LISTEN "{bus.channel}"',
+    )
+    assert terminated >= 1
+
+    # Notifications sent while disconnected are lost, hence the flush
+    assert await recorder.next() == ("flush", None)
+    assert bus.reconnects == 1
+    await _wait_until(lambda: bus.connected)
+
+    user = await _insert_user(connection, _name())
+    assert await recorder.next() == ("invalidate", {user})
+    await connection.execute("delete from users where id = $1", user[0])
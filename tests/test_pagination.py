@@ -0,0 +1,150 @@
+import base64
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI, HTTPException
+
+from app.domain.entities.user import User
+from app.domain.services.user_service import UserService
+from app.infrastructure.repositories.memory_user_repository import (
+    InMemoryUserRepository,
+)
+from app.presentation.api.dependencies import get_user_service
+from app.presentation.api.pagination import decode_cursor, encode_cursor
+from app.presentation.api.v1.endpoints import users
+
+pytestmark = pytest.mark.asyncio
+
+
+def _user(name: str) -> User:
+    return User(
+        id=None, username=name, email=f"{name}@example.com", hashed_password="x"
+    )
+
+
+@pytest_asyncio.fixture
+async def repository() -> InMemoryUserRepository:
+    repository = InMemoryUserRepository()
+    for number in range(5):
+        await repository.create(_user(f"user{number}"))
+    return repository
+
+
+@pytest_asyncio.fixture
+async def client(repository):
+    app = FastAPI()
+    app.include_router(users.router, prefix="/users")
+    app.dependency_overrides[get_user_service] = lambda: UserService(repository)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def _all_pages(service: UserService, limit: int):
+    pages, after_id = [], None
+    while True:
+        page, after_id = await service.get_users_page(after_id=after_id, limit=limit)
+        pages.append([user.id for user in page])
+        if after_id is None:
+            return pages
+
+
+@pytest.mark.parametrize("after_id", [0, 1, 2**31 - 1, 2**62])
+async def test_cursors_round_trip(after_id):
+    cursor = encode_cursor(after_id)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == after_id
+
+
+async def test_no_cursor_is_the_first_page():
+    assert encode_cursor(None) is None
+    assert decode_cursor(None) is None and decode_cursor("") is None
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64!",
+        base64.urlsafe_b64encode(b"not json").decode(),
+        base64.urlsafe_b64encode(b'{"after": 1}').decode(),
+        base64.urlsafe_b64encode(b'{"id": "1"}').decode(),
+        base64.urlsafe_b64encode(b"[1]").decode(),
+    ],
+)
+async def test_invalid_cursors_are_bad_requests(cursor):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(cursor)
+
+    assert raised.value.status_code == 400
+
+
+async def test_pages_follow_the_ids_without_gaps_or_repeats(repository):
+    pages = await _all_pages(UserService(repository), limit=2)
+
+    assert pages == [[1, 2], [3, 4], [5]]
+
+
+async def test_a_full_last_page_has_no_next_cursor(repository):
+    assert await _all_pages(UserService(repository), limit=5) == [[1, 2, 3, 4, 5]]
+
+
+async def test_writes_between_pages_do_not_shift_the_next_page(repository):
+    service = UserService(repository)
+    first, after_id = await service.get_users_page(limit=2)
+
+    # An offset would now skip user 3, and repeat user 2 after an insert
+    await repository.delete(1)
+    await repository.create(_user("user5"))
+    rest, _ = await service.get_users_page(after_id=after_id, limit=10)
+
+    assert [user.id for user in first] == [1, 2]
+    assert [user.id for user in rest] == [3, 4, 5, 6]
+
+
+async def test_cursor_pages_link_to_the_next_one(client):
+    response = await client.get("/users/", params={"limit": 2})
+    body = response.json()
+
+    assert [user["id"] for user in body["items"]] == [1, 2]
+    assert decode_cursor(body["next_cursor"]) == 2
+    assert response.headers["X-Next-Cursor"] == body["next_cursor"]
+    assert response.headers["Link"] == (
+        f'<http://test/users/?cursor={body["next_cursor"]}&limit=2>; rel="next"'
+    )
+
+    last = await client.get("/users/", params={"cursor": body["next_cursor"]})
+    assert [user["id"] for user in last.json()["items"]] == [3, 4, 5]
+    assert last.json()["next_cursor"] is None
+    assert "Link" not in last.headers
+
+
+async def test_offset_pages_keep_their_list_body(client):
+    response = await client.get("/users/", params={"skip": 1, "limit": 2})
+
+    assert [user["id"] for user in response.json()] == [2, 3]
+    # From where offset clients can switch to cursors
+    assert decode_cursor(response.headers["X-Next-Cursor"]) == 3
+    assert "skip" not in response.headers["Link"]
+
+
+async def test_invalid_cursors_are_rejected_by_the_endpoint(client):
+    response = await client.get("/users/", params={"cursor": "not base64!"})
+
+    assert response.status_code == 400
+
+
+async def test_database_pages_are_an_id_range(database_session):
+    from app.infrastructure.repositories.user_repository_impl import (
+        UserRepositoryImpl,
+    )
+
+    repository = UserRepositoryImpl(database_session)
+    created = [await repository.create(_user(f"page{n}")) for n in range(3)]
+    after_id = created[0].id - 1
+
+    first = await repository.get_page(after_id=after_id, limit=2)
+    rest = await repository.get_page(after_id=first[-1].id, limit=2)
+
+    assert [user.id for user in first + rest] == [user.id for user in created]
@@ -0,0 +1,138 @@
+import asyncio
+from dataclasses import replace
+
+import bcrypt
+import pytest
+import pytest_asyncio
+
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedException
+from app.core.password_workers import calibrate_rounds
+from app.core.security import HASH_BATCH_CHUNK, PasswordHasher
+from app.domain.entities.user import User
+from app.domain.services.user_service import UserService
+from app.infrastructure.repositories.memory_user_repository import (
+    InMemoryUserRepository,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest_asyncio.fixture
+async def hasher():
+    # Cheapest bcrypt cost; the workers are spawned processes, as in production
+    hasher = PasswordHasher(workers=2, queue_size=2, rounds=5)
+    await hasher.start()
+    yield hasher
+    hasher.shutdown()
+
+
+def _low_cost_hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(4)).decode()
+
+
+async def test_hashes_verify_in_the_worker_processes(hasher):
+    hashed = await hasher.hash("secret")
+
+    assert hashed.startswith("$2b$05$")
+    assert await hasher.verify("secret", hashed)
+    assert not await hasher.verify("wrong", hashed)
+    assert not await hasher.verify("secret", "not a bcrypt hash")
+
+
+async def test_operations_beyond_the_queue_are_rejected(hasher):
+    pending = [asyncio.create_task(hasher.hash(str(n))) for n in range(4)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(ServiceOverloadedException):
+        await hasher.verify("secret", "$2b$05$")
+
+    assert len(await asyncio.gather(*pending)) == 4
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["max_pending_seen"] == hasher.max_pending == 4
+
+
+async def test_hash_many_submits_short_chunks_in_order(hasher):
+    passwords = [f"password{n}" for n in range(2 * HASH_BATCH_CHUNK + 3)]
+
+    hashed = await hasher.hash_many(passwords)
+
+    assert hasher.stats()["operations"]["hash_batch"]["count"] == 3
+    assert [
+        bcrypt.checkpw(password.encode(), digest.encode())
+        for password, digest in zip(passwords, hashed)
+    ] == [True] * len(passwords)
+    assert await hasher.hash_many([]) == []
+
+
+async def test_hashing_waits_for_the_calibrated_cost(monkeypatch):
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MIN_ROUNDS", 4)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_ROUNDS", 6)
+    monkeypatch.setattr(settings, "PASSWORD_HASH_TARGET_MS", 10_000)
+    hasher = PasswordHasher(workers=1)
+    try:
+        await hasher.start()
+        hashed = await hasher.hash("secret")
+    finally:
+        hasher.shutdown()
+
+    assert hasher.rounds == 6
+    assert hashed.startswith("$2b$06$")
+
+
+@pytest.mark.parametrize(
+    "target_seconds, rounds", [(0, 4), (60, 6)], ids=["too slow", "fast"]
+)
+async def test_calibration_stays_within_the_bounds(target_seconds, rounds):
+    assert calibrate_rounds(target_seconds, 4, 6) == rounds
+
+
+async def test_hashes_below_the_current_cost_need_a_rehash():
+    hasher = PasswordHasher(workers=1, rounds=5)
+
+    assert hasher.needs_rehash(_low_cost_hash("secret"))
+    assert not hasher.needs_rehash(bcrypt.hashpw(b"x", bcrypt.gensalt(5)).decode())
+    assert not hasher.needs_rehash("not a bcrypt hash")
+
+
+async def _add_user(repository, hashed_password: str) -> User:
+    return await repository.create(
+        User(
+            id=None,
+            username="alice",
+            email="alice@example.com",
+            hashed_password=hashed_password,
+        )
+    )
+
+
+async def test_logins_upgrade_low_cost_hashes(hasher):
+    repository = InMemoryUserRepository()
+    user = await _add_user(repository, _low_cost_hash("secret"))
+
+    authenticated = await UserService(repository, hasher).authenticate_user(
+        user.email, "secret"
+    )
+
+    stored = (await repository.get_by_id(user.id)).hashed_password
+    assert stored.startswith("$2b$05$") and bcrypt.checkpw(b"secret", stored.encode())
+    assert authenticated.hashed_password == stored
+
+
+async def test_upgrades_do_not_overwrite_a_concurrent_password_change(hasher):
+    repository = InMemoryUserRepository()
+    user = await _add_user(repository, _low_cost_hash("secret"))
+
+    class ChangedMeanwhile(UserService):
+        async def _hash_password(self, password: str) -> str:
+            rehashed = await super()._hash_password(password)
+            await repository.update_fields(user.id, {"hashed_password": "changed"})
+            return rehashed
+
+    authenticated = await ChangedMeanwhile(repository, hasher).authenticate_user(
+        user.email, "secret"
+    )
+
+    # The login still succeeds with the hash it checked
+    assert authenticated == replace(user)
+    assert (await repository.get_by_id(user.id)).hashed_password == "changed"
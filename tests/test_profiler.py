@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.core.profiler import RequestSampler, _profiled
+from app.presentation.middleware.profiling import ProfilingMiddleware
+
+pytestmark = pytest.mark.asyncio
+
+
+def compute():
+    time.sleep(0.05)
+
+
+async def load_batch():
+    compute()
+    await asyncio.sleep(0.05)
+
+
+async def unrelated():
+    await asyncio.sleep(0.2)
+
+
+async def handler(scope, receive, send):
+    # Work the request hands to other tasks, started from a callback as
+    # DataLoader batches are, or directly
+    loop = asyncio.get_running_loop()
+    scheduled = loop.create_future()
+    loop.call_soon(lambda: scheduled.set_result(asyncio.ensure_future(load_batch())))
+    await asyncio.gather(
+        await scheduled, asyncio.create_task(load_batch(), name="batch")
+    )
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"done"})
+
+
+@pytest.fixture
+def middleware(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "PROFILER_TOKEN", "token")
+    monkeypatch.setattr(settings, "PROFILER_INTERVAL_MS", 1.0)
+    monkeypatch.setattr(settings, "PROFILER_OUTPUT_DIR", str(tmp_path))
+    return ProfilingMiddleware(handler)
+
+
+async def _profile(middleware, tmp_path) -> str:
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=middleware), base_url="http://test"
+    ) as client:
+        response = await client.get("/work", headers={"X-Profile": "token"})
+    return (tmp_path / response.headers["X-Profile-File"]).read_text()
+
+
+async def test_samples_cover_the_tasks_a_request_starts(middleware, tmp_path):
+    other = asyncio.create_task(unrelated(), name="unrelated")
+
+    profile = await _profile(middleware, tmp_path)
+    other.cancel()
+
+    spawned = [line for line in profile.splitlines() if "[task " in line]
+    assert any("[task batch];" in line for line in spawned)
+    assert any("[task Task-" in line for line in spawned)
+    assert any("load_batch" in line and "compute" in line for line in spawned)
+    assert any("[await" in line for line in spawned)
+    assert all(line.startswith("GET /work;") for line in profile.splitlines())
+    assert "unrelated" not in profile
+
+
+async def test_stopping_restores_the_task_factory_without_waiting():
+    loop = asyncio.get_running_loop()
+    sampler = RequestSampler(
+        asyncio.current_task().get_coro().cr_frame, asyncio.current_task(), 10.0
+    )
+
+    sampler.start()
+    assert _profiled.get() is sampler
+    started = time.perf_counter()
+    sampler.stop()
+
+    # A tick of 10 s is not waited for on the loop
+    assert time.perf_counter() - started < 1
+    assert loop.get_task_factory() is None
+    assert _profiled.get() is None
+    await asyncio.to_thread(sampler.join)
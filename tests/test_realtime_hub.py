@@ -0,0 +1,234 @@
+import asyncio
+from typing import Any, Dict, List
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from app.core.exceptions import ServiceOverloadedException
+from app.infrastructure.supabase.realtime_hub import RealtimeHub, Subscriber
+from app.presentation.api.v1.endpoints.realtime import _check_access
+
+pytestmark = pytest.mark.asyncio
+
+COLUMNS = {"users": ("id", "email", "is_active")}
+
+
+class FakeChannel:
+    def __init__(self, name: str):
+        self.name = name
+        self.callbacks: List[Any] = []
+
+    def on_postgres_changes(self, event, schema, table, callback):
+        self.callbacks.append(callback)
+
+    async def subscribe(self):
+        pass
+
+
+class FakeClient:
+    """The part of the Supabase client the hub uses"""
+
+    def __init__(self):
+        self.channels: List[FakeChannel] = []
+        self.removed: List[FakeChannel] = []
+
+    def channel(self, name: str) -> FakeChannel:
+        self.channels.append(FakeChannel(name))
+        return self.channels[-1]
+
+    async def remove_channel(self, channel: FakeChannel) -> None:
+        self.removed.append(channel)
+
+
+@pytest.fixture
+def client() -> FakeClient:
+    return FakeClient()
+
+
+@pytest.fixture
+def hub(client) -> RealtimeHub:
+    async def get_client():
+        return client
+
+    return RealtimeHub(get_client, COLUMNS, queue_size=2, max_subscribers=3)
+
+
+def _payload(
+    change_type: str, record: Dict[str, Any], old_record: Dict[str, Any] = None
+) -> Dict[str, Any]:
+    return {
+        "data": {
+            "type": change_type,
+            "record": record,
+            "old_record": old_record or {},
+            "commit_timestamp": "2026-10-18T00:00:00Z",
+        }
+    }
+
+
+def _drain(subscriber: Subscriber) -> List[Dict[str, Any]]:
+    changes = [change for _, change in subscriber._queue.items()]
+    subscriber._queue.clear()
+    return [orjson.loads(change.data) for change in changes]
+
+
+def _publish(hub, *records):
+    for record in records:
+        hub.publish("users", "*", _payload("UPDATE", record))
+
+
+async def test_subscribers_share_one_upstream_channel(hub, client):
+    first = await hub.subscribe("users")
+    second = await hub.subscribe("users", column_filter=("email", "a@example.com"))
+
+    await hub.unsubscribe(first)
+    assert client.removed == []
+    await hub.unsubscribe(second)
+
+    assert [channel.name for channel in client.channels] == ["hub:users:*"]
+    assert client.removed == client.channels
+    assert hub.stats()["channels"] == hub.stats()["subscribers"] == 0
+
+
+async def test_changes_carry_only_the_streamed_columns(hub):
+    subscriber = await hub.subscribe("users")
+
+    _publish(hub, {"id": 1, "email": "a@example.com", "hashed_password": "x"})
+
+    assert _drain(subscriber) == [
+        {
+            "type": "UPDATE",
+            "table": "users",
+            "record": {"id": 1, "email": "a@example.com"},
+            "old_record": {},
+            "commit_timestamp": "2026-10-18T00:00:00Z",
+        }
+    ]
+
+
+async def test_changes_reach_only_the_matching_filters(hub):
+    everything = await hub.subscribe("users")
+    alice = await hub.subscribe("users", column_filter=("email", "a@example.com"))
+    active = await hub.subscribe("users", column_filter=("is_active", "true"))
+
+    _publish(
+        hub,
+        {"id": 1, "email": "a@example.com", "is_active": False},
+        {"id": 2, "email": "b@example.com", "is_active": True},
+    )
+
+    assert [change["record"]["id"] for change in _drain(everything)] == [1, 2]
+    assert [change["record"]["id"] for change in _drain(alice)] == [1]
+    assert [change["record"]["id"] for change in _drain(active)] == [2]
+
+
+async def test_rows_leaving_a_filter_are_still_sent_to_it(hub):
+    alice = await hub.subscribe("users", column_filter=("email", "a@example.com"))
+
+    hub.publish(
+        "users",
+        "*",
+        _payload(
+            "UPDATE",
+            {"id": 1, "email": "b@example.com"},
+            {"id": 1, "email": "a@example.com"},
+        ),
+    )
+
+    assert [change["record"]["email"] for change in _drain(alice)] == ["b@example.com"]
+
+
+async def test_the_drop_policy_discards_the_oldest_change(hub):
+    subscriber = await hub.subscribe("users", policy="drop")
+
+    _publish(hub, {"id": 1}, {"id": 2}, {"id": 3})
+
+    assert [change["record"]["id"] for change in _drain(subscriber)] == [2, 3]
+    assert hub.stats()["dropped"] == 1
+
+
+async def test_the_coalesce_policy_keeps_the_latest_state_of_each_row(hub):
+    subscriber = await hub.subscribe("users", policy="coalesce")
+
+    _publish(
+        hub,
+        {"id": 1, "email": "old@example.com"},
+        {"id": 2},
+        {"id": 1, "email": "new@example.com"},
+    )
+
+    assert [change["record"] for change in _drain(subscriber)] == [
+        {"id": 1, "email": "new@example.com"},
+        {"id": 2},
+    ]
+    assert hub.stats()["coalesced"] == 1
+
+
+async def test_the_disconnect_policy_closes_a_slow_subscriber(hub):
+    subscriber = await hub.subscribe("users", policy="disconnect")
+
+    _publish(hub, {"id": 1}, {"id": 2}, {"id": 3})
+
+    assert subscriber.closed_reason == "slow consumer"
+    assert [change async for change in subscriber] == []
+    assert hub.stats()["disconnected"] == 1
+    assert hub.stats()["subscribers"] == 0
+
+
+async def test_subscribers_receive_changes_as_they_arrive(hub):
+    subscriber = await hub.subscribe("users")
+
+    async def first_two():
+        received = []
+        async for change in subscriber:
+            received.append(change.key)
+            if len(received) == 2:
+                return received
+
+    reader = asyncio.create_task(first_two())
+    await asyncio.sleep(0)
+    _publish(hub, {"id": 1}, {"id": 2})
+
+    assert await asyncio.wait_for(reader, 1) == [1, 2]
+
+
+async def test_subscriptions_are_limited(hub):
+    for _ in range(3):
+        await hub.subscribe("users")
+
+    with pytest.raises(ServiceOverloadedException):
+        await hub.subscribe("users")
+    with pytest.raises(ValueError):
+        await hub.subscribe("posts")
+
+
+@pytest.mark.parametrize(
+    "claims, column, value",
+    [
+        ({"role": "service_role"}, None, None),
+        ({"role": "authenticated", "email": "a@example.com"}, "email", "a@example.com"),
+    ],
+    ids=["service role", "own rows"],
+)
+async def test_users_may_stream_their_own_rows(claims, column, value):
+    _check_access(claims, "users", column, value)
+
+
+@pytest.mark.parametrize(
+    "table, column, value",
+    [
+        ("users", None, None),
+        ("users", "email", "b@example.com"),
+        ("users", "id", "1"),
+        ("posts", None, None),
+    ],
+    ids=["every row", "another email", "another column", "unowned table"],
+)
+async def test_users_may_not_stream_other_rows(table, column, value):
+    claims = {"role": "authenticated", "email": "a@example.com"}
+
+    with pytest.raises(HTTPException) as raised:
+        _check_access(claims, table, column, value)
+
+    assert raised.value.status_code == 403
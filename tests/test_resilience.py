@@ -0,0 +1,199 @@
+import asyncio
+import time
+from typing import Any, List
+
+import httpx
+import pytest
+
+from app.core import supabase
+from app.core.config import settings
+from app.core.exceptions import DeadlineExceededException, UpstreamUnavailableException
+from app.core.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    backoff,
+    upstream_error,
+)
+from app.core.supabase_client import ResilientTransport
+
+
+def test_the_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(UpstreamUnavailableException) as raised:
+        breaker.check("Supabase rest")
+    assert 9 < raised.value.retry_after <= 10
+    assert breaker.stats()["breaker_rejected"] == 1
+
+
+@pytest.mark.parametrize(
+    "outcome, state",
+    [("record_success", CLOSED), ("record_failure", OPEN)],
+    ids=["probe succeeds", "probe fails"],
+)
+def test_a_half_open_breaker_lets_one_probe_decide(outcome, state):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    getattr(breaker, outcome)()
+
+    assert breaker.state == state
+    assert breaker.stats()["breaker_opened"] == (1 if state == CLOSED else 2)
+
+
+def test_a_released_probe_lets_another_through():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+
+    breaker.release()
+
+    assert breaker.allow()
+
+
+def test_backoff_is_jittered_below_its_cap():
+    delays = [backoff(attempt, 0.1, 0.5) for attempt in range(10) for _ in range(20)]
+
+    assert all(0 <= delay <= 0.5 for delay in delays)
+    assert all(0 <= backoff(0, 0.1, 0.5) <= 0.1 for _ in range(20))
+
+
+def test_upstream_errors_are_found_behind_wrapping_exceptions():
+    deadline = DeadlineExceededException("Request deadline exceeded")
+    wrapped = RuntimeError("gotrue failed")
+    wrapped.__cause__ = deadline
+
+    assert upstream_error(wrapped) is deadline
+    assert upstream_error(RuntimeError("bad token")) is None
+
+
+class Scripted(httpx.AsyncBaseTransport):
+    """Answers each call with the next outcome: a status, an exception, or
+    (delay, status)"""
+
+    def __init__(self, *outcomes: Any):
+        self.outcomes = list(outcomes)
+        self.calls: List[httpx.Request] = []
+        self.cancelled = 0
+
+    async def handle_async_request(self, request):
+        self.calls.append(request)
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        if isinstance(outcome, tuple):
+            delay, outcome = outcome
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return httpx.Response(outcome, json={"call": len(self.calls)})
+
+
+@pytest.fixture(autouse=True)
+def call_policy(monkeypatch):
+    monkeypatch.setattr(supabase, "_breakers", {})
+    monkeypatch.setattr(supabase, "_call_counts", {})
+    monkeypatch.setattr(settings, "SUPABASE_RETRY_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "SUPABASE_RETRY_BACKOFF_SECONDS", 0.001)
+    monkeypatch.setattr(settings, "SUPABASE_BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "SUPABASE_HEDGE_DELAY_MS", None)
+
+
+async def _call(transport, method: str = "GET") -> httpx.Response:
+    request = httpx.Request(method, "http://supabase.test/rest/v1/users")
+    return await ResilientTransport(transport).handle_async_request(request)
+
+
+@pytest.mark.asyncio
+async def test_reads_are_retried_with_the_operation_timeout():
+    transport = Scripted(503, httpx.ConnectError("refused"), 200)
+
+    response = await _call(transport)
+
+    assert response.status_code == 200
+    assert len(transport.calls) == 3
+    assert transport.calls[0].extensions["timeout"]["read"] == (
+        settings.SUPABASE_OPERATION_TIMEOUTS["rest:read"]
+    )
+    stats = supabase.get_supabase_call_stats()[0][1]
+    assert (stats["attempts"], stats["retries"]) == (3, 2)
+    assert stats["consecutive_failures"] == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", ["POST", "PATCH", "DELETE"])
+async def test_writes_are_never_retried(method):
+    transport = Scripted(503, 200)
+
+    with pytest.raises(UpstreamUnavailableException):
+        await _call(transport, method)
+
+    assert len(transport.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_an_open_breaker_fails_calls_without_sending_them():
+    transport = Scripted(503, 503, 503)
+
+    with pytest.raises(UpstreamUnavailableException):
+        await _call(transport)
+    with pytest.raises(UpstreamUnavailableException):
+        await _call(transport)
+
+    assert len(transport.calls) == 3
+    stats = supabase.get_supabase_call_stats()[0][1]
+    assert stats["breaker_state"] == 2 and stats["breaker_rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_a_saturated_client_pool_does_not_count_against_the_breaker():
+    transport = Scripted(*[httpx.PoolTimeout("pool")] * 4)
+
+    for _ in range(4):
+        with pytest.raises(httpx.PoolTimeout):
+            await _call(transport)
+
+    assert supabase.get_supabase_call_stats()[0][1]["breaker_state"] == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_reads_are_hedged_and_the_first_answer_wins(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_HEDGE_DELAY_MS", 20)
+    transport = Scripted((1, 200), (0, 200))
+
+    response = await _call(transport)
+
+    assert response.json() == {"call": 2}
+    # The slower attempt is cancelled once the loop gets to it
+    await asyncio.sleep(0)
+    assert transport.cancelled == 1
+    stats = supabase.get_supabase_call_stats()[0][1]
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_fast_reads_and_writes_are_not_hedged(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_HEDGE_DELAY_MS", 20)
+    transport = Scripted(200, (0.05, 201))
+
+    await _call(transport)
+    await _call(transport, "POST")
+
+    assert len(transport.calls) == 2
+    assert supabase.get_supabase_call_stats()[0][1]["hedges"] == 0
@@ -0,0 +1,98 @@
+import asyncio
+import pytest
+
+from conftest import started
+
+from app.core.singleflight import SingleFlight
+from app.infrastructure.repositories.singleflight_user_repository import (
+    SingleFlightUserRepository,
+)
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_concurrent_calls_with_the_same_key_share_one_execution():
+    flights = SingleFlight()
+    executions = 0
+    release = asyncio.Event()
+
+    async def call():
+        nonlocal executions
+        executions += 1
+        await release.wait()
+        return "value"
+
+    callers = [asyncio.ensure_future(flights.do("key", call)) for _ in range(10)]
+    await started()
+    release.set()
+
+    assert await asyncio.gather(*callers) == ["value"] * 10
+    assert executions == 1
+    assert flights.stats() == {
+        "calls": 10,
+        "executions": 1,
+        "coalesced": 9,
+        "in_flight": 0,
+    }
+
+
+async def test_a_cancelled_caller_does_not_cancel_the_call_for_the_others():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def call():
+        await release.wait()
+        return "value"
+
+    first = asyncio.ensure_future(flights.do("key", call))
+    second = asyncio.ensure_future(flights.do("key", call))
+    await started()
+    first.cancel()
+    release.set()
+
+    assert await second == "value"
+    assert first.cancelled()
+
+
+async def test_lookups_by_id_share_per_key_whether_batched_or_not(slow_repository):
+    repository = slow_repository
+    user = await repository.add("ada")
+    other = await repository.add("grace")
+    shared = SingleFlightUserRepository(repository, flights=SingleFlight())
+
+    lookups = [
+        asyncio.ensure_future(shared.get_by_id(user.id)),
+        asyncio.ensure_future(shared.get_many_by_ids([user.id, other.id])),
+        asyncio.ensure_future(shared.get_many_by_ids([other.id])),
+        asyncio.ensure_future(shared.get_by_id(other.id)),
+    ]
+    await started()
+    repository.release.set()
+    found = await asyncio.gather(*lookups)
+
+    assert found[0].id == user.id
+    assert sorted(u.id for u in found[1]) == [user.id, other.id]
+    assert [u.id for u in found[2]] == [other.id]
+    assert found[3].id == other.id
+    # The first lookup and the batch of the keys it left
+    assert repository.calls == {"get_by_id": 1, "get_many_by_ids": 1}
+    # Callers get their own copies
+    assert next(u for u in found[1] if u.id == other.id) is not found[2][0]
+
+
+async def test_writes_make_later_lookups_start_afresh(slow_repository):
+    repository = slow_repository
+    user = await repository.add("ada")
+    shared = SingleFlightUserRepository(repository, flights=SingleFlight())
+
+    before = asyncio.ensure_future(shared.get_by_id(user.id))
+    await started()
+    renamed = await shared.update_fields(user.id, {"username": "lovelace"})
+    after = asyncio.ensure_future(shared.get_by_id(user.id))
+    await started()
+    repository.release.set()
+
+    assert renamed.username == "lovelace"
+    assert (await after).username == "lovelace"
+    await before
+    assert repository.calls["get_by_id"] == 2
@@ -0,0 +1,83 @@
+"""What a new worker pays to import the application, and what it loads, in
+fresh interpreters; benchmarks/bench_startup.py measures the full startup"""
+
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+# Same as bench_startup's, in wall-clock time: only meaningful on comparable
+# machines, so it can be raised where they are slower
+IMPORT_BUDGET_MS = float(os.environ.get("STARTUP_IMPORT_BUDGET_MS", 1200))
+# Only the SQLAlchemy and Supabase backends need these
+DATABASE_CLIENTS = ("sqlalchemy", "asyncpg", "supabase", "postgrest", "gotrue")
+
+SRC = Path(__file__).parent.parent / "src"
+IMPORT_SCRIPT = (
+    "import time; start = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - start)"
+)
+STARTUP_SCRIPT = (
+    "import sys\n"
+    "from fastapi.testclient import TestClient\n"
+    "from app.main import app\n"
+    "with TestClient(app) as client:\n"
+    "    client.get('/health').raise_for_status()\n"
+    "print(*sys.modules)"
+)
+# import time: self [us] | cumulative | imported package
+IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+\d+ \|\s+(\S+)")
+
+
+def _run(backend: str, script: str, *options: str) -> subprocess.CompletedProcess:
+    env = {
+        **os.environ,
+        "USER_REPOSITORY_BACKEND": backend,
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [str(SRC), os.environ.get("PYTHONPATH")])
+        ),
+    }
+    return subprocess.run(
+        [sys.executable, *options, "-c", script],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+
+def _slowest_packages(importtime: str, count: int = 5) -> List[str]:
+    totals: Dict[str, int] = defaultdict(int)
+    for line in importtime.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            # Self times, so a package isn't charged for the ones it imports
+            totals[match.group(2).split(".")[0]] += int(match.group(1))
+    slowest = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return [f"{package} {us / 1000:.0f} ms" for package, us in slowest[:count]]
+
+
+def test_import_within_budget():
+    # The best of a few runs, as others may compete for the machine
+    runs = [_run("memory", IMPORT_SCRIPT, "-X", "importtime") for _ in range(3)]
+    seconds = [float(run.stdout) for run in runs]
+    best = min(range(len(runs)), key=seconds.__getitem__)
+
+    import_ms = seconds[best] * 1000
+    assert import_ms <= IMPORT_BUDGET_MS, (
+        f"import app.main took {import_ms:.0f} ms, budget {IMPORT_BUDGET_MS:.0f} ms;"
+        f" slowest: {', '.join(_slowest_packages(runs[best].stderr))}"
+    )
+
+
+def test_memory_backend_does_not_import_database_clients():
+    # Through startup, which must not load them either
+    modules = _run("memory", STARTUP_SCRIPT).stdout.split()
+
+    loaded = sorted(
+        {module.split(".")[0] for module in modules} & set(DATABASE_CLIENTS)
+    )
+    assert loaded == []
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.domain.entities.user import User
+from app.domain.services.user_service import UserService
+from app.infrastructure.repositories.memory_user_repository import (
+    InMemoryUserRepository,
+)
+from app.presentation.api.dependencies import get_user_service_scope
+from app.presentation.api.streaming import csv_chunks, ndjson_chunks
+from app.presentation.api.v1.endpoints import users
+from app.presentation.api.v1.endpoints.users import EXPORT_COLUMNS
+
+pytestmark = pytest.mark.asyncio
+
+COLUMNS = ("id", "name", "active", "created_at", "note")
+CREATED_AT = datetime(2026, 10, 18, 12, 30, tzinfo=timezone.utc)
+BATCHES = [
+    [
+        (1, "alice", True, CREATED_AT, None),
+        (2, 'bob "the builder", jr', False, CREATED_AT, "two\nlines"),
+    ],
+    [(3, "zoë", True, CREATED_AT, "")],
+]
+
+
+async def _batches(batches=BATCHES):
+    for batch in batches:
+        yield batch
+
+
+async def _chunks(encode, batches=BATCHES):
+    return [chunk async for chunk in encode(COLUMNS, _batches(batches))]
+
+
+async def test_ndjson_round_trips_one_object_per_row():
+    chunks = await _chunks(ndjson_chunks)
+
+    assert len(chunks) == len(BATCHES)
+    rows = [json.loads(line) for line in "".join(chunks).splitlines()]
+    assert rows == [
+        {
+            "id": row[0],
+            "name": row[1],
+            "active": row[2],
+            "created_at": CREATED_AT.isoformat(),
+            "note": row[4],
+        }
+        for batch in BATCHES
+        for row in batch
+    ]
+
+
+async def test_csv_round_trips_under_a_header_row():
+    chunks = await _chunks(csv_chunks)
+
+    assert len(chunks) == len(BATCHES)
+    assert chunks[0].startswith("id,name,active,created_at,note\r\n")
+    header, *rows = csv.reader(io.StringIO("".join(chunks), newline=""))
+    assert header == list(COLUMNS)
+    assert rows == [
+        [
+            str(row[0]),
+            row[1],
+            str(row[2]),
+            CREATED_AT.isoformat(),
+            "" if row[4] is None else row[4],
+        ]
+        for batch in BATCHES
+        for row in batch
+    ]
+
+
+async def test_an_empty_export_still_has_its_header():
+    assert await _chunks(csv_chunks, []) == ["id,name,active,created_at,note\r\n"]
+    assert await _chunks(ndjson_chunks, []) == []
+
+
+async def test_the_export_endpoint_streams_every_user():
+    repository = InMemoryUserRepository()
+    for name in ("alice", "bob", "carol"):
+        await repository.create(
+            User(
+                id=None,
+                username=name,
+                email=f"{name}@example.com",
+                hashed_password="x",
+            )
+        )
+
+    @asynccontextmanager
+    async def service_scope():
+        yield UserService(repository)
+
+    app = FastAPI()
+    app.include_router(users.router, prefix="/users")
+    app.dependency_overrides[get_user_service_scope] = lambda: service_scope
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/users/export", params={"format": "csv"})
+
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.headers["content-disposition"] == (
+        'attachment; filename="users.csv"'
+    )
+    header, *rows = csv.reader(io.StringIO(response.text, newline=""))
+    assert header == list(EXPORT_COLUMNS)
+    assert [row[1] for row in rows] == ["alice", "bob", "carol"]
+    assert "hashed_password" not in response.text
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from app.domain.entities.user import User
+from app.infrastructure.repositories.cached_user_repository import (
+    CachedUserRepository,
+    UserCache,
+)
+from conftest import started
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture
+def cache() -> UserCache:
+    return UserCache(max_size=100, ttl=60, negative_ttl=0.1)
+
+
+@pytest.fixture
+def cached(slow_repository, cache) -> CachedUserRepository:
+    slow_repository.release.set()
+    return CachedUserRepository(slow_repository, cache)
+
+
+async def test_lookups_are_served_from_the_cache(slow_repository, cached):
+    user = await slow_repository.add("alice")
+
+    first = await cached.get_by_id(user.id)
+    again = await cached.get_by_id(user.id)
+
+    assert first == again == user
+    assert slow_repository.calls["get_by_id"] == 1
+
+
+async def test_misses_are_cached_until_the_user_is_created(slow_repository, cached):
+    assert await cached.get_by_id(1) is None
+    assert await cached.get_by_id(1) is None
+    assert slow_repository.calls["get_by_id"] == 1
+
+    await cached.create(
+        User(id=None, username="alice", email="alice@example.com", hashed_password="x")
+    )
+
+    assert (await cached.get_by_id(1)).username == "alice"
+    assert slow_repository.calls["get_by_id"] == 2
+
+
+async def test_misses_expire_sooner(slow_repository, cached):
+    await cached.get_by_id(1)
+    await slow_repository.add("alice")
+    await asyncio.sleep(0.15)
+
+    assert (await cached.get_by_id(1)).username == "alice"
+    assert slow_repository.calls["get_by_id"] == 2
+
+
+async def test_a_load_racing_with_a_write_is_not_cached(slow_repository, cache):
+    user = await slow_repository.add("alice")
+    cached = CachedUserRepository(slow_repository, cache)
+
+    load = asyncio.create_task(cached.get_by_id(user.id))
+    await started()
+    # Written elsewhere while the old row is on its way
+    cache.invalidate(user.id)
+    slow_repository.release.set()
+    await load
+
+    await cached.get_by_id(user.id)
+    assert slow_repository.calls["get_by_id"] == 2
+
+
+async def test_changes_invalidate_the_old_and_new_keys(slow_repository, cache, cached):
+    user = await slow_repository.add("alice")
+    await cached.get_by_email("alice@example.com")
+    await cached.get_by_username("alice")
+
+    cache.handle_change(
+        {
+            "data": {
+                "type": "UPDATE",
+                "record": {"id": user.id, "email": "alicia@example.com"},
+                "old_record": {"id": user.id, "email": "alice@example.com"},
+            }
+        }
+    )
+
+    assert cache.lookup("id", user.id) == (False, None)
+    assert cache.lookup("email", "alice@example.com") == (False, None)
+    assert cache.lookup("username", "alice") == (False, None)
+
+
+async def test_versions_are_read_from_the_backend(slow_repository, cached):
+    user = await slow_repository.add("alice")
+    await cached.get_by_id(user.id)
+
+    # Changed by another worker, whose invalidation has not arrived yet
+    updated = await slow_repository.update_fields(user.id, {"username": "alicia"})
+
+    assert await cached.get_version("id", user.id) == (user.id, updated.updated_at)
+
+
+async def test_credentials_are_read_from_the_backend(slow_repository, cached):
+    user = await slow_repository.add("alice")
+    await cached.get_by_email(user.email)
+
+    await slow_repository.update_fields(user.id, {"hashed_password": "changed"})
+
+    assert (await cached.get_by_email(user.email)).hashed_password == "x"
+    assert (await cached.get_credentials_by_email(user.email)).hashed_password == (
+        "changed"
+    )
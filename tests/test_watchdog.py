@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.core.watchdog import LoopBlockedError, LoopWatchdog, loop_watchdog
+from app.main import app
+
+
+async def block_the_loop():
+    time.sleep(0.3)
+    return {}
+
+
+async def wait_politely():
+    await asyncio.sleep(0.3)
+    return {}
+
+
+@pytest_asyncio.fixture
+async def client(monkeypatch):
+    monkeypatch.setattr(loop_watchdog, "strict", True)
+    app.add_api_route("/test/blocking", block_the_loop)
+    app.add_api_route("/test/waiting", wait_politely)
+    loop_watchdog.start()
+    try:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://test"
+        ) as client:
+            yield client
+    finally:
+        loop_watchdog.stop()
+        app.router.routes[:] = [
+            route
+            for route in app.router.routes
+            if not getattr(route, "path", "").startswith("/test/")
+        ]
+
+
+@pytest.mark.asyncio
+async def test_strict_watchdog_fails_a_request_that_blocked_the_loop(client):
+    with pytest.raises(LoopBlockedError, match="/test/blocking"):
+        await client.get("/test/blocking")
+
+
+@pytest.mark.asyncio
+async def test_strict_watchdog_lets_requests_through_that_did_not(client):
+    assert (await client.get("/test/waiting")).status_code == 200
+    assert (await client.get("/health")).status_code == 200
+
+
+def _uvloop_run(main):
+    uvloop = pytest.importorskip("uvloop")
+    return uvloop.run(main)
+
+
+# uvicorn runs uvloop when installed, which calls callbacks from C
+RUNNERS = pytest.mark.parametrize(
+    "run", [asyncio.run, _uvloop_run], ids=["asyncio", "uvloop"]
+)
+
+
+async def _watch(work) -> list:
+    reports = []
+    watchdog = LoopWatchdog(0.05, strict=True, on_block=reports.append)
+    watchdog.start()
+    try:
+        task = asyncio.current_task()
+        watchdog.track(task, lambda: "GET /work")
+        await work()
+        # Blocks are recorded by the loop once they end
+        await asyncio.sleep(0.1)
+        blocked = watchdog.untrack(task)
+    finally:
+        watchdog.stop()
+    return [(report.route, blocked is not None) for report in reports]
+
+
+@RUNNERS
+def test_reports_a_blocking_callback_on_every_loop(run):
+    async def work():
+        await asyncio.sleep(0)
+        time.sleep(0.3)
+
+    assert run(_watch(work)) == [("GET /work", True)]
+
+
+@RUNNERS
+def test_does_not_report_a_task_that_yields_often(run):
+    async def work():
+        # Over the threshold in all, in short steps of the same task
+        for _ in range(30):
+            time.sleep(0.01)
+            await asyncio.sleep(0)
+
+    assert run(_watch(work)) == []